@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+CodePulse Aggregation Engine
+Computes dashboard and report totals from the rollup tables, in a single
+grouped pass per window
+"""
+
+try:
+    from backend.config import ANALYTICS_MAX_RANGE_DAYS
+    from backend.bucketing import resolve_buckets, grouped_series
+    from backend.timeutils import SECONDS_PER_DAY, get_timezone, local_day_start, local_today
+except ModuleNotFoundError:
+    from config import ANALYTICS_MAX_RANGE_DAYS
+    from bucketing import resolve_buckets, grouped_series
+    from timeutils import SECONDS_PER_DAY, get_timezone, local_day_start, local_today
+
+
+def bucket_stats(conn, buckets):
+    """
+    Totals and per-language durations for each of `buckets` (see bucketing.resolve_buckets).
+
+    Returns:
+    {
+        "labels": ["2024-12-21", ...],
+        "data": [45.5, ...],           // minutes per bucket
+        "counts": [12, ...],           // sessions per bucket
+        "total_minutes": 412.5,
+        "total_sessions": 28,
+        "languages": ["python", ...],  // by total duration, descending
+        "language_minutes": {"python": 300.0, ...},
+        "top_language": "python"
+    }
+    """
+    # Fill in buckets without activity so every label has a value
+    seconds = [0.0] * len(buckets.labels)
+    counts = [0] * len(buckets.labels)
+    language_seconds = {}
+    grouped = grouped_series(conn, buckets.edges, by=('language',))
+    for (language,), (series, sessions) in grouped.items():
+        for i in range(len(series)):
+            seconds[i] += series[i]
+            counts[i] += sessions[i]
+        if language is not None:
+            language_seconds[language] = sum(series)
+
+    languages = sorted(language_seconds, key=language_seconds.get, reverse=True)
+
+    return {
+        "labels": buckets.labels,
+        "data": [round(s / 60.0, 2) for s in seconds],
+        "counts": counts,
+        "total_minutes": round(sum(seconds) / 60.0, 2),
+        "total_sessions": sum(counts),
+        "languages": languages,
+        "language_minutes": {lang: round(language_seconds[lang] / 60.0, 2) for lang in languages},
+        "top_language": languages[0] if languages else "N/A"
+    }
+
+
+def window_stats(conn, days=7, today=None, tz=None):
+    """Per-day bucket_stats() for today and the `days` before it, in `tz`"""
+    buckets = resolve_buckets(granularity='day', default_days=days + 1,
+                              max_buckets=days + 1, today=today, tz=tz)
+    return bucket_stats(conn, buckets)
+
+
+def language_totals(conn, date, tz=None):
+    """
+    Per-language totals for one 'YYYY-MM-DD' day in `tz`, largest first.
+
+    Returns a list of (language, total_seconds, session_count) tuples;
+    sessions without a language are reported as None.
+    """
+    buckets = resolve_buckets(date, date, 'day', tz=tz)
+    totals = [(language, seconds[0], sessions[0]) for (language,), (seconds, sessions)
+              in grouped_series(conn, buckets.edges, by=('language',)).items()]
+    return sorted(totals, key=lambda row: row[1], reverse=True)
+
+
+def project_totals(conn, limit=10):
+    """
+    All-time totals per (project, language), largest first.
+
+    Returns a list of (folder, language, total_seconds, session_count)
+    tuples, where folder is the project name ('' for files outside any
+    folder). The grouping runs over integer project and language ids on the
+    covering idx_daily_rollup_project index; names are joined only for the
+    top rows.
+    """
+    query = """
+    SELECT p.name, l.name, t.total_duration, t.count
+    FROM (
+        SELECT project_id, language_id,
+               SUM(total_sec) AS total_duration, SUM(session_count) AS count
+        FROM daily_rollup
+        WHERE project_id IS NOT NULL
+        GROUP BY project_id, language_id
+        ORDER BY total_duration DESC
+        LIMIT ?
+    ) t JOIN projects p ON p.id = t.project_id
+    LEFT JOIN languages l ON l.id = t.language_id
+    ORDER BY t.total_duration DESC
+    """
+    return [tuple(row) for row in conn.execute(query, (limit,))]
+
+
+# ============================================================================
+# API payloads shared by the REST endpoints and the live stream
+# ============================================================================
+# Every payload takes the optional from/to/granularity/tz query parameters as
+# first, last, granularity and tz; see backend/bucketing.py.
+
+def _minutes(seconds):
+    return round((seconds or 0) / 60.0, 2)
+
+
+def stats_payload(conn, first=None, last=None, granularity=None, tz=None, today=None):
+    """Body of /api/stats: minutes per bucket (default the last 7 days and today) plus a summary"""
+    buckets = resolve_buckets(first, last, granularity, default_days=8, today=today, tz=tz)
+    stats = bucket_stats(conn, buckets)
+    return {
+        "labels": stats["labels"],
+        "data": stats["data"],
+        "granularity": buckets.granularity,
+        "from": buckets.first,
+        "to": buckets.last,
+        "summary": {
+            "total_minutes": stats["total_minutes"],
+            "total_sessions": stats["total_sessions"],
+            "languages": stats["languages"],
+            "top_language": stats["top_language"]
+        }
+    }
+
+
+def languages_payload(conn, first=None, last=None, granularity=None, tz=None, today=None):
+    """
+    Body of /api/languages: minutes per language (default today).
+
+    With a granularity, each language's minutes per bucket are added as
+    "series", in the same order as "labels".
+    """
+    buckets = resolve_buckets(first, last, granularity, default_days=1, today=today, tz=tz)
+    edges = buckets.edges if granularity else [buckets.edges[0], buckets.edges[-1]]
+    totals = {language: series for (language,), (series, _) in
+              grouped_series(conn, edges, by=('language',)).items() if language is not None}
+    labels = sorted(totals, key=lambda language: sum(totals[language]), reverse=True)
+
+    payload = {
+        "labels": labels,
+        "data": [_minutes(sum(totals[language])) for language in labels],
+        "from": buckets.first,
+        "to": buckets.last
+    }
+    if granularity:
+        payload.update(granularity=buckets.granularity, buckets=buckets.labels,
+                       series=[[_minutes(value) for value in totals[language]]
+                               for language in labels])
+    return payload
+
+
+def projects_payload(conn, first=None, last=None, granularity=None, tz=None, today=None, limit=10):
+    """
+    Body of /api/projects: top 10 folders by activity (default all time).
+
+    With a granularity, each project also gets its minutes per bucket as
+    "series", labelled by the top-level "buckets".
+    """
+    if first is None and last is None and granularity is None:
+        projects = []
+        for folder, language, total_duration, session_count in project_totals(conn, limit=limit):
+            projects.append({
+                "folder": folder or "root",
+                "duration_minutes": _minutes(total_duration),
+                "language": language or "Unknown",
+                "session_count": session_count
+            })
+        return {"projects": projects}
+
+    default_days = 1
+    if first is None:
+        # All time, as far back as a range may reach
+        oldest = conn.execute("SELECT MIN(day) FROM daily_rollup").fetchone()[0]
+        if oldest is not None:
+            zone = get_timezone(tz)
+            newest = local_day_start(last or local_today(zone, today), zone)
+            default_days = min(ANALYTICS_MAX_RANGE_DAYS,
+                               max(1, (newest - oldest) // SECONDS_PER_DAY + 2))
+    buckets = resolve_buckets(first, last, granularity, default_days=default_days,
+                              today=today, tz=tz)
+    edges = buckets.edges if granularity else [buckets.edges[0], buckets.edges[-1]]
+    series = grouped_series(conn, edges, by=('project', 'language'))
+    top = sorted((key for key in series if key[0] is not None),
+                 key=lambda key: sum(series[key][0]), reverse=True)[:limit]
+
+    projects = []
+    for folder, language in top:
+        seconds, sessions = series[(folder, language)]
+        project = {
+            "folder": folder or "root",
+            "duration_minutes": _minutes(sum(seconds)),
+            "language": language or "Unknown",
+            "session_count": sum(sessions)
+        }
+        if granularity:
+            project["series"] = [_minutes(value) for value in seconds]
+        projects.append(project)
+
+    payload = {"projects": projects, "from": buckets.first, "to": buckets.last}
+    if granularity:
+        payload.update(granularity=buckets.granularity, buckets=buckets.labels)
+    return payload
+
+
+def summary_payload(conn, **ranges):
+    """The summary statistics panel on its own"""
+    return stats_payload(conn, **ranges)["summary"]
+
+
+# Panels that /api/dashboard can return, in response order
+DASHBOARD_PANELS = {
+    "stats": stats_payload,
+    "languages": languages_payload,
+    "projects": projects_payload,
+    "summary": summary_payload,
+}
+
+
+def dashboard_payload(conn, fields=("stats", "languages", "projects"), **ranges):
+    """
+    The requested dashboard panels in one object, each over `ranges`
+    (first, last, granularity and tz).
+
+    Raises ValueError for unknown panel names. Call inside
+    db.read_snapshot() so every panel reflects the same data.
+    """
+    unknown = [field for field in fields if field not in DASHBOARD_PANELS]
+    if unknown:
+        raise ValueError(f"Unknown dashboard fields: {', '.join(unknown)}")
+    return {field: DASHBOARD_PANELS[field](conn, **ranges)
+            for field in DASHBOARD_PANELS if field in fields}
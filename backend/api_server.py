@@ -4,42 +4,208 @@ CodePulse Flask API Server
 Provides REST API endpoints for real-time dashboard updates
 """
 
-import sqlite3
-import json
-from datetime import datetime, timedelta
-from collections import defaultdict, Counter
-from flask import Flask, jsonify, send_file
+import hashlib
+import hmac
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import Flask, Response, g, jsonify, request, make_response, url_for
 from flask_cors import CORS
 import os
 # Support both package imports (deployed) and local script runs (cd into backend)
 try:
-    from backend.config import get_db_path
+    from backend.config import (get_db_path, PDF_SYNC_TIMEOUT, STREAM_RETRY_MS, TENANCY,
+                                ADMIN_TOKEN, INGEST_TOKEN)
+    from backend.timeutils import get_timezone, local_today, local_day_start
+    from backend.aggregates import (stats_payload, languages_payload, projects_payload,
+                                    dashboard_payload)
+    from backend.heatmaps import weekly_payload, calendar_payload
+    from backend.db import get_db_connection, release_connections, data_version, read_snapshot
+    from backend.live import get_monitor, event_stream, stream_slots
+    from backend.response_cache import ResponseCache
+    from backend.report_jobs import ReportJobs, QueueFullError, ReportEvicted
+    from backend.ingest import (parse_heartbeats, validate_batch, ingest_batch, body_digest,
+                                IngestError, IdempotencyConflict)
+    from backend.tenants import (TENANT_HEADER, TENANT_PARAM, normalize_tenant, tenant_db_path,
+                                 UnknownTenant, list_tenants, admin_payload, pool as tenant_pool)
 except ModuleNotFoundError:
-    from config import get_db_path
+    from config import (get_db_path, PDF_SYNC_TIMEOUT, STREAM_RETRY_MS, TENANCY,
+                        ADMIN_TOKEN, INGEST_TOKEN)
+    from timeutils import get_timezone, local_today, local_day_start
+    from aggregates import (stats_payload, languages_payload, projects_payload,
+                            dashboard_payload)
+    from heatmaps import weekly_payload, calendar_payload
+    from db import get_db_connection, release_connections, data_version, read_snapshot
+    from live import get_monitor, event_stream, stream_slots
+    from response_cache import ResponseCache
+    from report_jobs import ReportJobs, QueueFullError, ReportEvicted
+    from ingest import (parse_heartbeats, validate_batch, ingest_batch, body_digest,
+                        IngestError, IdempotencyConflict)
+    from tenants import (TENANT_HEADER, TENANT_PARAM, normalize_tenant, tenant_db_path,
+                         UnknownTenant, list_tenants, admin_payload, pool as tenant_pool)
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend
+CORS(app, expose_headers=['ETag', 'Last-Modified'])  # Enable CORS for frontend
 
-# Database connection
-def get_db_connection():
-    """Create a database connection"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Endpoints that work without a tenant in tenant mode
+TENANT_OPTIONAL = {'index', 'health_check', 'admin_tenants', 'static'}
+
+# Endpoints that create a tenant's database on its first request; every
+# other endpoint answers 404 for a tenant without one
+TENANT_CREATING = {'ingest_sessions'}
+
+@app.before_request
+def resolve_tenant():
+    """
+    In tenant mode, route the request to the database file of the tenant it
+    names, or reject it with 400 (invalid id) or 404 (no such tenant).
+    Every other request uses activity.db.
+    """
+    g.tenant = None
+    g.db_path = get_db_path()
+    if TENANCY != 'tenant':
+        return None
+    tenant = request.headers.get(TENANT_HEADER) or request.args.get(TENANT_PARAM)
+    if not tenant and request.endpoint in TENANT_OPTIONAL:
+        return None
+    try:
+        g.db_path = tenant_db_path(tenant, create=request.endpoint in TENANT_CREATING)
+    except UnknownTenant as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    g.tenant = normalize_tenant(tenant)
+    return None
+
+def request_connection():
+    """
+    The connection this request reads and writes: the worker thread's own for
+    activity.db, or one borrowed from the tenant pool until the request ends.
+    """
+    if g.tenant is None:
+        return get_db_connection()
+    if 'db_conn' not in g:
+        g.db_conn = tenant_pool.acquire(g.db_path)
+    return g.db_conn
+
+# Database connections are pooled per worker thread (see backend/db.py)
+@app.teardown_request
+def release_db(exc):
+    """Leave the pooled connection clean even when a request failed"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        tenant_pool.release(g.db_path, conn)
+    release_connections()
+
+def bearer_token_matches(token):
+    """Whether the request sends `Authorization: Bearer <token>`, compared in constant time"""
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8'))
+
+def request_today():
+    """
+    Today's date and the epoch of its midnight in the request's timezone.
+
+    Falls back to the default timezone when `tz` is invalid; the view
+    itself rejects it with a 400.
+    """
+    try:
+        tz = get_timezone(request.args.get('tz'))
+    except ValueError:
+        tz = get_timezone()
+    today = local_today(tz)
+    return today, local_day_start(today, tz)
+
+def conditional(view):
+    """
+    Answer repeat requests with 304 Not Modified while the data is unchanged.
+
+    The strong ETag covers the database, the request URL, the sessions change
+    counter and today's date in the request's timezone (day-relative
+    endpoints roll over at its midnight), so it is checked before the view
+    runs any aggregation.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        generation, updated_at = data_version(request_connection())
+        today, midnight = request_today()
+        key = f"{g.db_path}|{request.full_path}|{generation}|{today}"
+        etag = hashlib.sha1(key.encode()).hexdigest()
+        last_modified = datetime.fromtimestamp(max(updated_at or 0, midnight), tz=timezone.utc)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = (request.if_modified_since is not None
+                            and last_modified.replace(microsecond=0) <= request.if_modified_since)
+
+        response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # Browsers must revalidate, which is exactly what makes polling cheap
+            response.headers['Cache-Control'] = 'no-cache'
+            if TENANCY == 'tenant':
+                response.vary.add(TENANT_HEADER)
+        return response
+    return wrapper
+
+# Serialized responses shared by every client while the data is unchanged
+response_cache = ResponseCache()
+
+def cached_json(build):
+    """
+    Respond with {"success": true, **build(conn)}, reusing the serialized body.
+
+    Entries are keyed by database, path, query parameters, data version and
+    date, so they never outlive the data they were computed from.
+    Concurrent misses for the same key run `build` only once.
+    """
+    conn = request_connection()
+    generation, _ = data_version(conn)
+    key = (
+        g.db_path,
+        request.path,
+        tuple(sorted(request.args.items(multi=True))),
+        generation,
+        request_today()[0]
+    )
+    body = response_cache.get_or_compute(
+        key, lambda: app.json.dumps({"success": True, **build(conn)}).encode('utf-8') + b'\n'
+    )
+    return Response(body, mimetype='application/json')
+
+def range_args():
+    """The from/to/granularity/tz query parameters as payload keyword arguments"""
+    return {
+        "first": request.args.get('from'),
+        "last": request.args.get('to'),
+        "granularity": request.args.get('granularity'),
+        "tz": request.args.get('tz')
+    }
 
 # ============================================================================
 # API ENDPOINT 1: /api/stats - Last 7 days of statistics
 # ============================================================================
 @app.route('/api/stats', methods=['GET'])
+@conditional
 def api_stats():
     """
-    Returns stats for the last 7 days
+    Returns stats for the last 7 days and today, or the requested range
+    
+    Query parameters:
+        from, to: YYYY-MM-DD, inclusive (default: 7 days ago to today)
+        granularity: hour, day, week or month (default: day); coarsened
+                     automatically when the range would have too many buckets
+        tz: timezone days follow, e.g. Europe/Berlin (default: CODEPULSE_TIMEZONE)
     
     Returns:
     {
         "labels": ["2024-12-21", "2024-12-22", ...],
         "data": [45.5, 67.3, ...],  // minutes
+        "granularity": "day",
+        "from": "2024-12-21",
+        "to": "2024-12-28",
         "summary": {
             "total_minutes": 412.5,
             "total_sessions": 28,
@@ -48,68 +214,12 @@ def api_stats():
         }
     }
     """
+    ranges = range_args()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        labels = []
-        data = []
-        total_minutes = 0
-        all_languages = []
-        session_count = 0
-        
-        # Get last 7 days of data
-        for i in range(7, -1, -1):
-            date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-            labels.append(date)
-            
-            # Query total duration for this date
-            # Timestamps are Unix timestamps (seconds since epoch)
-            query = """
-            SELECT COUNT(*) as count, SUM(duration_sec) as total_duration
-            FROM sessions 
-            WHERE date(CAST(timestamp AS INTEGER), 'unixepoch') = ?
-            """
-            cursor.execute(query, (date,))
-            row = cursor.fetchone()
-            
-            duration_minutes = 0
-            count = 0
-            if row:
-                duration_minutes = (row['total_duration'] or 0) / 60.0
-                count = row['count'] or 0
-                total_minutes += duration_minutes
-                session_count += count
-            
-            data.append(round(duration_minutes, 2))
-            
-            # Get languages used on this date
-            query = """
-            SELECT DISTINCT language FROM sessions
-            WHERE date(CAST(timestamp AS INTEGER), 'unixepoch') = ? AND language IS NOT NULL
-            """
-            cursor.execute(query, (date,))
-            for row in cursor.fetchall():
-                all_languages.append(row['language'])
-        
-        # Get top language across all 7 days
-        top_language = Counter(all_languages).most_common(1)[0][0] if all_languages else "N/A"
-        unique_languages = list(set(all_languages))
-        
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "labels": labels,
-            "data": data,
-            "summary": {
-                "total_minutes": round(total_minutes, 2),
-                "total_sessions": session_count,
-                "languages": unique_languages,
-                "top_language": top_language
-            }
-        })
+        return cached_json(lambda conn: stats_payload(conn, **ranges))
     
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -117,10 +227,16 @@ def api_stats():
 # API ENDPOINT 2: /api/projects - Top project folders
 # ============================================================================
 @app.route('/api/projects', methods=['GET'])
+@conditional
 def api_projects():
     """
     Returns top project folders based on activity time
     
+    Query parameters:
+        from, to: YYYY-MM-DD, inclusive (default: all time)
+        granularity: adds each project's minutes per hour, day, week or month
+        tz: timezone days follow, e.g. Europe/Berlin (default: CODEPULSE_TIMEZONE)
+    
     Returns:
     {
         "success": true,
@@ -130,46 +246,12 @@ def api_projects():
         ]
     }
     """
+    ranges = range_args()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Extract folder path from file path and get total duration per folder
-        query = """
-        SELECT 
-            SUBSTR(file, 1, INSTR(file, '/') - 1) as folder,
-            language,
-            SUM(duration_sec) as total_duration,
-            COUNT(*) as session_count
-        FROM sessions
-        WHERE file IS NOT NULL AND TRIM(file) != ''
-        GROUP BY folder, language
-        ORDER BY total_duration DESC
-        LIMIT 10
-        """
-        
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        projects = []
-        for row in rows:
-            folder = row['folder'] if row['folder'] else "root"
-            duration_minutes = round((row['total_duration'] or 0) / 60.0, 2)
-            
-            projects.append({
-                "folder": folder,
-                "duration_minutes": duration_minutes,
-                "language": row['language'] or "Unknown",
-                "session_count": row['session_count']
-            })
-        
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "projects": projects
-        })
+        return cached_json(lambda conn: projects_payload(conn, **ranges))
     
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -177,9 +259,16 @@ def api_projects():
 # API ENDPOINT 3: /api/languages - Language distribution (today)
 # ============================================================================
 @app.route('/api/languages', methods=['GET'])
+@conditional
 def api_languages():
     """
-    Returns language distribution for today
+    Returns language distribution for today, or the requested range
+    
+    Query parameters:
+        from, to: YYYY-MM-DD, inclusive (default: today)
+        granularity: adds each language's minutes per hour, day, week or
+                     month as "series", labelled by "buckets"
+        tz: timezone days follow, e.g. Europe/Berlin (default: CODEPULSE_TIMEZONE)
     
     Returns:
     {
@@ -188,58 +277,292 @@ def api_languages():
         "data": [120.5, 45.2, 30.1]  // minutes
     }
     """
+    ranges = range_args()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        today = datetime.now().strftime('%Y-%m-%d')
-        
-        query = """
-        SELECT language, SUM(duration_sec) as total_duration
-        FROM sessions
-        WHERE date(CAST(timestamp AS INTEGER), 'unixepoch') = ? AND language IS NOT NULL
-        GROUP BY language
-        ORDER BY total_duration DESC
-        """
-        
-        cursor.execute(query, (today,))
-        rows = cursor.fetchall()
-        
-        labels = []
-        data = []
-        
-        for row in rows:
-            labels.append(row['language'])
-            data.append(round((row['total_duration'] or 0) / 60.0, 2))
-        
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "labels": labels,
-            "data": data
-        })
+        return cached_json(lambda conn: languages_payload(conn, **ranges))
     
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ============================================================================
+# API ENDPOINT 4: /api/dashboard - Every panel from one snapshot
+# ============================================================================
+@app.route('/api/dashboard', methods=['GET'])
+@conditional
+def api_dashboard():
+    """
+    Returns several dashboard panels computed inside one read transaction
+    
+    Query parameters:
+        fields: comma-separated panels to include (default: stats,languages,projects)
+                Available: stats, languages, projects, summary
+        from, to, granularity, tz: applied to every panel, as on the panel endpoints
+    
+    Returns:
+    {
+        "success": true,
+        "stats": {"labels": [...], "data": [...], "summary": {...}},
+        "languages": {"labels": [...], "data": [...]},
+        "projects": {"projects": [...]}
+    }
+    """
+    fields = request.args.get('fields', 'stats,languages,projects')
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    ranges = range_args()
+    def build(conn):
+        with read_snapshot(conn):
+            return dashboard_payload(conn, fields, **ranges)
+    
+    try:
+        return cached_json(build)
+    
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ============================================================================
+# API ENDPOINT 5: /api/streaks - Focus intervals and day streaks
+# ============================================================================
+def load_streaks():
+    """Import the streak engine (and NumPy) on first use"""
+    try:
+        from backend import streaks
+    except ModuleNotFoundError:
+        import streaks
+    return streaks
+
+@app.route('/api/streaks', methods=['GET'])
+@conditional
+def api_streaks():
+    """
+    Returns focus intervals, their per-day histogram and day streaks
+
+    Query parameters:
+        from: first day, YYYY-MM-DD (default: 29 days before `to`)
+        to:   last day, YYYY-MM-DD (default: today)
+        tz:   timezone days follow, e.g. Europe/Berlin (default: CODEPULSE_TIMEZONE)
+
+    Returns:
+    {
+        "success": true,
+        "focus_from": "2025-01-01",    // first day with focus data, null if none
+        "labels": ["2025-01-01", ...],
+        "histogram_buckets": ["0-15", "15-30", "30-60", "60-120", "120+"],
+        "days": {"intervals": [...], "focus_minutes": [...], "longest_minutes": [...],
+                 "histogram": [[1, 1, 1, 0, 0], ...]},    // null before focus_from
+        "focus": {"intervals": 61, "total_minutes": 2310.0, "longest_minutes": 148.0, ...},
+        "day_streak": {"current": 4, "longest": 9, "longest_from": "2025-01-10", ...}
+    }
+    """
+    first = request.args.get('from')
+    last = request.args.get('to')
+    tz = request.args.get('tz')
+    def build(conn):
+        return load_streaks().streaks_payload(conn, first, last, tz, cache_key=g.db_path)
+
+    try:
+        return cached_json(build)
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ============================================================================
+# API ENDPOINT 6: /api/heatmap/* - Weekly and calendar heatmaps
+# ============================================================================
+@app.route('/api/heatmap/weekly', methods=['GET'])
+@conditional
+def api_heatmap_weekly():
+    """
+    Returns minutes per weekday and hour of day, in local time
+
+    Query parameters:
+        from: first day, YYYY-MM-DD (default: 83 days before `to`)
+        to:   last day, YYYY-MM-DD (default: today)
+        tz:   timezone, e.g. Europe/Berlin (default: CODEPULSE_TIMEZONE)
+
+    Ranges reaching back before the hourly retention window start at its
+    first day, reported as `from`; ranges entirely before it return 400.
+
+    Returns:
+    {
+        "success": true,
+        "from": "2025-01-01", "to": "2025-03-31",
+        "weekdays": ["Mon", ..., "Sun"],
+        "matrix": [[0, 0, ..., 12], ...],  // 7 x 24, minutes
+        "max": 412
+    }
+    """
+    first = request.args.get('from')
+    last = request.args.get('to')
+    tz = request.args.get('tz')
+    def build(conn):
+        return weekly_payload(conn, first, last, tz, cache_key=g.db_path)
+
+    try:
+        return cached_json(build)
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/heatmap/calendar', methods=['GET'])
+@conditional
+def api_heatmap_calendar():
+    """
+    Returns minutes per day as a grid of Monday-to-Sunday weeks
+
+    Query parameters:
+        year: a calendar year, e.g. 2025
+        from, to: YYYY-MM-DD range instead of `year` (default: the last 365 days)
+        tz: timezone days follow, e.g. Europe/Berlin (default: CODEPULSE_TIMEZONE)
+
+    Returns:
+    {
+        "success": true,
+        "start": "2024-12-30",  // date of weeks[0][0]
+        "weeks": [[0, 0, 45, 60, 12, 0, 0], ...],
+        "max": 388,
+        "total_minutes": 24210,
+        "active_days": 201
+    }
+    """
+    first = request.args.get('from')
+    last = request.args.get('to')
+    year = request.args.get('year')
+    tz = request.args.get('tz')
+    def build(conn):
+        return calendar_payload(conn, first, last, year, tz, cache_key=g.db_path)
+
+    try:
+        return cached_json(build)
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ============================================================================
+# LIVE STREAM: /api/stream - Server-Sent Events
+# ============================================================================
+@app.route('/api/stream', methods=['GET'])
+def api_stream():
+    """
+    Pushes the full dashboard payload whenever the data changes
+    
+    Events:
+        id: <change id>
+        event: dashboard
+        data: {"stats": {...}, "languages": {...}, "projects": {...}}
+    
+    Comment lines are sent as heartbeats while nothing changes. Clients that
+    reconnect with Last-Event-ID only receive a snapshot they do not have.
+    In tenant mode, name the tenant with the `tenant` query parameter, since
+    EventSource cannot send headers.
+    
+    Each stream holds a server thread. Beyond STREAM_MAX_CLIENTS open
+    streams the answer is 503, and clients should poll /api/dashboard.
+    """
+    if not stream_slots.acquire():
+        response = jsonify({"success": False,
+                            "error": "Too many live streams, poll /api/dashboard instead"})
+        response.headers['Retry-After'] = str(STREAM_RETRY_MS // 1000)
+        return response, 503
+    try:
+        monitor = get_monitor(g.db_path, dashboard_payload,
+                              pool=tenant_pool if g.tenant else None)
+        last_event_id = request.headers.get('Last-Event-ID')
+        response = Response(event_stream(monitor, last_event_id), mimetype='text/event-stream')
+    except Exception:
+        stream_slots.release()
+        raise
+    # Called when the server closes the response, even if it was never read
+    response.call_on_close(stream_slots.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# ============================================================================
+# INGEST ENDPOINT: /api/sessions
+# ============================================================================
+@app.route('/api/sessions', methods=['POST'])
+def ingest_sessions():
+    """
+    Stores a batch of heartbeats from a remote collector
+    
+    Accepts a JSON array (application/json) or one object per line
+    (application/x-ndjson) of:
+    {"timestamp": 1735344000, "file": "codepulse/api.py", "language": "Python", "duration_sec": 60}
+    
+    Only with CODEPULSE_INGEST_TOKEN set and sent as
+    `Authorization: Bearer <token>`; otherwise answers 404 (disabled) or 401.
+    
+    The whole batch is written in one transaction, or rejected with 400 if
+    any heartbeat is invalid. Send an Idempotency-Key header to make retries
+    safe: a repeated key is acknowledged without storing the rows again.
+    
+    Returns 201:
+    {
+        "success": true,
+        "accepted": 5000,
+        "duplicate": false,
+        "parse_ms": 4.1,
+        "write_ms": 38.7,
+        "rows_per_sec": 129199
+    }
+    """
+    if not INGEST_TOKEN:
+        return jsonify({"success": False, "error": "Ingest is disabled"}), 404
+    if not bearer_token_matches(INGEST_TOKEN):
+        return jsonify({"success": False, "error": "Ingest token required"}), 401
+    started = time.perf_counter()
+    body = request.get_data(cache=False)
+    key = request.headers.get('Idempotency-Key') or None
+    try:
+        rows = validate_batch(parse_heartbeats(body, request.content_type))
+        parse_ms = round((time.perf_counter() - started) * 1000, 2)
+        result = ingest_batch(request_connection(), rows, key, body_digest(body) if key else None)
+    except IngestError as e:
+        return jsonify({"success": False, "error": str(e), "errors": e.errors}), 400
+    except IdempotencyConflict as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    
+    response = jsonify({"success": True, **result, "parse_ms": parse_ms})
+    if not result['duplicate']:
+        response.headers['Server-Timing'] = f"parse;dur={parse_ms}, write;dur={result['write_ms']}"
+    return response, 200 if result['duplicate'] else 201
+
 # ============================================================================
 # Health check endpoint
 # ============================================================================
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Simple health check endpoint"""
+    """Simple health check endpoint; in tenant mode without a tenant, reports the connection pool"""
     try:
-        conn = get_db_connection()
+        if g.tenant is None and TENANCY == 'tenant':
+            return jsonify({
+                "status": "healthy",
+                "tenants": len(list_tenants()),
+                "pool": tenant_pool.stats(),
+                "cache": response_cache.stats()
+            })
+        conn = request_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM sessions")
         count = cursor.fetchone()[0]
-        conn.close()
-        
         return jsonify({
             "status": "healthy",
             "database": "connected",
-            "records": count
+            "records": count,
+            "cache": response_cache.stats()
         })
     except Exception as e:
         return jsonify({
@@ -248,39 +571,181 @@ def health_check():
         }), 500
 
 # ============================================================================
-# PDF EXPORT ENDPOINT: /api/export/pdf
+# ADMIN ENDPOINT: /api/admin/tenants - Every tenant at once
 # ============================================================================
+@app.route('/api/admin/tenants', methods=['GET'])
+def admin_tenants():
+    """
+    Returns each tenant's activity and the team totals over one range
+    
+    Only in tenant mode, with CODEPULSE_ADMIN_TOKEN set and sent as
+    `Authorization: Bearer <token>`. Tenant files are read in parallel.
+    
+    Query parameters:
+        from, to, granularity, tz: as on /api/stats (default: the last 7 days and today)
+    
+    Returns:
+    {
+        "success": true,
+        "labels": ["2024-12-21", ...],
+        "tenants": [{"tenant": "alice", "total_minutes": 412.5, "total_sessions": 28,
+                     "top_language": "Python"}, ...],
+        "team": {"data": [...], "total_minutes": 1290.0, "total_sessions": 96,
+                 "active_tenants": 3, "language_minutes": {...}, "top_language": "Python"}
+    }
+    """
+    if TENANCY != 'tenant' or not ADMIN_TOKEN:
+        return jsonify({"success": False, "error": "Tenant administration is disabled"}), 404
+    if not bearer_token_matches(ADMIN_TOKEN):
+        return jsonify({"success": False, "error": "Admin token required"}), 401
+    try:
+        return jsonify({"success": True, **admin_payload(**range_args())})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ============================================================================
+# PDF EXPORT ENDPOINTS: /api/export/pdf
+# ============================================================================
+def load_pdf_generator():
+    """Import the PDF generator on first use"""
+    try:
+        from backend import pdf_generator
+    except ModuleNotFoundError:
+        import pdf_generator
+    return pdf_generator
+
+def render_report(params):
+    """Build a report from its tenant's database, or activity.db"""
+    pdf_generator = load_pdf_generator()
+    tenant = params.get("tenant")
+    if tenant is None:
+        return pdf_generator.render_pdf_spooled(tz=params["tz"])
+    with tenant_pool.connection(tenant_db_path(tenant)) as conn:
+        return pdf_generator.render_pdf_spooled(tz=params["tz"], conn=conn)
+
+# Reports are built on a small background pool, never in the request thread
+report_jobs = ReportJobs(render=render_report)
+
+def submit_report():
+    """Queue (or reuse) the report for the current data, timezone and today's date there"""
+    generation, _ = data_version(request_connection())
+    tz = get_timezone(request.args.get('tz'))
+    params = {"days": 7, "date": local_today(tz), "tz": tz.key}
+    if g.tenant is not None:
+        params["tenant"] = g.tenant
+    return report_jobs.submit((g.db_path, generation), params)
+
+def find_report_job(job_id):
+    """The job with `job_id`, if it was requested by the current tenant"""
+    job = report_jobs.get(job_id)
+    if job is None or job.params.get("tenant") != g.tenant:
+        return None
+    return job
+
+def report_job_json(job):
+    return {
+        "success": job.status != 'failed',
+        **job.to_dict(),
+        "status_url": url_for('export_pdf_status', job_id=job.id),
+        "download_url": url_for('export_pdf_download', job_id=job.id)
+    }
+
+def send_report(job):
+    """
+    Stream a finished report straight from the in-memory cache.
+    
+    The job key addresses the exact content, so it doubles as a strong ETag
+    and the browser may keep the file for as long as it likes.
+    """
+    etag = f'"{job.key}"'
+    if request.if_none_match.contains(job.key):
+        response = make_response('', 304)
+    else:
+        # Opened now, so an eviction cannot strike after the headers are sent
+        try:
+            chunks = job.report.stream()
+        except ReportEvicted:
+            return jsonify({"success": False, "error": "Report expired, export it again"}), 410
+        response = Response(chunks, mimetype='application/pdf', direct_passthrough=True)
+        response.headers['Content-Length'] = str(job.report.size)
+        response.headers['Content-Disposition'] = (
+            f"attachment; filename=codepulse_report_{job.params['date']}.pdf"
+        )
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+    return response
+
+REPORTLAB_MISSING = "PDF generation requires reportlab. Install with: pip install reportlab"
+
+@app.route('/api/export/pdf', methods=['POST'])
+def export_pdf_submit():
+    """
+    Starts a PDF export in the background
+    
+    Returns 202 with the job, or 200 when an identical report is already
+    cached:
+    {
+        "success": true,
+        "job_id": "9f1c...",
+        "status": "queued",
+        "status_url": "/api/export/pdf/9f1c...",
+        "download_url": "/api/export/pdf/9f1c.../download"
+    }
+    """
+    if not load_pdf_generator().HAS_REPORTLAB:
+        return jsonify({"success": False, "error": REPORTLAB_MISSING}), 400
+    try:
+        job = submit_report()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except QueueFullError as e:
+        response = jsonify({"success": False, "error": str(e)})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    
+    return jsonify(report_job_json(job)), 200 if job.status == 'done' else 202
+
+@app.route('/api/export/pdf/<job_id>', methods=['GET'])
+def export_pdf_status(job_id):
+    """Reports the status of a PDF export job: queued, running, done or failed"""
+    job = find_report_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown job"}), 404
+    return jsonify(report_job_json(job))
+
+@app.route('/api/export/pdf/<job_id>/download', methods=['GET'])
+def export_pdf_download(job_id):
+    """Downloads the PDF produced by a finished export job"""
+    job = find_report_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown job"}), 404
+    if job.status == 'failed':
+        return jsonify({"success": False, "error": job.error}), 500
+    if job.status != 'done':
+        return jsonify({"success": False, "error": f"Report is {job.status}"}), 409
+    return send_report(job)
+
 @app.route('/api/export/pdf', methods=['GET'])
 def export_pdf():
-    """Export activity report as PDF"""
+    """Export activity report as PDF, waiting for the background job"""
+    if not load_pdf_generator().HAS_REPORTLAB:
+        return jsonify({"success": False, "error": REPORTLAB_MISSING}), 400
     try:
-        from backend.pdf_generator import generate_pdf
-    except ModuleNotFoundError:
-        from pdf_generator import generate_pdf
-        
-        # Generate PDF
-        filename = 'codepulse_report_2025.pdf'
-        if generate_pdf(filename):
-            # Return the PDF file
-            from flask import send_file
-            # Serve PDF from data/ directory
-            file_path = os.path.join(os.path.dirname(__file__), '..', 'data', filename)
-            return send_file(
-                file_path,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name=filename
-            )
-        else:
-            return jsonify({
-                "success": False,
-                "error": "Failed to generate PDF"
-            }), 500
-    except ImportError:
-        return jsonify({
-            "success": False,
-            "error": "PDF generation requires reportlab. Install with: pip install reportlab"
-        }), 400
+        job = submit_report()
+        if not job.done.wait(PDF_SYNC_TIMEOUT):
+            return jsonify({"success": False, "error": "Report is still being generated",
+                            **report_job_json(job)}), 202
+        if job.status != 'done':
+            return jsonify({"success": False, "error": job.error}), 500
+        return send_report(job)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": str(e)}), 503
     except Exception as e:
         return jsonify({
             "success": False,
@@ -528,8 +993,8 @@ def index():
                     <span class="status-indicator" id="statusIndicator"></span>
                     <span id="statusText">Loading...</span>
                 </p>
-                <div class="refresh-info">
-                    Auto-updating every 30 seconds
+                <div class="refresh-info" id="refreshInfo">
+                    Live updates
                 </div>
             </header>
             
@@ -591,50 +1056,55 @@ def index():
             let statsChart = null;
             let languagesChart = null;
             
+            // Last response and ETag per URL, for conditional requests
+            const responseCache = {};
+            
+            // In tenant mode the dashboard is opened as /?tenant=<id>
+            const tenant = new URLSearchParams(window.location.search).get('tenant');
+            
+            function apiURL(path) {
+                if (!tenant) return path;
+                const separator = path.includes('?') ? '&' : '?';
+                return path + separator + 'tenant=' + encodeURIComponent(tenant);
+            }
+            
+            async function fetchJSON(url) {
+                url = apiURL(url);
+                const cached = responseCache[url];
+                const headers = cached ? { 'If-None-Match': cached.etag } : {};
+                const response = await fetch(url, { headers: headers, cache: 'no-store' });
+                
+                if (response.status === 304 && cached) {
+                    return { data: cached.data, changed: false };
+                }
+                
+                const data = await response.json();
+                const etag = response.headers.get('ETag');
+                if (etag && data.success) {
+                    responseCache[url] = { etag: etag, data: data };
+                }
+                return { data: data, changed: true };
+            }
+            
             async function fetchAndUpdateDashboard() {
                 try {
                     // Update status
                     setStatus(true);
                     
-                    // Fetch stats data
-                    const statsResponse = await fetch('/api/stats');
-                    const statsData = await statsResponse.json();
-                    
-                    if (!statsData.success) throw new Error('Failed to fetch stats');
-                    
-                    // Fetch languages data
-                    const langResponse = await fetch('/api/languages');
-                    const langData = await langResponse.json();
-                    
-                    if (!langData.success) throw new Error('Failed to fetch languages');
+                    // Fetch every panel from one consistent snapshot
+                    const dashboard = await fetchJSON(
+                        '/api/dashboard?fields=stats,languages,projects'
+                    );
+                    const dashboardData = dashboard.data;
                     
-                    // Fetch projects data
-                    const projectsResponse = await fetch('/api/projects');
-                    const projectsData = await projectsResponse.json();
+                    if (!dashboardData.success) throw new Error('Failed to fetch dashboard');
                     
-                    if (!projectsData.success) throw new Error('Failed to fetch projects');
+                    // Nothing to redraw when the server answered 304
+                    if (!dashboard.changed) return;
                     
-                    // Update charts
-                    updateStatsChart(statsData.labels, statsData.data);
-                    updateLanguagesChart(langData.labels, langData.data);
-                    
-                    // Update stats boxes
-                    document.getElementById('totalMinutes').textContent = 
-                        statsData.summary.total_minutes.toFixed(1);
-                    document.getElementById('totalSessions').textContent = 
-                        statsData.summary.total_sessions;
-                    document.getElementById('languageCount').textContent = 
-                        statsData.summary.languages.length;
-                    document.getElementById('topLanguage').textContent = 
-                        statsData.summary.top_language;
-                    
-                    // Update projects list
-                    updateProjectsList(projectsData.projects);
-                    
-                    // Update last update time
-                    const now = new Date();
-                    document.getElementById('lastUpdate').textContent = 
-                        now.toLocaleTimeString();
+                    renderDashboard(
+                        dashboardData.stats, dashboardData.languages, dashboardData.projects
+                    );
                     
                 } catch (error) {
                     console.error('Error fetching dashboard data:', error);
@@ -642,6 +1112,30 @@ def index():
                 }
             }
             
+            function renderDashboard(statsData, langData, projectsData) {
+                // Update charts
+                updateStatsChart(statsData.labels, statsData.data);
+                updateLanguagesChart(langData.labels, langData.data);
+                
+                // Update stats boxes
+                document.getElementById('totalMinutes').textContent = 
+                    statsData.summary.total_minutes.toFixed(1);
+                document.getElementById('totalSessions').textContent = 
+                    statsData.summary.total_sessions;
+                document.getElementById('languageCount').textContent = 
+                    statsData.summary.languages.length;
+                document.getElementById('topLanguage').textContent = 
+                    statsData.summary.top_language;
+                
+                // Update projects list
+                updateProjectsList(projectsData.projects);
+                
+                // Update last update time
+                const now = new Date();
+                document.getElementById('lastUpdate').textContent = 
+                    now.toLocaleTimeString();
+            }
+            
             function setStatus(online) {
                 const indicator = document.getElementById('statusIndicator');
                 const text = document.getElementById('statusText');
@@ -747,22 +1241,70 @@ def index():
                     return;
                 }
                 
-                list.innerHTML = projects.map(project => `
-                    <li class="project-item">
-                        <div class="project-name">📁 ${project.folder}</div>
-                        <div class="project-stats">
-                            <span class="project-lang">${project.language}</span>
-                            <span class="project-time">${project.duration_minutes.toFixed(1)} min</span>
-                        </div>
-                    </li>
-                `).join('');
+                // Folder and language names come from uploaded heartbeats, so
+                // they are set as text, never parsed as HTML
+                const element = (tag, className, text) => {
+                    const node = document.createElement(tag);
+                    node.className = className;
+                    if (text !== undefined) node.textContent = text;
+                    return node;
+                };
+                list.replaceChildren(...projects.map(project => {
+                    const item = element('li', 'project-item');
+                    const stats = element('div', 'project-stats');
+                    stats.append(
+                        element('span', 'project-lang', project.language),
+                        element('span', 'project-time',
+                                `${project.duration_minutes.toFixed(1)} min`)
+                    );
+                    item.append(element('div', 'project-name', `📁 ${project.folder}`), stats);
+                    return item;
+                }));
             }
             
-            // Initial load
-            fetchAndUpdateDashboard();
+            let pollTimer = null;
+            
+            function startPolling() {
+                if (pollTimer) return;
+                document.getElementById('refreshInfo').textContent =
+                    'Auto-updating every 30 seconds';
+                fetchAndUpdateDashboard();
+                pollTimer = setInterval(fetchAndUpdateDashboard, 30000);
+            }
+            
+            function startLiveUpdates() {
+                if (!window.EventSource) {
+                    startPolling();
+                    return;
+                }
+                
+                // The server pushes a fresh snapshot only when data changes;
+                // EventSource reconnects on its own and resends Last-Event-ID
+                const source = new EventSource(apiURL('/api/stream'));
+                let failures = 0;
+                
+                source.addEventListener('dashboard', (event) => {
+                    failures = 0;
+                    setStatus(true);
+                    const payload = JSON.parse(event.data);
+                    renderDashboard(payload.stats, payload.languages, payload.projects);
+                });
+                
+                source.onopen = () => setStatus(true);
+                
+                source.onerror = () => {
+                    setStatus(false);
+                    failures += 1;
+                    // Give up on streaming behind proxies that keep dropping it, or
+                    // when the server is at its stream limit (503 closes the source)
+                    if (source.readyState === EventSource.CLOSED || failures >= 3) {
+                        source.close();
+                        startPolling();
+                    }
+                };
+            }
             
-            // Auto-refresh every 30 seconds
-            setInterval(fetchAndUpdateDashboard, 30000);
+            startLiveUpdates();
         </script>
     </body>
     </html>
@@ -771,7 +1313,9 @@ def index():
 if __name__ == '__main__':
     # Check if activity.db exists in data/
     db_exists = os.path.exists(get_db_path())
-    if not db_exists:
+    if TENANCY == 'tenant':
+        print(f"Tenant mode: {len(list_tenants())} tenant databases")
+    elif not db_exists:
         print("Warning: data/activity.db not found!")
         print("Please run backend/init_sample_data.py first to create sample data")
     
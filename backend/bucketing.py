@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+CodePulse Bucketing Engine
+Splits a date range into hour/day/week/month buckets and totals each bucket
+from the cheapest table that can answer it
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+try:
+    from backend.config import ANALYTICS_MAX_RANGE_DAYS, ANALYTICS_MAX_BUCKETS
+    from backend.rollups import ROLLUPS, SECONDS_PER_HOUR, raw_retained_from, hourly_retained_from
+    from backend.shards import sessions_source
+    from backend.timeutils import (SECONDS_PER_DAY, get_timezone, local_day_start, local_epoch,
+                                   parse_date_range, utc_offset)
+except ModuleNotFoundError:
+    from config import ANALYTICS_MAX_RANGE_DAYS, ANALYTICS_MAX_BUCKETS
+    from rollups import ROLLUPS, SECONDS_PER_HOUR, raw_retained_from, hourly_retained_from
+    from shards import sessions_source
+    from timeutils import (SECONDS_PER_DAY, get_timezone, local_day_start, local_epoch,
+                           parse_date_range, utc_offset)
+
+# Granularity -> (shortest bucket in seconds, label format), finest first
+GRANULARITIES = {
+    'hour': (SECONDS_PER_HOUR, '%Y-%m-%d %H:00'),
+    'day': (SECONDS_PER_DAY, '%Y-%m-%d'),
+    'week': (7 * SECONDS_PER_DAY, '%Y-%m-%d'),
+    'month': (28 * SECONDS_PER_DAY, '%Y-%m'),
+}
+
+# Rollup table -> bucket column
+ROLLUP_COLUMNS = {table: column for table, (column, _) in ROLLUPS.items()}
+
+# Grouping keys callers may ask for, as (rollup id column, SQL naming that
+# id, SQL naming a raw row `r`). Rollups group by the integer id and only the
+# groups are named; raw rows from shards carry names already.
+GROUP_COLUMNS = {
+    'language': ("language_id", "(SELECT name FROM languages WHERE id = r.language_id)",
+                 "r.language"),
+    'project': ("project_id", "(SELECT name FROM projects WHERE id = r.project_id)",
+                "(SELECT p.name FROM files f JOIN projects p ON p.id = f.project_id"
+                " WHERE f.path = r.file)"),
+}
+
+Buckets = namedtuple('Buckets', 'first last granularity edges labels tz')
+
+
+def hour_start(epoch, tz):
+    """Start of the local hour containing `epoch` (differs from UTC in half-hour zones)"""
+    return epoch - (epoch + utc_offset(epoch, tz)) % SECONDS_PER_HOUR
+
+
+def period_start(epoch, granularity, tz):
+    """Start of the local hour, day, week (Monday) or month containing `epoch`"""
+    if granularity == 'hour':
+        return hour_start(epoch, tz)
+    date = datetime.fromtimestamp(epoch, tz).replace(hour=0, minute=0, second=0, tzinfo=None)
+    if granularity == 'week':
+        date -= timedelta(days=date.weekday())
+    elif granularity == 'month':
+        date = date.replace(day=1)
+    return local_epoch(date, tz)
+
+
+def next_period(epoch, granularity, tz):
+    """Start of the local period after the one containing `epoch`"""
+    if granularity == 'hour':
+        start = hour_start(epoch, tz)
+        following = hour_start(start + SECONDS_PER_HOUR, tz)
+        return following if following > start else following + SECONDS_PER_HOUR
+    date = datetime.fromtimestamp(epoch, tz).replace(hour=0, minute=0, second=0, tzinfo=None)
+    if granularity == 'day':
+        date += timedelta(days=1)
+    elif granularity == 'week':
+        date += timedelta(days=7 - date.weekday())
+    else:
+        date = date.replace(year=date.year + date.month // 12, month=date.month % 12 + 1, day=1)
+    return local_epoch(date, tz)
+
+
+def bucket_edges(start, end, granularity, tz):
+    """
+    Bucket boundaries covering [start, end): start, every local period
+    start in between, then end. The first and last buckets may be partial
+    periods, and days are 23 or 25 hours long when clocks change.
+    """
+    edges = [start]
+    while edges[-1] < end:
+        edges.append(min(next_period(edges[-1], granularity, tz), end))
+    return edges
+
+
+def resolve_buckets(first=None, last=None, granularity='day', default_days=1,
+                    max_buckets=ANALYTICS_MAX_BUCKETS, today=None, tz=None):
+    """
+    Validate a from/to/granularity/tz request and split it into buckets.
+
+    Dates are local to `tz`, so bucket edges fall on its midnights. When
+    the range would need more than `max_buckets` buckets, the next coarser
+    granularity is used instead, so response size stays bounded; the
+    granularity actually used is returned.
+    """
+    tz = get_timezone(tz)
+    granularity = granularity or 'day'
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    first, last = parse_date_range(first, last, default_days=default_days,
+                                   max_days=ANALYTICS_MAX_RANGE_DAYS, today=today, tz=tz)
+    start = local_day_start(first, tz)
+    end = next_period(local_day_start(last, tz), 'day', tz)
+
+    names = list(GRANULARITIES)
+    for name in names[names.index(granularity):]:
+        # Cheap upper bound first, so a year of hours is never materialized
+        if (end - start) // GRANULARITIES[name][0] + 2 > max_buckets and name != names[-1]:
+            continue
+        edges = bucket_edges(start, end, name, tz)
+        if len(edges) - 1 <= max_buckets or name == names[-1]:
+            break
+    fmt = GRANULARITIES[name][1]
+    labels = [datetime.fromtimestamp(period_start(lo, name, tz), tz).strftime(fmt)
+              for lo in edges[:-1]]
+    return Buckets(first, last, name, edges, labels, tz)
+
+
+def plan_sources(conn, edges):
+    """
+    Assign every bucket to a source: {source: [(bucket, lo, hi), ...]}.
+
+    Each bucket is read from the coarsest table whose buckets line up with
+    its edges and that still holds its period: daily_rollup, hourly_rollup,
+    then raw sessions. Where retention has already removed the finer
+    detail, the next coarser table is used with the edges rounded down to
+    its buckets, so old periods stay approximately right instead of empty.
+    """
+    hourly_from = hourly_retained_from(conn)
+    raw_from = raw_retained_from(conn)
+    plan = {}
+    for bucket, (lo, hi) in enumerate(zip(edges, edges[1:])):
+        hourly = lo >= hourly_from
+        if lo % SECONDS_PER_DAY == 0 and hi % SECONDS_PER_DAY == 0:
+            source, size = 'daily_rollup', SECONDS_PER_DAY
+        elif lo % SECONDS_PER_HOUR == 0 and hi % SECONDS_PER_HOUR == 0 and hourly:
+            source, size = 'hourly_rollup', SECONDS_PER_HOUR
+        elif (lo % SECONDS_PER_HOUR or hi % SECONDS_PER_HOUR) and lo >= raw_from:
+            source, size = 'sessions', 1
+        elif hourly:
+            source, size = 'hourly_rollup', SECONDS_PER_HOUR
+        else:
+            source, size = 'daily_rollup', SECONDS_PER_DAY
+        plan.setdefault(source, []).append((bucket, lo // size * size, hi // size * size))
+    return plan
+
+
+def bucket_totals(conn, edges, by=()):
+    """
+    Totals per bucket: rows of (bucket, *by, total_sec, sessions).
+
+    One query per source in use, usually just one. The buckets are joined
+    as a VALUES list, so every bucket becomes an indexed range scan of its
+    source. `by` may hold 'language' and 'project', returned as names.
+    """
+    rows = []
+    for source, buckets in plan_sources(conn, edges).items():
+        values = ", ".join(f"({bucket}, {int(lo)}, {int(hi)})" for bucket, lo, hi in buckets)
+        if source != 'sessions':
+            column = ROLLUP_COLUMNS[source]
+            names = "".join(f", {GROUP_COLUMNS[key][1]}" for key in by)
+            keys = "".join(f", r.{GROUP_COLUMNS[key][0]}" for key in by)
+            rows += conn.execute(f"""
+                WITH buckets(idx, lo, hi) AS (VALUES {values})
+                SELECT b.idx{names}, SUM(r.total_sec), SUM(r.session_count)
+                FROM buckets b JOIN {source} r ON r.{column} >= b.lo AND r.{column} < b.hi
+                GROUP BY b.idx{keys}
+            """).fetchall()
+            continue
+
+        # Buckets that split an hour can only be answered from raw sessions
+        columns = "".join(f", {GROUP_COLUMNS[key][2]} AS {key}" for key in by)
+        keys = "".join(f", r.{key}" for key in by)
+        start, end = buckets[0][1], buckets[-1][2]
+        with sessions_source(conn, start, end, columns="ts, file, language, duration_sec") as raw:
+            rows += conn.execute(f"""
+                WITH buckets(idx, lo, hi) AS (VALUES {values}),
+                     r AS (SELECT ts{columns}, duration_sec FROM {raw} r)
+                SELECT b.idx{keys}, TOTAL(r.duration_sec), COUNT(*)
+                FROM buckets b JOIN r ON r.ts >= b.lo AND r.ts < b.hi
+                GROUP BY b.idx{keys}
+            """).fetchall()
+    return rows
+
+
+def grouped_series(conn, edges, by=()):
+    """
+    Return {key: (seconds per bucket, sessions per bucket)} keyed by the `by` values.
+
+    With no `by`, everything is under the key ().
+    """
+    buckets = len(edges) - 1
+    series = {}
+    for row in bucket_totals(conn, edges, by):
+        key = tuple(row[1:1 + len(by)])
+        if key not in series:
+            series[key] = ([0.0] * buckets, [0] * buckets)
+        seconds, sessions = series[key]
+        seconds[row[0]] += row[-2] or 0
+        sessions[row[0]] += row[-1]
+    return series
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+CodePulse Columnar Archive
+Exports closed months of raw sessions to memory-mapped NumPy columns and
+aggregates them with vectorized reductions
+
+Usage:
+    python -m backend.columnar export [--force]
+    python -m backend.columnar totals --from 2025-01-01 --to 2025-07-01
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from backend.config import COLUMNAR_DIR, SHARD_GRACE_DAYS
+    from backend.db import read_snapshot
+    from backend.shards import sessions_source, month_of, month_bounds, is_main_database
+    from backend.rollups import raw_retained_from
+    from backend.timeutils import SECONDS_PER_DAY, day_start
+except ModuleNotFoundError:
+    from config import COLUMNAR_DIR, SHARD_GRACE_DAYS
+    from db import read_snapshot
+    from shards import sessions_source, month_of, month_bounds, is_main_database
+    from rollups import raw_retained_from
+    from timeutils import SECONDS_PER_DAY, day_start
+
+# Column name -> dtype. Ids index the month's dictionary; -1 means NULL.
+COLUMNS = {
+    'ts': np.int64,
+    'duration': np.float32,
+    'language': np.int16,
+    'file': np.int32,
+}
+
+FETCH_SIZE = 10000
+
+
+def month_dir(month, archive_dir=COLUMNAR_DIR):
+    return Path(archive_dir) / month
+
+
+def _encode(values, dictionary, ids):
+    """Map values to dictionary ids, growing the dictionary as needed"""
+    encoded = []
+    for value in values:
+        if value is None:
+            encoded.append(-1)
+            continue
+        key = ids.get(value)
+        if key is None:
+            key = ids[value] = len(dictionary)
+            dictionary.append(value)
+        encoded.append(key)
+    return encoded
+
+
+def month_fingerprint(conn, start, end):
+    """
+    [sessions, seconds] the daily rollup holds for [start, end).
+
+    Every insert or delete of a raw row changes it, so an archived month is
+    only read while its fingerprint still matches the one it was exported
+    with; rows that arrive later for that month are never missed.
+    """
+    sessions, seconds = conn.execute(
+        "SELECT TOTAL(session_count), TOTAL(total_sec) FROM daily_rollup "
+        "WHERE day >= ? AND day < ?",
+        (start, end)
+    ).fetchone()
+    return [int(sessions), seconds]
+
+
+def export_month(conn, month, archive_dir=COLUMNAR_DIR):
+    """
+    Write one month of sessions (including shards) as a column directory.
+
+    Rows are sorted by ts so readers can slice a date range with a binary
+    search. The directory is built under a temporary name and renamed into
+    place, so readers never see a half-written month. The rows and the
+    month's fingerprint are read from one snapshot.
+    """
+    start, end = month_bounds(month)
+    target = month_dir(month, archive_dir)
+    tmp = target.with_name(target.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    chunks = {name: [] for name in COLUMNS}
+    languages, files = [], []
+    language_ids, file_ids = {}, {}
+    with read_snapshot(conn), \
+            sessions_source(conn, start, end, columns="ts, duration_sec, language, file") as source:
+        fingerprint = month_fingerprint(conn, start, end)
+        cursor = conn.execute(f"SELECT ts, duration_sec, language, file FROM {source} ORDER BY ts")
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            ts, duration, language, file = zip(*rows)
+            chunks['ts'].append(np.array(ts, dtype=COLUMNS['ts']))
+            chunks['duration'].append(
+                np.array([d or 0 for d in duration], dtype=COLUMNS['duration']))
+            chunks['language'].append(
+                np.array(_encode(language, languages, language_ids), dtype=COLUMNS['language']))
+            chunks['file'].append(np.array(_encode(file, files, file_ids), dtype=COLUMNS['file']))
+
+    if len(languages) > np.iinfo(COLUMNS['language']).max:
+        raise ValueError(f"{month} has too many distinct languages for the language column")
+
+    rows = 0
+    for name, dtype in COLUMNS.items():
+        column = np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype)
+        rows = len(column)
+        np.save(tmp / f"{name}.npy", column)
+    with open(tmp / 'dictionary.json', 'w') as f:
+        json.dump({"language": languages, "file": files}, f)
+    with open(tmp / 'meta.json', 'w') as f:
+        json.dump({"month": month, "start": start, "end": end, "rows": rows,
+                   "fingerprint": fingerprint, "exported_at": int(time.time())}, f)
+
+    if target.exists():
+        shutil.rmtree(target)
+    os.replace(tmp, target)
+    return rows
+
+
+def export_closed_months(conn, now=None, force=False, archive_dir=COLUMNAR_DIR,
+                         grace_days=SHARD_GRACE_DAYS):
+    """
+    Export every closed month not yet in the archive, or changed since it
+    was exported; returns {month: rows}.
+
+    Months that retention has already started deleting are skipped, since
+    their raw rows are incomplete. Run this before raw rows expire.
+    """
+    now = now if now is not None else time.time()
+    retained_from = raw_retained_from(conn)
+    with sessions_source(conn, retained_from, columns="ts") as source:
+        oldest = conn.execute(f"SELECT MIN(ts) FROM {source}").fetchone()[0]
+    if oldest is None:
+        return {}
+
+    exported = {}
+    month = month_of(oldest)
+    while month_bounds(month)[1] <= now - grace_days * SECONDS_PER_DAY:
+        complete = month_bounds(month)[0] >= retained_from
+        path = month_dir(month, archive_dir)
+        if complete and (force or not path.exists() or not ColumnarMonth(path).is_current(conn)):
+            exported[month] = export_month(conn, month, archive_dir)
+        month = month_of(month_bounds(month)[1])
+    return exported
+
+
+class ColumnarMonth:
+    """One archived month, memory-mapped: columns are read lazily by the OS"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / 'meta.json') as f:
+            self.meta = json.load(f)
+        with open(self.path / 'dictionary.json') as f:
+            self.dictionary = json.load(f)
+        for name in COLUMNS:
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode='r'))
+
+    def is_current(self, conn):
+        """Whether no rows were added to or removed from the month since it was exported"""
+        fingerprint = month_fingerprint(conn, self.meta['start'], self.meta['end'])
+        return self.meta.get('fingerprint') == fingerprint
+
+    def slice(self, start, end):
+        """Index range of rows with start <= ts < end (a view, no copy)"""
+        return slice(int(np.searchsorted(self.ts, start, 'left')),
+                     int(np.searchsorted(self.ts, end, 'left')))
+
+
+def archive_dir_of(conn):
+    """The columnar archive of `conn`'s database, or None if it has none"""
+    return COLUMNAR_DIR if is_main_database(conn) else None
+
+
+def open_months(start, end, archive_dir=COLUMNAR_DIR, conn=None):
+    """
+    Archived months overlapping [start, end); none without a directory.
+
+    With `conn`, months whose rows changed since they were exported are
+    left out, so the caller reads them from the database instead.
+    """
+    months = []
+    if archive_dir is None:
+        return months
+    for path in sorted(Path(archive_dir).glob('????-??')):
+        month_start, month_end = month_bounds(path.name)
+        if month_end > start and month_start < end:
+            month = ColumnarMonth(path)
+            if conn is None or month.is_current(conn):
+                months.append(month)
+    return months
+
+
+def language_totals(start, end, archive_dir=COLUMNAR_DIR):
+    """Return {language: seconds} for [start, end); NULL languages are keyed None"""
+    totals = {}
+    for month in open_months(start, end, archive_dir):
+        rows = month.slice(start, end)
+        ids = month.language[rows].astype(np.int64) + 1  # shift so NULL (-1) lands in bin 0
+        seconds = np.bincount(ids, weights=month.duration[rows],
+                              minlength=len(month.dictionary['language']) + 1)
+        for key, total in zip([None, *month.dictionary['language']], seconds):
+            if total:
+                totals[key] = totals.get(key, 0.0) + float(total)
+    return totals
+
+
+def daily_totals(start, end, archive_dir=COLUMNAR_DIR):
+    """Return a float64 array of seconds per UTC day in [start, end)"""
+    days = max(0, (end - start + SECONDS_PER_DAY - 1) // SECONDS_PER_DAY)
+    totals = np.zeros(days)
+    for month in open_months(start, end, archive_dir):
+        rows = month.slice(start, end)
+        offsets = (month.ts[rows] - start) // SECONDS_PER_DAY
+        totals += np.bincount(offsets, weights=month.duration[rows], minlength=days)[:days]
+    return totals
+
+
+def main(argv=None):
+    try:
+        from backend.db import get_db_connection
+    except ModuleNotFoundError:
+        from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Columnar archive of session history")
+    parser.add_argument('command', choices=['export', 'totals'])
+    parser.add_argument('--force', action='store_true', help="re-export months already archived")
+    parser.add_argument('--from', dest='start', help="first day (YYYY-MM-DD) for totals")
+    parser.add_argument('--to', dest='end', help="day after the last (YYYY-MM-DD) for totals")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        exported = export_closed_months(get_db_connection(), force=args.force)
+        for month, rows in exported.items():
+            print(f"✅ {month}: {rows} sessions")
+        if not exported:
+            print("Archive is up to date")
+        return 0
+
+    if not args.start or not args.end:
+        parser.error("totals needs --from and --to")
+    start, end = day_start(args.start), day_start(args.end)
+    started = time.perf_counter()
+    totals = language_totals(start, end)
+    elapsed = (time.perf_counter() - started) * 1000
+    for language, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"{language or 'Unknown':20s} {seconds / 60:10.1f} min")
+    print(f"({elapsed:.1f} ms)")
+    conn = get_db_connection()
+    stale = [month.meta['month'] for month in open_months(start, end) if not month.is_current(conn)]
+    if stale:
+        print(f"⚠️  Changed since they were exported: {', '.join(stale)}. "
+              f"Run `python -m backend.columnar export` to refresh them.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
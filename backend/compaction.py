@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+CodePulse Heartbeat Compaction
+Merges runs of per-minute heartbeat rows into single session rows
+
+Usage:
+    python -m backend.compaction [--gap SECONDS] [--full]
+"""
+
+import argparse
+import sys
+import time
+
+try:
+    from backend.config import COMPACTION_IDLE_GAP, COMPACTION_BATCH_HOURS
+    from backend.rollups import ROLLUPS, PROJECT_SQL, SECONDS_PER_HOUR
+except ModuleNotFoundError:
+    from config import COMPACTION_IDLE_GAP, COMPACTION_BATCH_HOURS
+    from rollups import ROLLUPS, PROJECT_SQL, SECONDS_PER_HOUR
+
+# Removes merged rows from their rollup buckets. total_sec is unchanged
+# because the surviving row carries the summed duration of the whole run.
+ROLLUP_MERGE_SQL = [f"""
+    UPDATE {table}
+    SET session_count = session_count - ?
+    WHERE ({column}, language_id, project_id) IS (
+        SELECT {bucket_sql.format(row='s')}, s.language_id, {PROJECT_SQL.format(row='s')}
+        FROM session_rows s WHERE s.rowid = ?
+    )
+""" for table, (column, bucket_sql) in ROLLUPS.items()]
+
+
+def plan_hour(rows, idle_gap):
+    """
+    Group one hour of rows, ordered by time, into runs to merge.
+
+    A run continues while the next row has the same file and language ids and
+    starts at most `idle_gap` seconds after the run ends; any other row in
+    between ends it. Returns a list of runs of two or more rows.
+    """
+    runs = []
+    current = []
+    run_end = None
+    for row in rows:
+        rowid, file, language, ts, duration, end_ts = row
+        end = end_ts if end_ts is not None else ts + int(duration or 0)
+        if current and (file, language) == current[0][1:3] and ts - run_end <= idle_gap:
+            current.append(row)
+            run_end = max(run_end, end)
+            continue
+        if len(current) > 1:
+            runs.append(current)
+        current = [row]
+        run_end = end
+    if len(current) > 1:
+        runs.append(current)
+    return runs
+
+
+def merge_run(conn, run):
+    """Fold a run into its first row and delete the rest"""
+    keep = run[0][0]
+    duration = sum(row[4] or 0 for row in run)
+    end = max(row[5] if row[5] is not None else row[3] + int(row[4] or 0) for row in run)
+    merged = [(row[0],) for row in run[1:]]
+
+    for sql in ROLLUP_MERGE_SQL:
+        conn.execute(sql, (len(merged), keep))
+    conn.execute(
+        "UPDATE session_rows SET duration_sec = ?, end_ts = ? WHERE rowid = ?",
+        (duration, end, keep)
+    )
+    conn.executemany("DELETE FROM session_rows WHERE rowid = ?", merged)
+    return len(merged)
+
+
+def compact_hours(conn, hours, idle_gap):
+    """Compact the given hour buckets; the caller owns the transaction"""
+    removed = 0
+    for hour in hours:
+        start = hour * SECONDS_PER_HOUR
+        rows = conn.execute(
+            """
+            SELECT rowid, file_id, language_id, ts, duration_sec, end_ts
+            FROM session_rows
+            WHERE ts >= ? AND ts < ?
+            ORDER BY ts, rowid
+            """,
+            (start, start + SECONDS_PER_HOUR)
+        ).fetchall()
+        for run in plan_hour([tuple(row) for row in rows], idle_gap):
+            removed += merge_run(conn, run)
+        # Mark the hour as seen; end_ts is not watched by the change triggers
+        conn.execute(
+            """
+            UPDATE session_rows SET end_ts = ts + CAST(COALESCE(duration_sec, 0) AS INTEGER)
+            WHERE end_ts IS NULL AND ts >= ? AND ts < ?
+            """,
+            (start, start + SECONDS_PER_HOUR)
+        )
+    return removed
+
+
+def compact(conn, idle_gap=COMPACTION_IDLE_GAP, full=False, batch_hours=COMPACTION_BATCH_HOURS):
+    """
+    Compact every hour that received rows since the last run (or all hours).
+
+    Rows not yet compacted have no end_ts, so only the hours they fall in
+    are re-read. Each hour is compacted as a whole, so late or out-of-order
+    rows still join their neighbours. Runs never span an hour boundary,
+    which keeps each merged row inside the rollup buckets its heartbeats
+    were counted in. Compaction is idempotent: a batch interrupted part-way
+    is simply redone next time.
+    """
+    started = time.perf_counter()
+    conn.commit()
+    hours = [row[0] for row in conn.execute(
+        f"""
+        SELECT DISTINCT ts / {SECONDS_PER_HOUR} FROM session_rows
+        WHERE ts IS NOT NULL {'' if full else 'AND end_ts IS NULL'}
+        ORDER BY 1
+        """
+    )]
+
+    removed = 0
+    for i in range(0, len(hours), batch_hours):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed += compact_hours(conn, hours[i:i + batch_hours], idle_gap)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return {
+        "hours": len(hours),
+        "rows_removed": removed,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def main(argv=None):
+    try:
+        from backend.db import get_db_connection
+    except ModuleNotFoundError:
+        from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Merge heartbeat rows into sessions")
+    parser.add_argument('--gap', type=int, default=COMPACTION_IDLE_GAP,
+                        help="longest idle gap in seconds inside one session")
+    parser.add_argument('--full', action='store_true', help="recheck every hour, not just new rows")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    before = conn.execute("SELECT COUNT(*) FROM session_rows").fetchone()[0]
+    result = compact(conn, idle_gap=args.gap, full=args.full)
+    after = before - result['rows_removed']
+    print(f"✅ Compacted {result['hours']} hours: {before} -> {after} rows "
+          f"in {result['elapsed_ms']:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
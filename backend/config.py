@@ -24,6 +24,190 @@ DOCS_DIR = PROJECT_ROOT / 'docs'
 # Create data directory if it doesn't exist
 DATA_DIR.mkdir(exist_ok=True)
 
+# SQLite tuning profiles applied to every pooled connection (see backend/db.py)
+# cache_size is negative to mean KiB rather than pages
+SQLITE_PROFILES = {
+    'default': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16384,
+        'mmap_size': 128 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 10000,
+        'cache_size': -16384,
+        'mmap_size': 128 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    'low_memory': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -2048,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+    },
+}
+
+# Active SQLite profile name
+SQLITE_PROFILE = os.getenv('CODEPULSE_SQLITE_PROFILE', 'default')
+
+# Prepared statements kept per connection
+SQLITE_STATEMENT_CACHE = 256
+
+# Live stream (/api/stream): seconds between change checks, seconds between
+# keep-alive comments, and the client reconnect delay in milliseconds. A
+# database's change detector stops once it has had no subscribers for
+# STREAM_MONITOR_IDLE_SECONDS. Every open stream holds a server thread, so a
+# process serves at most STREAM_MAX_CLIENTS streams (answering 503 beyond
+# that, and the dashboard falls back to polling); keep it below the worker's
+# thread count (gunicorn --threads) to leave threads for other requests.
+STREAM_POLL_INTERVAL = 2
+STREAM_HEARTBEAT_INTERVAL = 15
+STREAM_RETRY_MS = 5000
+STREAM_MONITOR_IDLE_SECONDS = 60
+STREAM_MAX_CLIENTS = int(os.getenv('CODEPULSE_STREAM_MAX_CLIENTS', 24))
+
+# In-process cache of serialized API responses, keyed by data version
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_TTL = 60  # seconds
+
+# Background PDF export: worker threads, queued jobs accepted before
+# rejecting new ones, and job records kept for status polling
+PDF_WORKERS = 2
+PDF_MAX_PENDING = 8
+PDF_MAX_JOBS = 100
+
+# Finished reports are cached in memory, keyed by data version and report
+# parameters. Reports larger than PDF_SPOOL_THRESHOLD bytes are spooled to a
+# private temporary file instead; nothing is ever written under data/.
+PDF_SPOOL_THRESHOLD = 1024 * 1024
+PDF_CACHE_MAX_REPORTS = 20
+PDF_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Seconds GET /api/export/pdf waits for a report before giving up
+PDF_SYNC_TIMEOUT = 120
+
+# Bulk ingestion (POST /api/sessions): rows accepted per request, the longest
+# plausible single heartbeat, and how long idempotency keys are remembered.
+# Uploads must send INGEST_TOKEN as a bearer token; without one the endpoint
+# is disabled.
+INGEST_MAX_ROWS = 100000
+INGEST_MAX_DURATION_SEC = 24 * 60 * 60
+INGEST_KEY_TTL = 7 * 24 * 60 * 60  # seconds
+INGEST_TOKEN = os.getenv('CODEPULSE_INGEST_TOKEN')
+
+# Spool ingestion daemon (python -m backend.spool_ingest): collectors append
+# NDJSON heartbeats to *.ndjson files in SPOOL_DIR. Rows are committed when
+# SPOOL_BATCH_ROWS are pending or the oldest has waited SPOOL_BATCH_SECONDS;
+# fully read files untouched for SPOOL_IDLE_SECONDS are deleted.
+SPOOL_DIR = Path(os.getenv('CODEPULSE_SPOOL_DIR', DATA_DIR / 'spool'))
+SPOOL_BATCH_ROWS = 5000
+SPOOL_BATCH_SECONDS = 2.0
+SPOOL_POLL_INTERVAL = 1.0
+SPOOL_IDLE_SECONDS = 60
+SPOOL_READ_BYTES = 1024 * 1024
+
+# Heartbeat compaction (python -m backend.compaction): consecutive rows for the
+# same file and language at most COMPACTION_IDLE_GAP seconds apart are merged
+# into one session row, never across an hour boundary
+COMPACTION_IDLE_GAP = 5 * 60
+COMPACTION_BATCH_HOURS = 24
+
+# Storage layout: 'single' keeps every raw row in activity.db; 'monthly' lets
+# `python -m backend.shards archive` move each closed month into its own
+# read-only shard file in SHARD_DIR, SHARD_GRACE_DAYS after the month ends
+STORAGE_MODE = os.getenv('CODEPULSE_STORAGE_MODE', 'single')
+SHARD_DIR = DATA_DIR / 'shards'
+SHARD_GRACE_DAYS = 2
+
+# Columnar archive (python -m backend.columnar export): closed months of raw
+# sessions as memory-mappable NumPy arrays for long-range analytics
+COLUMNAR_DIR = DATA_DIR / 'columnar'
+
+# Tiered retention (python -m backend.retention): raw session rows are kept
+# for RETENTION_RAW_DAYS, hourly totals for RETENTION_HOURLY_MONTHS and daily
+# totals forever. Rows are deleted RETENTION_BATCH_SIZE per transaction and
+# freed pages returned to the OS RETENTION_VACUUM_PAGES at a time.
+RETENTION_RAW_DAYS = 30
+RETENTION_HOURLY_MONTHS = 12
+RETENTION_BATCH_SIZE = 5000
+RETENTION_VACUUM_PAGES = 1000
+
+# Focus streaks (/api/streaks): sessions less than STREAK_IDLE_GAP seconds
+# apart form one focus interval; a day counts towards a day streak once it has
+# STREAK_MIN_DAY_MINUTES of activity. Intervals are counted per day in
+# buckets starting at STREAK_HISTOGRAM_MINUTES, and results for finished days
+# are cached for up to STREAK_CACHE_MAX_DAYS days.
+STREAK_IDLE_GAP = 5 * 60
+STREAK_MIN_DAY_MINUTES = 1
+STREAK_HISTOGRAM_MINUTES = (0, 15, 30, 60, 120)
+STREAK_MAX_RANGE_DAYS = 5 * 366
+STREAK_CACHE_MAX_DAYS = 4096
+
+# Projects (/api/projects): each file is assigned to a project when it is
+# first written. A file under one of PROJECT_WORKSPACES (directories separated
+# by os.pathsep) belongs to the folder directly inside it; otherwise, with
+# PROJECT_GIT_ROOTS, to the nearest enclosing git checkout; otherwise to the
+# first folder of its path. Git checkouts are looked up on the server's own
+# disk, so only turn PROJECT_GIT_ROOTS on where the editors run on the same
+# machine; the directories checked are cached up to PROJECT_GIT_CACHE_MAX_ENTRIES.
+# After changing these, reassign existing files with
+# `python -m backend.projects backfill`.
+PROJECT_WORKSPACES = [
+    path for path in os.getenv('CODEPULSE_PROJECT_WORKSPACES', '').split(os.pathsep) if path
+]
+PROJECT_GIT_ROOTS = os.getenv('CODEPULSE_PROJECT_GIT_ROOTS', '0') == '1'
+PROJECT_GIT_CACHE_MAX_ENTRIES = 10000
+PROJECT_BACKFILL_BATCH = 5000
+
+# Raw sessions store languages and files as integer ids (backend/dimensions.py);
+# ingest keeps the ids of this many recently seen names per dimension in memory
+DIMENSION_CACHE_MAX_ENTRIES = 50000
+
+# Language names (backend/languages.py): uploaded heartbeats get one canonical
+# name per language at ingest. Rows written through the sessions view, like
+# the C++ monitor's, are renamed by `python -m backend.languages backfill`,
+# LANGUAGE_BACKFILL_BATCH rows per transaction.
+LANGUAGE_BACKFILL_BATCH = 5000
+
+# Tenancy (backend/tenants.py): 'single' serves every request from activity.db;
+# 'tenant' gives each user or workspace its own database file in TENANT_DIR,
+# chosen by the X-CodePulse-Tenant header or `tenant` query parameter. Tenant
+# connections share a pool of at most TENANT_MAX_CONNECTIONS open files; a
+# request waits up to TENANT_CONNECTION_TIMEOUT seconds for one. The admin
+# aggregate (/api/admin/tenants, enabled by setting CODEPULSE_ADMIN_TOKEN)
+# reads TENANT_ADMIN_WORKERS tenants at a time.
+TENANCY = os.getenv('CODEPULSE_TENANCY', 'single')
+TENANT_DIR = Path(os.getenv('CODEPULSE_TENANT_DIR', DATA_DIR / 'tenants'))
+TENANT_MAX_CONNECTIONS = int(os.getenv('CODEPULSE_TENANT_MAX_CONNECTIONS', 64))
+TENANT_CONNECTION_TIMEOUT = 10
+TENANT_ADMIN_WORKERS = 8
+ADMIN_TOKEN = os.getenv('CODEPULSE_ADMIN_TOKEN')
+
+# Timezone that day, week and month buckets follow when a request has no
+# tz parameter (an IANA name such as 'Europe/Berlin')
+TIMEZONE = os.getenv('CODEPULSE_TIMEZONE', 'UTC')
+
+# Date ranges on the analytics endpoints (/api/stats, /api/languages,
+# /api/projects, /api/dashboard): longest from/to range in days, and the most
+# buckets a response may hold before a coarser granularity is used
+ANALYTICS_MAX_RANGE_DAYS = 5 * 366
+ANALYTICS_MAX_BUCKETS = 400
+
+# Heatmaps (/api/heatmap/weekly and /api/heatmap/calendar): longest range in
+# days, and how many finished periods are cached
+HEATMAP_MAX_RANGE_DAYS = 5 * 366
+HEATMAP_CACHE_MAX_ENTRIES = 256
+
+# Startup budget checked by `python -m backend.startup_benchmark`: milliseconds
+# from launching the interpreter until the API has answered its first request
+STARTUP_BUDGET_MS = int(os.getenv('CODEPULSE_STARTUP_BUDGET_MS', 1500))
+
 # Flask configuration
 class Config:
     """Base configuration"""
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+CodePulse Database Connections
+Keeps one tuned SQLite connection per worker thread and database file,
+and a bounded pool of connections shared across many database files
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from backend.config import (get_db_path, SQLITE_PROFILES, SQLITE_PROFILE,
+                                SQLITE_STATEMENT_CACHE, TENANT_MAX_CONNECTIONS,
+                                TENANT_CONNECTION_TIMEOUT)
+    from backend.migrations import ensure_schema
+except ModuleNotFoundError:
+    from config import (get_db_path, SQLITE_PROFILES, SQLITE_PROFILE,
+                        SQLITE_STATEMENT_CACHE, TENANT_MAX_CONNECTIONS,
+                        TENANT_CONNECTION_TIMEOUT)
+    from migrations import ensure_schema
+
+_local = threading.local()
+
+
+class Connection(sqlite3.Connection):
+    """A connection that remembers its last data_version() result"""
+    version = None
+
+
+def apply_profile(conn, profile=None):
+    """Apply a PRAGMA profile from config.SQLITE_PROFILES to a connection"""
+    settings = SQLITE_PROFILES[profile or SQLITE_PROFILE]
+    for pragma, value in settings.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+def open_connection(db_path=None, profile=None, check_same_thread=True):
+    """
+    Open a new tuned connection with an up-to-date schema.
+
+    Pass check_same_thread=False for connections handed between threads,
+    which must then be used by only one thread at a time.
+    """
+    db_path = db_path or get_db_path()
+    settings = SQLITE_PROFILES[profile or SQLITE_PROFILE]
+    conn = sqlite3.connect(
+        db_path,
+        timeout=settings.get('busy_timeout', 5000) / 1000.0,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        factory=Connection,
+        check_same_thread=check_same_thread,
+        # Lets ATTACH open monthly shards read-only with file: URIs
+        uri=True
+    )
+    conn.row_factory = sqlite3.Row
+    apply_profile(conn, profile)
+    ensure_schema(conn, db_path)
+    return conn
+
+
+def _thread_connections():
+    """Connections owned by this thread, reset after a fork"""
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        # Connections inherited across fork() must never be reused
+        _local.pid = pid
+        _local.connections = {}
+    return _local.connections
+
+
+def get_db_connection(db_path=None):
+    """
+    Return this thread's connection to `db_path` (the main database by default).
+
+    The connection stays open for the life of the thread so its page cache
+    and prepared statements are reused across requests; callers must not
+    close it.
+    """
+    db_path = db_path or get_db_path()
+    connections = _thread_connections()
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = open_connection(db_path)
+        connections[db_path] = conn
+    return conn
+
+
+def data_version(conn):
+    """
+    Return (generation, updated_at) for the sessions table.
+
+    generation is bumped by triggers on every insert, update and delete, so
+    it changes whenever any dashboard number could. The counter row is only
+    re-read when PRAGMA data_version or this connection's own change count
+    shows that something was committed since the last call.
+    """
+    pragma_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    marker = (pragma_version, conn.total_changes)
+
+    cached = getattr(conn, 'version', None)
+    if cached and cached[0] == marker:
+        return cached[1]
+
+    row = conn.execute(
+        "SELECT value, updated_at FROM codepulse_meta WHERE key = 'sessions_generation'"
+    ).fetchone()
+    version = (row[0], row[1]) if row else (0, 0)
+    if isinstance(conn, Connection):
+        conn.version = (marker, version)
+    return version
+
+
+@contextmanager
+def read_snapshot(conn):
+    """
+    Run a group of reads inside one transaction.
+
+    In WAL mode the first read pins a snapshot, so every query in the block
+    sees the same data even while the monitor keeps inserting.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+def release_connections():
+    """Roll back any transaction left open by a failed request on this thread"""
+    for conn in _thread_connections().values():
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def close_connections():
+    """Close every connection owned by this thread"""
+    connections = _thread_connections()
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+# ============================================================================
+# Shared pool for many database files
+# ============================================================================
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool's timeout"""
+
+
+class ConnectionPool:
+    """
+    Connections to any number of database files within a fixed budget of
+    open files.
+
+    Idle connections are kept per file in least-recently-used order. A
+    request for a file with an idle connection reuses it; otherwise a new
+    one is opened, closing the least recently used idle connection first
+    when the budget is spent, or waiting for one to be released when every
+    connection is in use. Connections are opened with check_same_thread
+    off, since a request may be served by any thread, but each one is
+    only ever held by one caller at a time.
+    """
+
+    def __init__(self, max_open=TENANT_MAX_CONNECTIONS, timeout=TENANT_CONNECTION_TIMEOUT,
+                 profile=None):
+        self.max_open = max_open
+        self.timeout = timeout
+        self.profile = profile
+        self._idle = OrderedDict()
+        self._open = 0
+        self._available = threading.Condition()
+        self._pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, db_path):
+        """Return a connection to `db_path` for the caller's exclusive use until release()"""
+        deadline = time.monotonic() + self.timeout
+        evicted = None
+        with self._available:
+            self._check_fork()
+            while True:
+                idle = self._idle.get(db_path)
+                if idle:
+                    conn = idle.pop()
+                    if not idle:
+                        del self._idle[db_path]
+                    self.hits += 1
+                    return conn
+                if self._open < self.max_open:
+                    break
+                if self._idle:
+                    evicted = self._evict()
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"All {self.max_open} database connections are busy")
+                self._available.wait(remaining)
+            self._open += 1
+            self.misses += 1
+
+        if evicted is not None:
+            evicted.close()
+        try:
+            return open_connection(db_path, self.profile, check_same_thread=False)
+        except Exception:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+
+    def release(self, db_path, conn):
+        """Return a connection from acquire(), rolling back anything left open"""
+        with self._available:
+            if os.getpid() != self._pid:
+                return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            conn.close()
+            return
+        with self._available:
+            self._idle.setdefault(db_path, []).append(conn)
+            self._idle.move_to_end(db_path)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self, db_path):
+        """acquire() and release() around a block"""
+        conn = self.acquire(db_path)
+        try:
+            yield conn
+        finally:
+            self.release(db_path, conn)
+
+    def close_idle(self):
+        """Close every idle connection, e.g. before removing database files"""
+        with self._available:
+            self._check_fork()
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+            self._open -= len(idle)
+            self._available.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._available:
+            return {
+                "open": self._open,
+                "idle": sum(len(conns) for conns in self._idle.values()),
+                "max_open": self.max_open,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _evict(self):
+        """Take the least recently used idle connection off the books; the caller closes it"""
+        db_path, conns = next(iter(self._idle.items()))
+        conn = conns.pop(0)
+        if not conns:
+            del self._idle[db_path]
+        self._open -= 1
+        self.evictions += 1
+        return conn
+
+    def _check_fork(self):
+        # Connections inherited across fork() must never be reused
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = OrderedDict()
+            self._open = 0
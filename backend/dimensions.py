@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+CodePulse Dimensions
+Dictionary-encoded session storage: languages and file paths are interned
+once into small integer ids, and `sessions` is a view that decodes them
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from backend.config import DIMENSION_CACHE_MAX_ENTRIES
+    from backend.projects import DEFAULT_RULES, register_files
+    from backend.rollups import FOLDER_SQL, rollup_leave_sql
+except ModuleNotFoundError:
+    from config import DIMENSION_CACHE_MAX_ENTRIES
+    from projects import DEFAULT_RULES, register_files
+    from rollups import FOLDER_SQL, rollup_leave_sql
+
+DIMENSION_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS projects(
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS languages(
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    # project_id is NULL only for blank paths, which belong to no project
+    """
+    CREATE TABLE IF NOT EXISTS files(
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        project_id INTEGER REFERENCES projects(id)
+    )
+    """,
+]
+
+# Raw sessions as stored: the same columns as before, with file and
+# language replaced by dimension ids
+SESSION_ROWS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS session_rows(
+        timestamp TEXT,
+        file_id INTEGER,
+        language_id INTEGER,
+        duration_sec FLOAT,
+        ts INTEGER,
+        end_ts INTEGER
+    )
+    """,
+    # Leading ts column serves plain range scans; the trailing columns
+    # let per-day and per-language totals be answered from the index alone
+    """
+    CREATE INDEX IF NOT EXISTS idx_session_rows_ts_language_duration
+    ON session_rows(ts, language_id, duration_sec)
+    """,
+    # Compaction sets end_ts on every row it has seen
+    """
+    CREATE INDEX IF NOT EXISTS idx_session_rows_uncompacted
+    ON session_rows(ts) WHERE end_ts IS NULL
+    """,
+    *[f"""
+    CREATE TRIGGER IF NOT EXISTS session_rows_generation_{event.split()[0].lower()}
+    AFTER {event} ON session_rows
+    BEGIN
+        UPDATE codepulse_meta
+        SET value = value + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+        WHERE key = 'sessions_generation';
+    END
+    """ for event in (
+        'INSERT',
+        'DELETE',
+        # Compaction's end_ts bookkeeping is not a data change
+        'UPDATE OF timestamp, file_id, language_id, duration_sec',
+    )],
+]
+
+# The pre-dictionary `sessions` table as a view, for existing readers and
+# for writers such as the C++ monitor that insert names. Inserted files get
+# the legacy first-folder project until `python -m backend.projects backfill`.
+SESSIONS_VIEW_SCHEMA = [
+    """
+    CREATE VIEW IF NOT EXISTS sessions AS
+    SELECT r.rowid AS rowid, r.timestamp, f.path AS file, l.name AS language,
+           r.duration_sec, r.ts, r.end_ts
+    FROM session_rows r
+    LEFT JOIN files f ON f.id = r.file_id
+    LEFT JOIN languages l ON l.id = r.language_id
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sessions_insert
+    INSTEAD OF INSERT ON sessions
+    BEGIN
+        INSERT OR IGNORE INTO languages(name)
+        SELECT NEW.language WHERE NEW.language IS NOT NULL;
+        INSERT OR IGNORE INTO projects(name)
+        SELECT {FOLDER_SQL.format(row='NEW')}
+        WHERE {FOLDER_SQL.format(row='NEW')} IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM files WHERE path = NEW.file);
+        INSERT OR IGNORE INTO files(path, project_id)
+        SELECT NEW.file, (SELECT id FROM projects WHERE name = {FOLDER_SQL.format(row='NEW')})
+        WHERE NEW.file IS NOT NULL;
+        INSERT INTO session_rows(timestamp, file_id, language_id, duration_sec, ts, end_ts)
+        VALUES (
+            NEW.timestamp,
+            (SELECT id FROM files WHERE path = NEW.file),
+            (SELECT id FROM languages WHERE name = NEW.language),
+            NEW.duration_sec,
+            COALESCE(NEW.ts, CAST(NEW.timestamp AS INTEGER)),
+            NEW.end_ts
+        );
+    END
+    """,
+    # Replaced by SESSIONS_DELETE_TRIGGER in migration 12
+    """
+    CREATE TRIGGER IF NOT EXISTS sessions_delete
+    INSTEAD OF DELETE ON sessions
+    BEGIN
+        DELETE FROM session_rows WHERE rowid = OLD.rowid;
+    END
+    """,
+]
+
+# Rows deleted through the view leave the rollups too, so re-seeding with
+# `DELETE FROM sessions` keeps totals right; maintenance jobs that age rows
+# out on purpose (compaction, retention, shards) delete session_rows directly.
+SESSIONS_DELETE_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS sessions_delete
+    INSTEAD OF DELETE ON sessions
+    BEGIN
+        {"; ".join(rollup_leave_sql('OLD.rowid'))};
+        DELETE FROM session_rows WHERE rowid = OLD.rowid;
+    END
+    """
+
+
+def database_key(conn):
+    """Identifies the main database file of `conn`, even across re-creation"""
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not path:
+        return ('memory', id(conn))
+    try:
+        return (path, os.stat(path).st_ino)
+    except OSError:
+        return (path, None)
+
+
+class Dictionary:
+    """
+    Interns the values of one dimension table column, e.g. language names.
+
+    Ids of committed rows are kept in a thread-safe LRU keyed by database,
+    so steady-state ingest resolves every name without a query. Ids created
+    by the current transaction are not cached, so a rollback can never
+    leave an entry pointing at an id that is later reused.
+    """
+
+    def __init__(self, table, column, max_entries=DIMENSION_CACHE_MAX_ENTRIES):
+        self.table = table
+        self.column = column
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ids(self, conn, values, create):
+        """
+        Return {value: id} for the non-NULL `values`.
+
+        Values the table lacks are passed to create(conn, missing), which
+        must insert them. Call at most once per write transaction, before
+        the transaction has inserted into this table.
+        """
+        database = database_key(conn)
+        found = {}
+        missing = []
+        with self._lock:
+            for value in {value for value in values if value is not None}:
+                key = (database, value)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[value] = self._entries[key]
+                else:
+                    missing.append(value)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if not missing:
+            return found
+
+        committed = self._select(conn, missing)
+        with self._lock:
+            for value, row_id in committed.items():
+                self._entries[(database, value)] = row_id
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        found.update(committed)
+
+        new = [value for value in missing if value not in committed]
+        if new:
+            create(conn, new)
+            found.update(self._select(conn, new))
+        return found
+
+    def _select(self, conn, values):
+        found = {}
+        for i in range(0, len(values), LOOKUP_CHUNK):
+            chunk = values[i:i + LOOKUP_CHUNK]
+            found.update(conn.execute(
+                f"SELECT {self.column}, id FROM {self.table} "
+                f"WHERE {self.column} IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ).fetchall())
+        return found
+
+
+# Values looked up per query; stays below SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+language_ids = Dictionary('languages', 'name')
+file_ids = Dictionary('files', 'path')
+
+
+def _create_languages(conn, names):
+    conn.executemany("INSERT OR IGNORE INTO languages(name) VALUES (?)",
+                     [(name,) for name in names])
+
+
+def intern_languages(conn, names):
+    """Return {name: id} for `names`, adding the ones not seen before"""
+    return language_ids.ids(conn, names, _create_languages)
+
+
+def encode_rows(conn, rows, rules=DEFAULT_RULES):
+    """
+    Turn (timestamp, file, language, duration_sec, ts) rows into
+    (timestamp, file_id, language_id, duration_sec, ts) rows for session_rows.
+
+    New files are assigned their project by `rules` as they are interned.
+    Runs inside the caller's write transaction.
+    """
+    languages = intern_languages(conn, (row[2] for row in rows))
+    files = file_ids.ids(conn, (row[1] for row in rows),
+                         lambda conn, paths: register_files(conn, paths, rules))
+    return [(timestamp, files.get(file), languages.get(language), duration, ts)
+            for timestamp, file, language, duration, ts in rows]
@@ -4,67 +4,36 @@ CodePulse Dashboard Generator
 Reads activity.db and generates visualizations
 """
 
-import sqlite3
 import json
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+from datetime import datetime
 from collections import defaultdict
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, render_template_string
 import os
-from backend.config import get_db_path, DATA_DIR, FRONTEND_DIR
+from backend.config import DATA_DIR, FRONTEND_DIR
+from backend.aggregates import window_stats, language_totals
+from backend.db import get_db_connection, close_connections
 
 app = Flask(__name__)
 
-# Connect to database
-def get_db_connection():
-    # Centralized database path
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row
-    return conn
+def load_pyplot():
+    """Import matplotlib on first use, forcing the non-interactive Agg backend"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 # Get language distribution for a specific date
 def get_language_distribution(conn, date):
-    cursor = conn.cursor()
-    query = """
-    SELECT language, SUM(duration_sec) as total_duration 
-    FROM sessions 
-    WHERE date(CAST(timestamp AS INTEGER), 'unixepoch') = ? 
-    GROUP BY language 
-    ORDER BY total_duration DESC
-    """
-    cursor.execute(query, (date,))
-    rows = cursor.fetchall()
-    
     result = {}
-    for row in rows:
-        result[row['language'] if row['language'] else 'Other'] = row['total_duration']
+    for language, total_duration, _ in language_totals(conn, date):
+        result[language if language else 'Other'] = total_duration
     
     return result
 
 # Get focus data over time (last 7 days)
-@app.route('/stats', methods=['POST'])
 def get_focus_over_time(conn, days=7):
-    cursor = conn.cursor()
-    dates = []
-    focus_counts = []
-    
-    for i in range(days, -1, -1):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-        query = """
-        SELECT COUNT(*) as session_count, SUM(duration_sec) as total_duration
-        FROM sessions 
-        WHERE date(CAST(timestamp AS INTEGER), 'unixepoch') = ?
-        """
-        cursor.execute(query, (date,))
-        row = cursor.fetchone()
-        
-        total_duration = row['total_duration'] if row['total_duration'] else 0
-        # Convert to minutes for better readability
-        dates.append(date)
-        focus_counts.append(total_duration / 60.0)  # in minutes
-
-    return jsonify(dates=dates, focus_counts=focus_counts)
+    stats = window_stats(conn, days=days)
+    return stats['labels'], stats['data']
 
 # Generate bar chart for language distribution
 def generate_language_chart(conn, date):
@@ -80,6 +49,7 @@ def generate_language_chart(conn, date):
         return False
     
     # Create figure with two subplots
+    plt = load_pyplot()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
     
     # Subplot 1: Language Distribution (Bar Chart)
@@ -121,6 +91,7 @@ def generate_language_chart(conn, date):
     # Save chart to data/ directory
     os.makedirs(str(DATA_DIR), exist_ok=True)
     plt.savefig(os.path.join(str(DATA_DIR), 'daily_chart.png'), dpi=150, bbox_inches='tight')
+    plt.close(fig)
     print("Generated daily_chart.png")
     return True
 
@@ -441,7 +412,7 @@ def main():
         else:
             print("No activity data to visualize")
         
-        conn.close()
+        close_connections()
         
     except Exception as e:
         print(f"Error: {e}")
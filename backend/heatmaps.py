@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+CodePulse Heatmaps
+Hour-of-day by weekday and calendar heatmaps from one grouped rollup query
+each, with finished periods cached
+"""
+
+from datetime import datetime, timedelta
+
+try:
+    from backend.config import HEATMAP_MAX_RANGE_DAYS, HEATMAP_CACHE_MAX_ENTRIES
+    from backend.bucketing import bucket_edges, grouped_series, next_period
+    from backend.response_cache import FingerprintCache
+    from backend.rollups import hourly_retained_from
+    from backend.timeutils import (SECONDS_PER_DAY, get_timezone, local_day_start, local_today,
+                                   offset_spans, parse_date_range)
+except ModuleNotFoundError:
+    from config import HEATMAP_MAX_RANGE_DAYS, HEATMAP_CACHE_MAX_ENTRIES
+    from bucketing import bucket_edges, grouped_series, next_period
+    from response_cache import FingerprintCache
+    from rollups import hourly_retained_from
+    from timeutils import (SECONDS_PER_DAY, get_timezone, local_day_start, local_today,
+                           offset_spans, parse_date_range)
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# 1970-01-01 was a Thursday: shifts epoch day numbers so Monday is 0
+EPOCH_WEEKDAY = 3
+
+# Matrices of finished periods, valid while the period's daily totals match
+closed_periods = FingerprintCache(HEATMAP_CACHE_MAX_ENTRIES)
+
+
+def local_time_sql(column, spans):
+    """SQL shifting epoch `column` to local wall-clock seconds, one CASE arm per UTC offset"""
+    arms = " ".join(f"WHEN {column} < {hi} THEN {column} + {offset}"
+                    for _, hi, offset in spans[:-1])
+    last = f"{column} + {spans[-1][2]}"
+    return f"(CASE {arms} ELSE {last} END)" if arms else f"({last})"
+
+
+def weekly_seconds(conn, start, end, tz):
+    """
+    Return a 7 x 24 list of seconds per local (weekday, hour) in [start, end).
+
+    The UTC offsets in force over the range, DST changes included, are
+    worked out up front and applied in SQL, so hourly_rollup is still read
+    with one indexed range scan. In half-hour zones each UTC hour is
+    counted in the local hour it starts in.
+    """
+    local = local_time_sql('hour', offset_spans(start, end, tz))
+    matrix = [[0.0] * 24 for _ in WEEKDAYS]
+    rows = conn.execute(
+        f"""
+        SELECT ({local} / {SECONDS_PER_DAY} + {EPOCH_WEEKDAY}) % 7 AS weekday,
+               ({local} % {SECONDS_PER_DAY}) / 3600 AS hour_of_day,
+               SUM(total_sec)
+        FROM hourly_rollup
+        WHERE hour >= ? AND hour < ?
+        GROUP BY weekday, hour_of_day
+        """,
+        (start, end)
+    )
+    for weekday, hour, total in rows:
+        matrix[weekday][hour] = total or 0.0
+    return matrix
+
+
+def daily_seconds(conn, start, end, tz):
+    """Return a list of seconds per local day in [start, end)"""
+    edges = bucket_edges(start, end, 'day', tz)
+    series = grouped_series(conn, edges)
+    return series[()][0] if series else [0.0] * (len(edges) - 1)
+
+
+def fingerprint(conn, start, end):
+    """Cheap summary of the daily totals of the UTC days overlapping [start, end)"""
+    return tuple(conn.execute(
+        "SELECT COUNT(*), TOTAL(session_count), TOTAL(total_sec) FROM daily_rollup "
+        "WHERE day > ? AND day < ?",
+        (start - SECONDS_PER_DAY, end)
+    ).fetchone())
+
+
+def cached_period(conn, kind, compute, start, end, tz, today_start, cache_key=None):
+    """
+    compute(start, end) with the part of the range before today cached.
+
+    Live activity only lands in today's buckets, so the closed part is
+    reused until its daily totals change (a late upload, say) and usually
+    just [today_start, end) is recomputed.
+    """
+    closed_end = min(end, today_start)
+    if closed_end <= start:
+        return [compute(start, end)]
+    key = (cache_key, kind, start, closed_end, str(tz))
+    summary = fingerprint(conn, start, closed_end)
+    closed = closed_periods.get(key, summary)
+    if closed is None:
+        closed = compute(start, closed_end)
+        closed_periods.put(key, summary, closed)
+    return [closed] if closed_end == end else [closed, compute(closed_end, end)]
+
+
+def _minutes(seconds):
+    return int(round(seconds / 60.0))
+
+
+def _range(first, last, default_days, today, tz):
+    """Validated (first, last, start, end, today_start) for a local date range"""
+    first, last = parse_date_range(first, last, default_days=default_days,
+                                   max_days=HEATMAP_MAX_RANGE_DAYS, today=today, tz=tz)
+    start = local_day_start(first, tz)
+    end = next_period(local_day_start(last, tz), 'day', tz)
+    return first, last, start, end, local_day_start(local_today(tz, today), tz)
+
+
+def _first_day_from(epoch, tz):
+    """('YYYY-MM-DD', start) of the first local day starting at or after `epoch`"""
+    day = datetime.fromtimestamp(epoch, tz).strftime('%Y-%m-%d')
+    start = local_day_start(day, tz)
+    if start < epoch:
+        start = next_period(start, 'day', tz)
+        day = datetime.fromtimestamp(start, tz).strftime('%Y-%m-%d')
+    return day, start
+
+
+def weekly_payload(conn, first=None, last=None, tz=None, today=None, cache_key=None):
+    """
+    Body of /api/heatmap/weekly: minutes per local weekday and hour of day.
+
+    hourly_rollup only goes back to hourly_retained_from(), so a range
+    starting earlier is cut to the first whole local day after it and
+    "from" says where the matrix starts. Raises ValueError for a range
+    that ends before then.
+
+    Returns:
+    {
+        "from": "2025-01-01", "to": "2025-03-31",
+        "weekdays": ["Mon", ..., "Sun"],
+        "matrix": [[0, 0, ..., 12], ...],   // 7 rows (Mon..Sun) x 24 local hours, minutes
+        "max": 412
+    }
+    """
+    tz = get_timezone(tz)
+    first, last, start, end, today_start = _range(first, last, 12 * 7, today, tz)
+    hourly_from = hourly_retained_from(conn)
+    if start < hourly_from:
+        first, start = _first_day_from(hourly_from, tz)
+        if start >= end:
+            raise ValueError(f"Hourly totals before {first} have been aged out; "
+                             f"use /api/heatmap/calendar for older days")
+    parts = cached_period(conn, 'weekly', lambda s, e: weekly_seconds(conn, s, e, tz),
+                          start, end, tz, today_start, cache_key)
+    matrix = [[_minutes(sum(part[weekday][hour] for part in parts)) for hour in range(24)]
+              for weekday in range(len(WEEKDAYS))]
+    return {
+        "from": first,
+        "to": last,
+        "weekdays": WEEKDAYS,
+        "matrix": matrix,
+        "max": max(max(row) for row in matrix)
+    }
+
+
+def calendar_payload(conn, first=None, last=None, year=None, tz=None, today=None, cache_key=None):
+    """
+    Body of /api/heatmap/calendar: minutes per day laid out in weeks.
+
+    `year` selects a whole calendar year; otherwise the range defaults to
+    the last 365 days. The grid starts on the Monday on or before `from`;
+    cells outside the range are 0.
+
+    Returns:
+    {
+        "from": "2025-01-01", "to": "2025-12-31",
+        "start": "2024-12-30",              // date of weeks[0][0]
+        "weekdays": ["Mon", ..., "Sun"],
+        "weeks": [[0, 0, 45, 60, 12, 0, 0], ...],   // minutes, one row per week
+        "max": 388,
+        "total_minutes": 24210,
+        "active_days": 201
+    }
+    """
+    if year is not None:
+        if not str(year).isdigit():
+            raise ValueError("year must be a number like 2025")
+        first, last = f"{int(year):04d}-01-01", f"{int(year):04d}-12-31"
+    tz = get_timezone(tz)
+    first, last, start, end, today_start = _range(first, last, 365, today, tz)
+    parts = cached_period(conn, 'calendar', lambda s, e: daily_seconds(conn, s, e, tz),
+                          start, end, tz, today_start, cache_key)
+    days = [_minutes(seconds) for part in parts for seconds in part]
+
+    # Pad to whole Monday-to-Sunday weeks
+    first_day = datetime.strptime(first, '%Y-%m-%d')
+    lead = first_day.weekday()
+    cells = [0] * lead + days
+    cells += [0] * (-len(cells) % 7)
+    grid_start = (first_day - timedelta(days=lead)).strftime('%Y-%m-%d')
+    return {
+        "from": first,
+        "to": last,
+        "start": grid_start,
+        "weekdays": WEEKDAYS,
+        "weeks": [cells[i:i + 7] for i in range(0, len(cells), 7)],
+        "max": max(days),
+        "total_minutes": sum(days),
+        "active_days": sum(1 for minutes in days if minutes > 0)
+    }
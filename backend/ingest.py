@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+CodePulse Bulk Ingestion
+Validates uploaded heartbeats and writes each batch in one transaction
+"""
+
+import hashlib
+import json
+import math
+import time
+
+try:
+    from backend.config import INGEST_MAX_ROWS, INGEST_MAX_DURATION_SEC, INGEST_KEY_TTL
+    from backend.dimensions import encode_rows
+    from backend.languages import classify
+except ModuleNotFoundError:
+    from config import INGEST_MAX_ROWS, INGEST_MAX_DURATION_SEC, INGEST_KEY_TTL
+    from dimensions import encode_rows
+    from languages import classify
+
+# Validation errors reported back to the client per request
+MAX_REPORTED_ERRORS = 20
+
+# Heartbeats may run slightly ahead of the server clock
+MAX_CLOCK_SKEW_SEC = 5 * 60
+
+MAX_FILE_LENGTH = 1024
+MAX_LANGUAGE_LENGTH = 64
+
+# Rows as returned by dimensions.encode_rows()
+INSERT_SQL = """
+    INSERT INTO session_rows(timestamp, file_id, language_id, duration_sec, ts)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+class IngestError(ValueError):
+    """Raised when a batch cannot be accepted; `errors` lists per-row problems"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different payload"""
+
+
+def parse_heartbeats(body, content_type):
+    """
+    Decode a request body into a list of heartbeat dicts.
+
+    application/x-ndjson bodies hold one JSON object per line; anything else
+    is parsed as JSON, either an array of objects or a single object.
+    """
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        raise IngestError("Body must be UTF-8")
+
+    if 'ndjson' in (content_type or '') or 'jsonlines' in (content_type or ''):
+        items = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                raise IngestError(f"Line {number} is not valid JSON: {e}")
+    else:
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            raise IngestError(f"Body is not valid JSON: {e}")
+        if isinstance(items, dict):
+            items = [items]
+        elif not isinstance(items, list):
+            raise IngestError("Body must be a JSON array of heartbeats")
+
+    if not items:
+        raise IngestError("Batch is empty")
+    if len(items) > INGEST_MAX_ROWS:
+        raise IngestError(f"Batch has {len(items)} heartbeats; the limit is {INGEST_MAX_ROWS}")
+    return items
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _text(value, limit):
+    return value is None or (isinstance(value, str) and len(value) <= limit)
+
+
+def validate_heartbeat(item, now):
+    """
+    Return the (timestamp, file, language, duration_sec, ts) row, or raise
+    ValueError explaining the problem
+    """
+    if not isinstance(item, dict):
+        raise ValueError("heartbeat must be an object")
+
+    timestamp = item.get('timestamp')
+    if not _number(timestamp) or timestamp <= 0:
+        raise ValueError("timestamp must be a positive Unix epoch in seconds")
+    if timestamp > now + MAX_CLOCK_SKEW_SEC:
+        raise ValueError("timestamp is in the future")
+
+    duration = item.get('duration_sec', 0)
+    if not _number(duration) or not 0 <= duration <= INGEST_MAX_DURATION_SEC:
+        raise ValueError(f"duration_sec must be between 0 and {INGEST_MAX_DURATION_SEC}")
+
+    file, language = item.get('file'), item.get('language')
+    if not _text(file, MAX_FILE_LENGTH):
+        raise ValueError(f"file must be a string of at most {MAX_FILE_LENGTH} characters")
+    if not _text(language, MAX_LANGUAGE_LENGTH):
+        raise ValueError(f"language must be a string of at most {MAX_LANGUAGE_LENGTH} characters")
+
+    ts = int(timestamp)
+    # timestamp is stored the way the C++ monitor writes it
+    return (ts, file, classify(file, language), float(duration), ts)
+
+
+def validate_batch(items, now=None):
+    """Validate every heartbeat, raising IngestError listing the invalid ones"""
+    now = now or time.time()
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            rows.append(validate_heartbeat(item, now))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    if errors:
+        raise IngestError(
+            f"{len(errors)} of {len(items)} heartbeats are invalid; nothing was stored",
+            errors[:MAX_REPORTED_ERRORS]
+        )
+    return rows
+
+
+def body_digest(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def ingest_batch(conn, rows, idempotency_key=None, digest=None):
+    """
+    Insert validated `rows` in a single write transaction.
+
+    With an idempotency key, the key is recorded in the same transaction as
+    the rows, so a retried upload is acknowledged without inserting anything
+    twice. Returns a result dict with the write throughput of the batch.
+    """
+    now = int(time.time())
+    started = time.perf_counter()
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if idempotency_key is not None:
+            stored = conn.execute(
+                "SELECT body_sha256, row_count FROM ingest_batches WHERE idempotency_key = ?",
+                (idempotency_key,)
+            ).fetchone()
+            if stored is not None:
+                conn.rollback()
+                if stored[0] != digest:
+                    raise IdempotencyConflict(
+                        "Idempotency-Key was already used for a different batch")
+                return {"accepted": stored[1], "duplicate": True}
+
+            conn.execute("DELETE FROM ingest_batches WHERE received_at < ?",
+                         (now - INGEST_KEY_TTL,))
+            conn.execute(
+                """
+                INSERT INTO ingest_batches(idempotency_key, body_sha256, received_at, row_count)
+                VALUES (?, ?, ?, ?)
+                """,
+                (idempotency_key, digest, now, len(rows))
+            )
+
+        conn.executemany(INSERT_SQL, encode_rows(conn, rows))
+        conn.commit()
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+    return {
+        "accepted": len(rows),
+        "duplicate": False,
+        "write_ms": round(elapsed * 1000, 2),
+        "rows_per_sec": round(len(rows) / elapsed) if elapsed > 0 else None
+    }
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+CodePulse Languages
+Normalizes language names from file extensions and editor language ids, so
+each language is one key in every rollup and cache
+
+Usage:
+    python -m backend.languages backfill [--full]
+    python -m backend.languages show FILE [FILE ...] [--language NAME]
+"""
+
+import argparse
+import sys
+import time
+
+try:
+    from backend.config import LANGUAGE_BACKFILL_BATCH
+    from backend.dimensions import intern_languages
+    from backend.rollups import ROLLUPS, rollup_leave_sql, rollup_join_sql, raw_retained_from
+except ModuleNotFoundError:
+    from config import LANGUAGE_BACKFILL_BATCH
+    from dimensions import intern_languages
+    from rollups import ROLLUPS, rollup_leave_sql, rollup_join_sql, raw_retained_from
+
+# Language -> file extensions, lower case
+EXTENSIONS = {
+    'C': ('.c', '.h'),
+    'C#': ('.cs', '.csx'),
+    'C++': ('.cpp', '.cc', '.cxx', '.c++', '.hpp', '.hh', '.hxx', '.h++', '.ipp', '.inl'),
+    'CMake': ('.cmake',),
+    'CSS': ('.css',),
+    'Dart': ('.dart',),
+    'Elixir': ('.ex', '.exs'),
+    'Go': ('.go',),
+    'Groovy': ('.groovy', '.gradle'),
+    'HTML': ('.html', '.htm', '.xhtml'),
+    'Haskell': ('.hs', '.lhs'),
+    'JSON': ('.json', '.jsonc'),
+    'Java': ('.java',),
+    'JavaScript': ('.js', '.mjs', '.cjs', '.jsx'),
+    'Kotlin': ('.kt', '.kts'),
+    'Less': ('.less',),
+    'Lua': ('.lua',),
+    'Makefile': ('.mk', '.mak'),
+    'Markdown': ('.md', '.markdown'),
+    'Objective-C': ('.m', '.mm'),
+    'PHP': ('.php',),
+    'Perl': ('.pl', '.pm'),
+    'PowerShell': ('.ps1', '.psm1'),
+    'Python': ('.py', '.pyw', '.pyi', '.pyx', '.ipynb'),
+    'R': ('.r', '.rmd'),
+    'Ruby': ('.rb', '.erb'),
+    'Rust': ('.rs',),
+    'SCSS': ('.scss', '.sass'),
+    'SQL': ('.sql',),
+    'Scala': ('.scala', '.sc'),
+    'Shell': ('.sh', '.bash', '.zsh', '.fish'),
+    'Svelte': ('.svelte',),
+    'Swift': ('.swift',),
+    'TOML': ('.toml',),
+    'Text': ('.txt', '.text'),
+    'TypeScript': ('.ts', '.tsx', '.mts', '.cts'),
+    'Vue': ('.vue',),
+    'XML': ('.xml', '.xsd', '.xsl'),
+    'YAML': ('.yaml', '.yml'),
+    'Zig': ('.zig',),
+}
+
+# Files recognised by their whole name, lower case
+FILENAMES = {
+    'cmakelists.txt': 'CMake',
+    'dockerfile': 'Dockerfile',
+    'gemfile': 'Ruby',
+    'gnumakefile': 'Makefile',
+    'jenkinsfile': 'Groovy',
+    'makefile': 'Makefile',
+    'rakefile': 'Ruby',
+}
+
+# Editor language ids and other spellings, lower case
+ALIASES = {
+    'bash': 'Shell',
+    'c++': 'C++',
+    'cplusplus': 'C++',
+    'cpp': 'C++',
+    'csharp': 'C#',
+    'golang': 'Go',
+    'javascriptreact': 'JavaScript',
+    'js': 'JavaScript',
+    'objective-cpp': 'Objective-C',
+    'plaintext': 'Text',
+    'py': 'Python',
+    'python3': 'Python',
+    'shellscript': 'Shell',
+    'ts': 'TypeScript',
+    'typescriptreact': 'TypeScript',
+    'yml': 'YAML',
+}
+
+# Every lookup key in one table: canonical names, aliases and extensions
+NAMES = {
+    **{name.lower(): name for name in EXTENSIONS},
+    **{name.lower(): name for name in FILENAMES.values()},
+    **ALIASES,
+    **{extension: name for name, extensions in EXTENSIONS.items() for extension in extensions},
+}
+
+
+def _extension(name):
+    """Last extension of a file name, lower case, or '' when it has none"""
+    base = name.rpartition('/')[2].rpartition('\\')[2]
+    stem, dot, extension = base.rpartition('.')
+    return '.' + extension.lower() if dot and stem else ''
+
+
+def classify(file, language):
+    """
+    Canonical name for the language of a heartbeat.
+
+    A recognised `language` wins: an editor language id ('python'), a name
+    in any case ('Python'), or the extension slice the C++ monitor stores
+    ('.py - Visual Studio Code'). Otherwise the name or extension of `file`
+    decides. Unrecognised names are kept as given; unrecognised extension
+    slices are cut down to the bare extension ('.xyz').
+    """
+    name = language.strip() if language else ''
+    if name.startswith('.'):
+        # The monitor's slice runs from the first '.' of the window title
+        extension = _extension('x' + name.split()[0])
+        if extension in NAMES:
+            return NAMES[extension]
+    elif name:
+        return NAMES.get(name.lower(), name)
+
+    if file:
+        base = file.rpartition('/')[2].rpartition('\\')[2].strip()
+        found = FILENAMES.get(base.lower()) or NAMES.get(_extension(base))
+        if found is not None:
+            return found
+    if name:
+        return _extension('x' + name.split()[0]) or name
+    return language
+
+
+# ============================================================================
+# Backfill
+# ============================================================================
+
+# Move one session row between rollup buckets, in the same way the insert
+# triggers add it: the row leaves its old bucket, its language_id changes,
+# then it joins the bucket for its new language. Emptied buckets are removed.
+ROLLUP_LEAVE_SQL = rollup_leave_sql('?1')
+ROLLUP_JOIN_SQL = rollup_join_sql('?1')
+
+# codepulse_meta key holding the last session_rows rowid classified
+CHECKPOINT_KEY = 'languages_classified_to'
+
+# session_rows has no AUTOINCREMENT, so once the newest rows are deleted
+# (by compaction or retention, say) their rowids are handed out again.
+# Pulling the checkpoint back to the newest surviving row on every delete
+# keeps rows inserted afterwards above it.
+CHECKPOINT_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS session_rows_classified_checkpoint
+    AFTER DELETE ON session_rows
+    WHEN OLD.rowid <= (SELECT value FROM codepulse_meta WHERE key = '{CHECKPOINT_KEY}')
+    BEGIN
+        UPDATE codepulse_meta
+        SET value = (SELECT COALESCE(MAX(rowid), 0) FROM session_rows)
+        WHERE key = '{CHECKPOINT_KEY}'
+          AND value > (SELECT COALESCE(MAX(rowid), 0) FROM session_rows);
+    END
+"""
+
+
+def classify_sessions(conn, batch_size=LANGUAGE_BACKFILL_BATCH, full=False):
+    """
+    Normalize the language of raw rows, `batch_size` rows per transaction.
+
+    Resumes after the last row a previous run reached, so repeated runs
+    only read rows added since (by the C++ monitor, say; see
+    CHECKPOINT_TRIGGER for deleted rows); `full` starts
+    over, for after the tables above change. Rollup buckets are adjusted
+    row by row, so no rebuild is needed. Returns (rows checked, rows changed).
+    """
+    conn.commit()
+    last = 0
+    if not full:
+        row = conn.execute("SELECT value FROM codepulse_meta WHERE key = ?",
+                           (CHECKPOINT_KEY,)).fetchone()
+        last = row[0] if row else 0
+    checked = changed = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT r.rowid, f.path, l.name
+                FROM session_rows r
+                LEFT JOIN files f ON f.id = r.file_id
+                LEFT JOIN languages l ON l.id = r.language_id
+                WHERE r.rowid > ?
+                ORDER BY r.rowid
+                LIMIT ?
+                """,
+                (last, batch_size)
+            ).fetchall()
+            if not rows:
+                conn.rollback()
+                return checked, changed
+
+            changes = []
+            for rowid, file, language in rows:
+                name = classify(file, language)
+                if name != language:
+                    changes.append((rowid, name))
+            if changes:
+                ids = intern_languages(conn, {name for _, name in changes})
+                for sql in ROLLUP_LEAVE_SQL:
+                    conn.executemany(sql, [(rowid,) for rowid, _ in changes])
+                conn.executemany("UPDATE session_rows SET language_id = ? WHERE rowid = ?",
+                                 [(ids.get(name), rowid) for rowid, name in changes])
+                for sql in ROLLUP_JOIN_SQL:
+                    conn.executemany(sql, [(rowid,) for rowid, _ in changes])
+
+            last = rows[-1][0]
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO codepulse_meta(key, value, updated_at)
+                VALUES (?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+                """,
+                (CHECKPOINT_KEY, last)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        checked += len(rows)
+        changed += len(changes)
+
+
+def merge_old_buckets(conn):
+    """
+    Regroup rollup buckets older than raw retention under normalized names.
+
+    Their raw rows are gone, so only the stored language name is known.
+    Returns the number of rollup rows removed by merging.
+    """
+    renames = {}
+    for language_id, name in conn.execute("SELECT id, name FROM languages").fetchall():
+        canonical = classify(None, name)
+        if canonical != name:
+            renames[language_id] = canonical
+    if not renames:
+        return 0
+
+    before = raw_retained_from(conn)
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ids = intern_languages(conn, set(renames.values()))
+        conn.execute("CREATE TEMP TABLE language_map(old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+        conn.executemany("INSERT INTO temp.language_map VALUES (?, ?)",
+                         [(old, ids[name]) for old, name in renames.items()])
+        removed = 0
+        for table, (column, _) in ROLLUPS.items():
+            stale = conn.execute(
+                f"SELECT 1 FROM {table} WHERE {column} < ? "
+                "AND language_id IN (SELECT old_id FROM temp.language_map) LIMIT 1",
+                (before,)
+            ).fetchone()
+            if stale is None:
+                continue
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} < ?",
+                                (before,)).fetchone()[0]
+            conn.execute(f"""
+                CREATE TEMP TABLE regrouped AS
+                SELECT r.{column} AS bucket, COALESCE(m.new_id, r.language_id) AS language_id,
+                       r.project_id,
+                       SUM(r.total_sec) AS total_sec, SUM(r.session_count) AS session_count
+                FROM {table} r LEFT JOIN temp.language_map m ON m.old_id = r.language_id
+                WHERE r.{column} < ?
+                GROUP BY 1, 2, 3
+            """, (before,))
+            conn.execute(f"DELETE FROM {table} WHERE {column} < ?", (before,))
+            conn.execute(f"""
+                INSERT INTO {table}({column}, language_id, project_id, total_sec, session_count)
+                SELECT bucket, language_id, project_id, total_sec, session_count FROM temp.regrouped
+            """)
+            removed += rows - conn.execute("SELECT COUNT(*) FROM temp.regrouped").fetchone()[0]
+            conn.execute("DROP TABLE temp.regrouped")
+        conn.execute("DROP TABLE temp.language_map")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return removed
+
+
+def backfill(conn, batch_size=LANGUAGE_BACKFILL_BATCH, full=False):
+    """Normalize raw rows not yet classified (all with `full`), then old rollup buckets"""
+    started = time.perf_counter()
+    checked, changed = classify_sessions(conn, batch_size, full)
+    merged = merge_old_buckets(conn)
+    return {
+        "rows": checked,
+        "changed": changed,
+        "buckets_merged": merged,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def main(argv=None):
+    try:
+        from backend.db import get_db_connection
+    except ModuleNotFoundError:
+        from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Language name normalization")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('backfill', help="normalize rows written since the last run")
+    run.add_argument('--full', action='store_true', help="recheck every row, not just new ones")
+    show = commands.add_parser('show', help="print the language each file is classified as")
+    show.add_argument('files', nargs='+')
+    show.add_argument('--language', help="language name sent with the files")
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        for file in args.files:
+            print(f"{file} -> {classify(file, args.language)!r}")
+        return 0
+
+    result = backfill(get_db_connection(), full=args.full)
+    print(f"✅ Checked {result['rows']} rows, renamed {result['changed']}, merged "
+          f"{result['buckets_merged']} old rollup buckets ({result['elapsed_ms']:.0f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
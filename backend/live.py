@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+CodePulse Live Updates
+One change detector per database, shared by every Server-Sent Events client
+"""
+
+import json
+import logging
+import threading
+import time
+
+try:
+    from backend.config import (STREAM_POLL_INTERVAL, STREAM_HEARTBEAT_INTERVAL, STREAM_RETRY_MS,
+                                STREAM_MONITOR_IDLE_SECONDS, STREAM_MAX_CLIENTS)
+    from backend.db import get_db_connection, data_version, read_snapshot
+    from backend.timeutils import get_timezone, local_today
+except ModuleNotFoundError:
+    from config import (STREAM_POLL_INTERVAL, STREAM_HEARTBEAT_INTERVAL, STREAM_RETRY_MS,
+                        STREAM_MONITOR_IDLE_SECONDS, STREAM_MAX_CLIENTS)
+    from db import get_db_connection, data_version, read_snapshot
+    from timeutils import get_timezone, local_today
+
+log = logging.getLogger(__name__)
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+class ChangeMonitor:
+    """
+    Polls the sessions change counter on a background thread and rebuilds
+    the dashboard payload once per change, however many clients are
+    listening. Nothing is queried while there are no subscribers, and the
+    thread exits (dropping the monitor from the registry) once there have
+    been none for `idle_timeout` seconds.
+
+    With a `pool` (see db.ConnectionPool) each check borrows a connection
+    from it instead of keeping one open on the monitor thread.
+    """
+
+    def __init__(self, db_path, build_payload, poll_interval=STREAM_POLL_INTERVAL, pool=None,
+                 idle_timeout=STREAM_MONITOR_IDLE_SECONDS):
+        self.db_path = db_path
+        self.build_payload = build_payload
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.event_id = None
+        self.payload = None
+        self.subscribers = 0
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def subscribe(self):
+        with self._changed:
+            self.subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='codepulse-live',
+                                                daemon=True)
+                self._thread.start()
+            # Wake the poller so a first subscriber does not wait a full interval
+            self._changed.notify_all()
+
+    def unsubscribe(self):
+        with self._changed:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                # Stale once nobody is watching; rebuilt for the next subscriber
+                self.event_id = None
+                self.payload = None
+
+    def wait(self, last_event_id, timeout):
+        """Block until the event id differs from `last_event_id` or `timeout` passes"""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.event_id is not None and self.event_id != last_event_id,
+                timeout=timeout
+            )
+            return self.event_id, self.payload
+
+    def _run(self):
+        while True:
+            with self._changed:
+                if self.subscribers == 0:
+                    self._changed.wait(self.idle_timeout)
+                    if self.subscribers == 0:
+                        self._retire()
+                        return
+                    continue
+            try:
+                self._refresh()
+            except Exception:
+                log.exception("Live update of %s failed", self.db_path)
+            time.sleep(self.poll_interval)
+
+    def _retire(self):
+        """
+        Forget this monitor; called by its thread with no subscribers.
+
+        A client that obtained the monitor just before still works: its
+        subscribe() starts a new thread on the detached monitor.
+        """
+        with _monitors_lock:
+            if _monitors.get(self.db_path) is self:
+                del _monitors[self.db_path]
+        self._thread = None
+
+    def _refresh(self):
+        if self.pool is None:
+            self._check(get_db_connection(self.db_path))
+        else:
+            with self.pool.connection(self.db_path) as conn:
+                self._check(conn)
+
+    def _check(self, conn):
+        with read_snapshot(conn):
+            generation, _ = data_version(conn)
+            # Day-relative panels change at midnight (in the dashboard's
+            # timezone) even without new rows
+            event_id = f"{generation}-{local_today(get_timezone())}"
+            if event_id == self.event_id:
+                return
+            payload = json.dumps(self.build_payload(conn))
+        with self._changed:
+            self.event_id = event_id
+            self.payload = payload
+            self._changed.notify_all()
+
+
+class StreamSlots:
+    """
+    Counts the streams open in this process and refuses new ones beyond
+    `max_clients`, so streams cannot take every server thread.
+    """
+
+    def __init__(self, max_clients=STREAM_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a slot, or return False if all are in use"""
+        with self._lock:
+            if self.open >= self.max_clients:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+stream_slots = StreamSlots()
+
+
+def get_monitor(db_path, build_payload, pool=None):
+    """Return the process-wide monitor for `db_path`, creating it on first use"""
+    with _monitors_lock:
+        monitor = _monitors.get(db_path)
+        if monitor is None:
+            monitor = ChangeMonitor(db_path, build_payload, pool=pool)
+            _monitors[db_path] = monitor
+        return monitor
+
+
+def event_stream(monitor, last_event_id=None, heartbeat=STREAM_HEARTBEAT_INTERVAL):
+    """
+    Yield Server-Sent Events for `monitor`.
+
+    A client reconnecting with the Last-Event-ID it already has is not sent
+    the same snapshot again. Comment lines keep idle proxies from closing
+    the connection.
+    """
+    monitor.subscribe()
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while True:
+            event_id, payload = monitor.wait(last_event_id, heartbeat)
+            if event_id is None or event_id == last_event_id:
+                yield ": heartbeat\n\n"
+                continue
+            last_event_id = event_id
+            yield f"id: {event_id}\nevent: dashboard\ndata: {payload}\n\n"
+    finally:
+        monitor.unsubscribe()
@@ -0,0 +1,655 @@
+#!/usr/bin/env python3
+"""
+CodePulse Schema Migrations
+Upgrades activity.db in place, tracking progress with PRAGMA user_version
+"""
+
+import sqlite3
+import threading
+
+try:
+    from backend.rollups import (ROLLUPS, FOLDER_SQL, DAILY_ROLLUP_SCHEMA, HOURLY_ROLLUP_SCHEMA,
+                                 rebuild_daily_rollup, rebuild_hourly_rollup, raw_retained_from)
+    from backend.projects import DEFAULT_RULES, assign_projects
+    from backend.shards import sessions_source
+    from backend.dimensions import (DIMENSION_SCHEMA, SESSION_ROWS_SCHEMA, SESSIONS_VIEW_SCHEMA,
+                                    SESSIONS_DELETE_TRIGGER)
+    from backend.languages import (backfill as normalize_languages, CHECKPOINT_KEY,
+                                   CHECKPOINT_TRIGGER)
+except ModuleNotFoundError:
+    from rollups import (ROLLUPS, FOLDER_SQL, DAILY_ROLLUP_SCHEMA, HOURLY_ROLLUP_SCHEMA,
+                         rebuild_daily_rollup, rebuild_hourly_rollup, raw_retained_from)
+    from projects import DEFAULT_RULES, assign_projects
+    from shards import sessions_source
+    from dimensions import (DIMENSION_SCHEMA, SESSION_ROWS_SCHEMA, SESSIONS_VIEW_SCHEMA,
+                            SESSIONS_DELETE_TRIGGER)
+    from languages import (backfill as normalize_languages, CHECKPOINT_KEY,
+                           CHECKPOINT_TRIGGER)
+
+# Rows updated per transaction while backfilling existing data
+BACKFILL_BATCH_SIZE = 5000
+
+# Registered migrations as (version, description, function), in order
+MIGRATIONS = []
+
+# Databases already migrated by this process
+_migrated = set()
+_lock = threading.Lock()
+
+
+def migration(version, description):
+    """Register a function as the migration to schema `version`"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def get_schema_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def has_column(conn, table, column):
+    """Check whether `table` has a column called `column`"""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def has_table(conn, table):
+    """Check whether a table called `table` exists"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def run_ddl(conn, *statements):
+    """Run schema statements in one write transaction"""
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def backfill_by_rowid(conn, table, update_sql, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Apply `update_sql` to `table` in rowid batches, committing after each one.
+
+    `update_sql` must accept (low, high) rowid bounds and be idempotent, so an
+    interrupted backfill simply resumes on the next run. Short transactions
+    keep the C++ monitor from blocking on a long write lock.
+    """
+    row = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}").fetchone()
+    if row[0] is None:
+        return 0
+
+    updated = 0
+    low, high = row[0] - 1, row[1]
+    while low < high:
+        cursor = conn.execute(update_sql, (low, low + batch_size))
+        conn.commit()
+        updated += cursor.rowcount
+        low += batch_size
+    return updated
+
+
+# ============================================================================
+# Schema as of version 8
+# ============================================================================
+# Migrations 2, 7 and 8 were written against these rollup and project
+# definitions. The ones in rollups.py and projects.py have since moved on to
+# dictionary ids (migration 9), so the shipped migrations keep frozen copies
+# and still run exactly as released; migration 9 converts what they build.
+
+# Project of a sessions row, looked up in project_files
+V8_PROJECT_SQL = "(SELECT project_id FROM project_files WHERE file = {row}.file)"
+
+V8_PROJECT_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS projects(
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS project_files(
+        file TEXT PRIMARY KEY,
+        project_id INTEGER NOT NULL REFERENCES projects(id)
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sessions_register_project
+    BEFORE INSERT ON sessions
+    WHEN NEW.file IS NOT NULL AND TRIM(NEW.file) != ''
+     AND NOT EXISTS (SELECT 1 FROM project_files WHERE file = NEW.file)
+    BEGIN
+        INSERT OR IGNORE INTO projects(name) VALUES ({FOLDER_SQL.format(row='NEW')});
+        INSERT INTO project_files(file, project_id)
+        SELECT NEW.file, id FROM projects WHERE name = {FOLDER_SQL.format(row='NEW')};
+    END
+    """,
+]
+
+
+def v8_rollup_schema(table):
+    """Project dimension, then `table` keyed by (bucket, language, project_id) and its trigger"""
+    column, bucket_sql = ROLLUPS[table]
+    bucket = bucket_sql.format(row='NEW')
+    project = V8_PROJECT_SQL.format(row='NEW')
+    return V8_PROJECT_SCHEMA + [
+        f"""
+        CREATE TABLE IF NOT EXISTS {table}(
+            {column} INTEGER NOT NULL,
+            language TEXT,
+            project_id INTEGER,
+            total_sec REAL NOT NULL DEFAULT 0,
+            session_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_{table}_key
+        ON {table}({column}, language, project_id)
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS sessions_{table}
+        AFTER INSERT ON sessions
+        BEGIN
+            INSERT INTO {table}({column}, language, project_id, total_sec, session_count)
+            SELECT {bucket}, NEW.language, {project}, 0, 0
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {table}
+                WHERE {column} = {bucket}
+                  AND language IS NEW.language
+                  AND project_id IS {project}
+            );
+            UPDATE {table}
+            SET total_sec = total_sec + COALESCE(NEW.duration_sec, 0),
+                session_count = session_count + 1
+            WHERE {column} = {bucket}
+              AND language IS NEW.language
+              AND project_id IS {project};
+        END
+        """,
+    ]
+
+
+V8_DAILY_ROLLUP_SCHEMA = v8_rollup_schema('daily_rollup') + [
+    """
+    CREATE INDEX IF NOT EXISTS idx_daily_rollup_project
+    ON daily_rollup(project_id, language, total_sec, session_count)
+    """,
+]
+V8_HOURLY_ROLLUP_SCHEMA = v8_rollup_schema('hourly_rollup')
+
+
+def v8_rebuild_rollup(conn, table):
+    """Recompute `table` in its version 8 shape from the retained raw sessions"""
+    column, bucket_sql = ROLLUPS[table]
+    since = raw_retained_from(conn)
+    columns = "timestamp, file, language, duration_sec, ts"
+    with sessions_source(conn, since, columns=columns) as source:
+        run_ddl(
+            conn,
+            f"DELETE FROM {table} WHERE {column} >= {int(since)}",
+            f"""
+            INSERT INTO {table}({column}, language, project_id, total_sec, session_count)
+            SELECT {bucket_sql.format(row='s')} AS bucket,
+                   s.language,
+                   {V8_PROJECT_SQL.format(row='s')} AS project,
+                   COALESCE(SUM(s.duration_sec), 0),
+                   COUNT(*)
+            FROM {source} s
+            GROUP BY bucket, s.language, project
+            """
+        )
+
+
+def v8_rebuild_daily_rollup(conn):
+    """v8_rebuild_rollup() of daily_rollup"""
+    v8_rebuild_rollup(conn, 'daily_rollup')
+
+
+def v8_rebuild_hourly_rollup(conn):
+    """v8_rebuild_rollup() of hourly_rollup"""
+    v8_rebuild_rollup(conn, 'hourly_rollup')
+
+
+def v8_assign_projects(conn, rules=DEFAULT_RULES, batch_size=BACKFILL_BATCH_SIZE):
+    """Re-apply `rules` to every file in project_files, `batch_size` files per transaction"""
+    conn.commit()
+    last = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT f.rowid, f.file, p.name
+            FROM project_files f JOIN projects p ON p.id = f.project_id
+            WHERE f.rowid > ?
+            ORDER BY f.rowid
+            LIMIT ?
+            """,
+            (last, batch_size)
+        ).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        changes = []
+        for _, file, current in rows:
+            name = rules.project_of(file)
+            if name != current:
+                changes.append((file, name))
+        if changes:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR IGNORE INTO projects(name) VALUES (?)",
+                                 [(name,) for _, name in changes])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO project_files(file, project_id) "
+                    "SELECT ?, id FROM projects WHERE name = ?",
+                    changes
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+
+# ============================================================================
+# MIGRATION 1: Integer epoch column with a covering range index
+# ============================================================================
+@migration(1, "Add indexed integer ts column to sessions")
+def add_epoch_column(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessions(
+            timestamp TEXT,
+            file TEXT,
+            language TEXT,
+            duration_sec FLOAT
+        )
+    """)
+    conn.commit()
+
+    if not has_column(conn, 'sessions', 'ts'):
+        run_ddl(conn, "ALTER TABLE sessions ADD COLUMN ts INTEGER")
+
+    # Writers such as the C++ monitor only fill in `timestamp`
+    run_ddl(conn, """
+        CREATE TRIGGER IF NOT EXISTS sessions_set_ts
+        AFTER INSERT ON sessions
+        WHEN NEW.ts IS NULL
+        BEGIN
+            UPDATE sessions SET ts = CAST(NEW.timestamp AS INTEGER)
+            WHERE rowid = NEW.rowid;
+        END
+    """)
+
+    backfill_by_rowid(conn, 'sessions', """
+        UPDATE sessions SET ts = CAST(timestamp AS INTEGER)
+        WHERE rowid > ? AND rowid <= ? AND ts IS NULL
+    """)
+
+    # Leading ts column serves plain range scans; the trailing columns
+    # let per-day and per-language totals be answered from the index alone
+    run_ddl(conn, """
+        CREATE INDEX IF NOT EXISTS idx_sessions_ts_language_duration
+        ON sessions(ts, language, duration_sec)
+    """)
+
+
+# ============================================================================
+# MIGRATION 2: Trigger-maintained daily rollup
+# ============================================================================
+@migration(2, "Add daily_rollup table maintained on insert")
+def add_daily_rollup(conn):
+    run_ddl(conn, *V8_DAILY_ROLLUP_SCHEMA)
+    v8_rebuild_daily_rollup(conn)
+
+
+# ============================================================================
+# MIGRATION 3: Change counter for cache validation
+# ============================================================================
+@migration(3, "Add sessions change counter for ETags")
+def add_change_counter(conn):
+    run_ddl(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS codepulse_meta(
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0,
+            updated_at INTEGER
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO codepulse_meta(key, value, updated_at)
+        VALUES ('sessions_generation', 0, CAST(strftime('%s', 'now') AS INTEGER))
+        """,
+        *[f"""
+        CREATE TRIGGER IF NOT EXISTS sessions_generation_{event.split()[0].lower()}
+        AFTER {event} ON sessions
+        BEGIN
+            UPDATE codepulse_meta
+            SET value = value + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE key = 'sessions_generation';
+        END
+        """ for event in (
+            'INSERT',
+            'DELETE',
+            # The ts trigger's own UPDATE is not a data change
+            'UPDATE OF timestamp, file, language, duration_sec',
+        )]
+    )
+
+
+# ============================================================================
+# MIGRATION 4: Idempotency keys for bulk ingestion
+# ============================================================================
+@migration(4, "Add ingest_batches table for idempotent uploads")
+def add_ingest_batches(conn):
+    run_ddl(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS ingest_batches(
+            idempotency_key TEXT PRIMARY KEY,
+            body_sha256 TEXT NOT NULL,
+            received_at INTEGER NOT NULL,
+            row_count INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_ingest_batches_received_at
+        ON ingest_batches(received_at)
+        """
+    )
+
+
+# ============================================================================
+# MIGRATION 5: Read positions of the spool ingestion daemon
+# ============================================================================
+@migration(5, "Add spool_checkpoints table for the spool daemon")
+def add_spool_checkpoints(conn):
+    run_ddl(conn, """
+        CREATE TABLE IF NOT EXISTS spool_checkpoints(
+            file TEXT PRIMARY KEY,
+            inode INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            updated_at INTEGER
+        )
+    """)
+
+
+# ============================================================================
+# MIGRATION 6: Session end time for heartbeat compaction
+# ============================================================================
+@migration(6, "Add sessions.end_ts and index rows awaiting compaction")
+def add_session_end(conn):
+    if not has_column(conn, 'sessions', 'end_ts'):
+        run_ddl(conn, "ALTER TABLE sessions ADD COLUMN end_ts INTEGER")
+    # Compaction sets end_ts on every row it has seen, so this partial index
+    # only ever holds the rows written since the last run
+    run_ddl(conn, """
+        CREATE INDEX IF NOT EXISTS idx_sessions_uncompacted
+        ON sessions(ts) WHERE end_ts IS NULL
+    """)
+
+
+# ============================================================================
+# MIGRATION 7: Hourly rollup tier and raw retention watermark
+# ============================================================================
+@migration(7, "Add hourly_rollup table and raw retention watermark")
+def add_hourly_rollup(conn):
+    run_ddl(
+        conn,
+        *V8_HOURLY_ROLLUP_SCHEMA,
+        """
+        INSERT OR IGNORE INTO codepulse_meta(key, value, updated_at)
+        VALUES ('raw_retained_from', 0, CAST(strftime('%s', 'now') AS INTEGER))
+        """
+    )
+    v8_rebuild_hourly_rollup(conn)
+
+
+# ============================================================================
+# MIGRATION 8: Project dimension keyed by integer id
+# ============================================================================
+@migration(8, "Add projects dimension and key rollups by project_id")
+def add_project_dimension(conn):
+    legacy = [table for table in ROLLUPS if has_column(conn, table, 'folder')]
+    folder = FOLDER_SQL.format(row='s')
+    # Every file written so far starts in its first-folder project, as does
+    # every folder still named by a rollup bucket
+    run_ddl(
+        conn,
+        *V8_PROJECT_SCHEMA,
+        *(f"INSERT OR IGNORE INTO projects(name) "
+          f"SELECT DISTINCT folder FROM {table} WHERE folder IS NOT NULL"
+          for table in legacy),
+        f"INSERT OR IGNORE INTO projects(name) "
+        f"SELECT DISTINCT {folder} FROM sessions s WHERE {folder} IS NOT NULL",
+        f"""
+        INSERT OR IGNORE INTO project_files(file, project_id)
+        SELECT s.file, p.id
+        FROM (SELECT DISTINCT file FROM sessions) s JOIN projects p ON p.name = {folder}
+        """
+    )
+
+    # Swap folder for project_id, keeping buckets older than raw retention
+    for table in legacy:
+        column = ROLLUPS[table][0]
+        schema = V8_DAILY_ROLLUP_SCHEMA if table == 'daily_rollup' else V8_HOURLY_ROLLUP_SCHEMA
+        run_ddl(
+            conn,
+            f"DROP TRIGGER IF EXISTS sessions_{table}",
+            f"DROP INDEX IF EXISTS idx_{table}_key",
+            f"ALTER TABLE {table} RENAME TO {table}_legacy",
+            *schema,
+            f"""
+            INSERT INTO {table}({column}, language, project_id, total_sec, session_count)
+            SELECT r.{column}, r.language, p.id, r.total_sec, r.session_count
+            FROM {table}_legacy r LEFT JOIN projects p ON p.name = r.folder
+            """,
+            f"DROP TABLE {table}_legacy"
+        )
+
+    # Then apply the configured project rules and recount with them
+    v8_assign_projects(conn, batch_size=BACKFILL_BATCH_SIZE)
+    v8_rebuild_daily_rollup(conn)
+    v8_rebuild_hourly_rollup(conn)
+
+
+# ============================================================================
+# MIGRATION 9: Dictionary-encoded sessions
+# ============================================================================
+@migration(9, "Dictionary-encode sessions behind a compatibility view")
+def encode_sessions(conn):
+    """
+    Move sessions into session_rows, with languages and files as integer
+    ids, and leave a `sessions` view with the old columns in its place.
+
+    The table is rewritten in one transaction: writers are blocked for its
+    duration, but never see a half-converted database. The copy is not
+    batched because rows inserted, compacted or deleted between batches
+    would be lost; it holds the write lock for roughly 5-6 seconds per
+    million rows on an SSD, then each rollup is recounted in its own
+    transaction. Writers whose busy timeout is shorter (5 s for the
+    API's connections) fail meanwhile, so large databases are best
+    upgraded by hand with the collectors stopped. Rollup buckets older
+    than raw retention are converted rather than recounted.
+    """
+    legacy = [table for table in ROLLUPS if has_column(conn, table, 'language')]
+    folder = FOLDER_SQL.format(row='s')
+    session_rows, *session_rows_indexes = SESSION_ROWS_SCHEMA
+    run_ddl(
+        conn,
+        *DIMENSION_SCHEMA,
+        # Every language and folder still named by a session or a rollup
+        # bucket, then every file with the project it has so far
+        "INSERT OR IGNORE INTO languages(name) "
+        "SELECT DISTINCT language FROM sessions WHERE language IS NOT NULL",
+        *(f"INSERT OR IGNORE INTO languages(name) "
+          f"SELECT DISTINCT language FROM {table} WHERE language IS NOT NULL"
+          for table in legacy),
+        *(f"INSERT OR IGNORE INTO projects(name) "
+          f"SELECT DISTINCT folder FROM {table} WHERE folder IS NOT NULL"
+          for table in legacy if has_column(conn, table, 'folder')),
+        f"INSERT OR IGNORE INTO projects(name) "
+        f"SELECT DISTINCT {folder} FROM sessions s WHERE {folder} IS NOT NULL",
+        *(["INSERT OR IGNORE INTO files(path, project_id) "
+           "SELECT file, project_id FROM project_files"]
+          if has_table(conn, 'project_files') else []),
+        f"""
+        INSERT OR IGNORE INTO files(path, project_id)
+        SELECT s.file, p.id
+        FROM (SELECT DISTINCT file FROM sessions WHERE file IS NOT NULL) s
+        LEFT JOIN projects p ON p.name = {folder}
+        """,
+        "DROP TABLE IF EXISTS project_files",
+
+        # Rows keep their rowids; indexes and triggers are added after the copy
+        session_rows,
+        """
+        INSERT INTO session_rows(rowid, timestamp, file_id, language_id, duration_sec, ts, end_ts)
+        SELECT s.rowid, s.timestamp, f.id, l.id, s.duration_sec,
+               COALESCE(s.ts, CAST(s.timestamp AS INTEGER)), s.end_ts
+        FROM sessions s
+        LEFT JOIN files f ON f.path = s.file
+        LEFT JOIN languages l ON l.name = s.language
+        """,
+        # Also drops the old triggers and indexes on sessions
+        "DROP TABLE sessions",
+        *session_rows_indexes,
+        *SESSIONS_VIEW_SCHEMA,
+    )
+
+    # Swap language names for ids, keeping buckets older than raw retention
+    for table in legacy:
+        column = ROLLUPS[table][0]
+        schema = DAILY_ROLLUP_SCHEMA if table == 'daily_rollup' else HOURLY_ROLLUP_SCHEMA
+        if has_column(conn, table, 'folder'):
+            project, join = "p.id", "LEFT JOIN projects p ON p.name = r.folder"
+        else:
+            project, join = "r.project_id", ""
+        run_ddl(
+            conn,
+            f"DROP INDEX IF EXISTS idx_{table}_key",
+            f"DROP INDEX IF EXISTS idx_{table}_project",
+            f"ALTER TABLE {table} RENAME TO {table}_legacy",
+            *schema,
+            f"""
+            INSERT INTO {table}({column}, language_id, project_id, total_sec, session_count)
+            SELECT r.{column}, l.id, {project}, r.total_sec, r.session_count
+            FROM {table}_legacy r
+            LEFT JOIN languages l ON l.name = r.language
+            {join}
+            """,
+            f"DROP TABLE {table}_legacy"
+        )
+    run_ddl(conn, *DAILY_ROLLUP_SCHEMA, *HOURLY_ROLLUP_SCHEMA)
+
+    # Then apply the configured project rules and recount with them
+    assign_projects(conn, batch_size=BACKFILL_BATCH_SIZE)
+    rebuild_daily_rollup(conn)
+    rebuild_hourly_rollup(conn)
+
+
+# ============================================================================
+# MIGRATION 10: Canonical language names
+# ============================================================================
+@migration(10, "Normalize language names of existing rows")
+def normalize_language_names(conn):
+    # Batched and checkpointed, so an interrupted run resumes where it stopped
+    normalize_languages(conn, batch_size=BACKFILL_BATCH_SIZE)
+
+
+# ============================================================================
+# MIGRATION 11: Hourly retention watermark
+# ============================================================================
+@migration(11, "Add hourly retention watermark")
+def add_hourly_watermark(conn):
+    # Retention only ever cut hourly_rollup at the first of a month, so once
+    # it has run, the month of the oldest remaining hour is complete
+    run_ddl(conn, """
+        INSERT OR IGNORE INTO codepulse_meta(key, value, updated_at)
+        SELECT 'hourly_retained_from',
+               CASE WHEN (SELECT value FROM codepulse_meta WHERE key = 'raw_retained_from') > 0
+                    THEN COALESCE(
+                        (SELECT CAST(strftime('%s', MIN(hour), 'unixepoch', 'start of month')
+                                     AS INTEGER)
+                         FROM hourly_rollup),
+                        (SELECT value FROM codepulse_meta WHERE key = 'raw_retained_from'))
+                    ELSE 0 END,
+               CAST(strftime('%s', 'now') AS INTEGER)
+    """)
+
+
+# ============================================================================
+# MIGRATION 12: Deletes through the sessions view update the rollups
+# ============================================================================
+@migration(12, "Remove rows deleted through the sessions view from the rollups")
+def rollups_follow_view_deletes(conn):
+    run_ddl(conn, "DROP TRIGGER IF EXISTS sessions_delete", SESSIONS_DELETE_TRIGGER)
+    # Repair totals left behind by earlier deletes; buckets older than the
+    # raw watermark are kept as they are
+    rebuild_daily_rollup(conn)
+    rebuild_hourly_rollup(conn)
+
+
+# ============================================================================
+# MIGRATION 13: Language backfill checkpoint survives rowid reuse
+# ============================================================================
+@migration(13, "Keep the language backfill checkpoint below reused rowids")
+def guard_language_checkpoint(conn):
+    # Rows that already reused a rowid below the old checkpoint cannot be
+    # told apart, so the next backfill rechecks every row once
+    run_ddl(
+        conn,
+        CHECKPOINT_TRIGGER,
+        f"UPDATE codepulse_meta SET value = 0 WHERE key = '{CHECKPOINT_KEY}'",
+    )
+
+
+def migrate(conn):
+    """Apply every pending migration and return the resulting schema version"""
+    version = get_schema_version(conn)
+    for target, description, fn in MIGRATIONS:
+        if target <= version:
+            continue
+        fn(conn)
+        conn.execute(f"PRAGMA user_version = {int(target)}")
+        conn.commit()
+        version = target
+    return version
+
+
+def ensure_schema(conn, db_path):
+    """Migrate the database at `db_path` once per process"""
+    if db_path in _migrated:
+        return
+    with _lock:
+        if db_path not in _migrated:
+            migrate(conn)
+            _migrated.add(db_path)
+
+
+if __name__ == '__main__':
+    try:
+        from backend.config import get_db_path
+    except ModuleNotFoundError:
+        from config import get_db_path
+
+    print("CodePulse Schema Migrations")
+    print("=" * 50)
+
+    conn = sqlite3.connect(get_db_path())
+    try:
+        before = get_schema_version(conn)
+        after = migrate(conn)
+        for target, description, _ in MIGRATIONS:
+            status = "✅" if target <= after else "⏳"
+            print(f"{status} {target:3d}  {description}")
+        print(f"\nSchema version: {before} -> {after}")
+    finally:
+        conn.close()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+CodePulse Projects
+Assigns every file to a project once, when it is first interned into the
+files dimension, so rollups and /api/projects group by a small integer project_id
+
+Usage:
+    python -m backend.projects backfill
+    python -m backend.projects show FILE [FILE ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import OrderedDict
+
+try:
+    from backend.config import (PROJECT_WORKSPACES, PROJECT_GIT_ROOTS,
+                                PROJECT_GIT_CACHE_MAX_ENTRIES, PROJECT_BACKFILL_BATCH)
+    from backend.rollups import rebuild_daily_rollup, rebuild_hourly_rollup
+except ModuleNotFoundError:
+    from config import (PROJECT_WORKSPACES, PROJECT_GIT_ROOTS,
+                        PROJECT_GIT_CACHE_MAX_ENTRIES, PROJECT_BACKFILL_BATCH)
+    from rollups import rebuild_daily_rollup, rebuild_hourly_rollup
+
+# Files looked up per query; stays below SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+
+class ProjectRules:
+    """
+    Decides which project a file belongs to.
+
+    In order: the folder directly inside a configured workspace, the
+    nearest enclosing git checkout (absolute paths only, when enabled),
+    then the legacy rule, the first folder of the path ('' for files
+    outside any folder). With neither workspaces nor git checkouts this
+    is exactly the sessions view trigger's FOLDER_SQL.
+    """
+
+    def __init__(self, workspaces=PROJECT_WORKSPACES, git_roots=PROJECT_GIT_ROOTS,
+                 git_cache_size=PROJECT_GIT_CACHE_MAX_ENTRIES):
+        prefixes = (os.path.expanduser(path).replace('\\', '/').rstrip('/') + '/'
+                    for path in workspaces)
+        # Longest first, so nested workspaces win over their parents
+        self.workspaces = sorted(prefixes, key=len, reverse=True)
+        self.git_roots = git_roots
+        self.git_cache_size = git_cache_size
+        self._git_cache = OrderedDict()
+
+    def project_of(self, file):
+        """Project name for `file`, or None for rows without a file"""
+        # SQLite's TRIM() only strips spaces
+        if file is None or not file.strip(' '):
+            return None
+        path = file.replace('\\', '/')
+        for prefix in self.workspaces:
+            if path.startswith(prefix):
+                head, sep, _ = path[len(prefix):].partition('/')
+                return prefix + head if sep else prefix.rstrip('/')
+        if self.git_roots and path.startswith('/'):
+            root = self._git_root(os.path.dirname(path))
+            if root is not None:
+                return root
+        # Same as the trigger's FOLDER_SQL, so both writers agree
+        return file.partition('/')[0] if '/' in file else ''
+
+    def _git_root(self, directory):
+        """Nearest directory at or above `directory` holding .git, cached per directory (LRU)"""
+        visited = []
+        root = None
+        while directory not in self._git_cache:
+            visited.append(directory)
+            if os.path.exists(os.path.join(directory, '.git')):
+                root = directory
+                break
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        else:
+            root = self._git_cache[directory]
+            self._git_cache.move_to_end(directory)
+        for path in visited:
+            self._git_cache[path] = root
+        while len(self._git_cache) > self.git_cache_size:
+            self._git_cache.popitem(last=False)
+        return root
+
+
+DEFAULT_RULES = ProjectRules()
+
+
+def _create_projects(conn, assignments):
+    conn.executemany("INSERT OR IGNORE INTO projects(name) VALUES (?)",
+                     [(name,) for _, name in assignments if name is not None])
+
+
+def register_files(conn, files, rules=DEFAULT_RULES):
+    """
+    Add each of `files` not yet in the files dimension, with its project.
+
+    Runs inside the caller's write transaction, before the rows are
+    inserted, so the rollup triggers already see the project. Blank paths
+    get no project. Returns the number of files registered.
+    """
+    files = {file for file in files if file is not None}
+    if not files:
+        return 0
+    pending = list(files)
+    for i in range(0, len(pending), LOOKUP_CHUNK):
+        chunk = pending[i:i + LOOKUP_CHUNK]
+        files.difference_update(row[0] for row in conn.execute(
+            f"SELECT path FROM files WHERE path IN ({', '.join('?' * len(chunk))})", chunk
+        ))
+    assignments = [(file, rules.project_of(file)) for file in files]
+    _create_projects(conn, assignments)
+    conn.executemany(
+        "INSERT OR IGNORE INTO files(path, project_id) "
+        "VALUES (?, (SELECT id FROM projects WHERE name = ?))",
+        assignments
+    )
+    return len(files)
+
+
+def assign_projects(conn, rules=DEFAULT_RULES, batch_size=PROJECT_BACKFILL_BATCH):
+    """
+    Re-apply `rules` to every known file, `batch_size` files per transaction.
+
+    Only the files dimension changes, and file ids stay the same; see
+    backfill() for the rollups. Returns (files checked, files moved to
+    another project).
+    """
+    conn.commit()
+    checked = moved = 0
+    last = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT f.id, f.path, p.name
+            FROM files f LEFT JOIN projects p ON p.id = f.project_id
+            WHERE f.id > ?
+            ORDER BY f.id
+            LIMIT ?
+            """,
+            (last, batch_size)
+        ).fetchall()
+        if not rows:
+            return checked, moved
+        last = rows[-1][0]
+        checked += len(rows)
+
+        changes = []
+        for _, file, current in rows:
+            name = rules.project_of(file)
+            if name != current:
+                changes.append((file, name))
+        if not changes:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _create_projects(conn, changes)
+            conn.executemany(
+                "UPDATE files SET project_id = (SELECT id FROM projects WHERE name = ?) "
+                "WHERE path = ?",
+                [(name, file) for file, name in changes]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved += len(changes)
+
+
+def backfill(conn, rules=DEFAULT_RULES, batch_size=PROJECT_BACKFILL_BATCH):
+    """
+    Reassign existing files after the project rules changed.
+
+    When any file moves, the rollups are rebuilt from the retained raw
+    sessions; buckets older than raw retention keep the project they were
+    counted under.
+    """
+    started = time.perf_counter()
+    checked, moved = assign_projects(conn, rules, batch_size)
+    if moved:
+        rebuild_daily_rollup(conn)
+        rebuild_hourly_rollup(conn)
+    return {
+        "files": checked,
+        "moved": moved,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def main(argv=None):
+    try:
+        from backend.db import get_db_connection
+    except ModuleNotFoundError:
+        from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Project assignment for tracked files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('backfill', help="reassign existing files using the current rules")
+    show = commands.add_parser('show', help="print the project the rules give each file")
+    show.add_argument('files', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        for file in args.files:
+            print(f"{file} -> {DEFAULT_RULES.project_of(file)!r}")
+        return 0
+
+    result = backfill(get_db_connection())
+    print(f"✅ Checked {result['files']} files, moved {result['moved']} "
+          f"to another project ({result['elapsed_ms']:.0f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+CodePulse Report Jobs
+Builds PDF reports on a bounded background pool, caching finished reports
+in memory by data version and report parameters
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from backend.config import (PDF_WORKERS, PDF_MAX_PENDING, PDF_MAX_JOBS, PDF_SPOOL_THRESHOLD,
+                                PDF_CACHE_MAX_REPORTS, PDF_CACHE_MAX_BYTES)
+except ModuleNotFoundError:
+    from config import (PDF_WORKERS, PDF_MAX_PENDING, PDF_MAX_JOBS, PDF_SPOOL_THRESHOLD,
+                        PDF_CACHE_MAX_REPORTS, PDF_CACHE_MAX_BYTES)
+
+# Bytes per chunk when streaming a report to a client
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class QueueFullError(Exception):
+    """Raised when too many reports are already waiting to be built"""
+
+
+class ReportEvicted(Exception):
+    """Raised when a report was evicted from the cache before it could be streamed"""
+
+
+class FileChunks:
+    """
+    Iterator over the first `size` bytes of the descriptor `fd`, which it owns.
+
+    The descriptor is closed once the end is reached or close() is called,
+    as WSGI servers do when a client goes away, even before the first chunk.
+    """
+
+    def __init__(self, fd, size):
+        self.fd = fd
+        self.size = size
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.fd is not None and self.offset < self.size:
+            chunk = os.pread(self.fd, min(STREAM_CHUNK_SIZE, self.size - self.offset), self.offset)
+            if chunk:
+                self.offset += len(chunk)
+                return chunk
+        self.close()
+        raise StopIteration
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        self.close()
+
+
+class Report:
+    """
+    A finished PDF, held either as bytes or in a temporary file.
+
+    Reports larger than `threshold` (the spool's max_size) are kept as a
+    descriptor of their temporary file. Each download reads it with
+    os.pread on its own duplicate, taken by stream() before the response
+    starts, so any number of downloads can run concurrently and a download
+    in progress survives the cache evicting and closing the report.
+    """
+
+    def __init__(self, spool, size, threshold=PDF_SPOOL_THRESHOLD):
+        self.size = size
+        self.closed = False
+        self._lock = threading.Lock()
+        if size > threshold:
+            # Already rolled over to disk; fileno() would force it otherwise
+            self.data = None
+            self._fd = os.dup(spool.fileno())
+        else:
+            self.data = spool.read()
+            self._fd = None
+        spool.close()
+
+    @property
+    def in_memory(self):
+        return self.data is not None
+
+    def stream(self):
+        """
+        Return an iterator over the report's bytes in STREAM_CHUNK_SIZE pieces.
+
+        Raises ReportEvicted if the report has already been closed.
+        """
+        with self._lock:
+            if self.closed:
+                raise ReportEvicted("Report has been evicted from the cache")
+            if self.data is not None:
+                return self._memory_chunks(self.data)
+            return FileChunks(os.dup(self._fd), self.size)
+
+    def _memory_chunks(self, data):
+        view = memoryview(data)
+        for offset in range(0, self.size, STREAM_CHUNK_SIZE):
+            yield bytes(view[offset:offset + STREAM_CHUNK_SIZE])
+
+    def close(self):
+        """Release the report's memory or temporary file"""
+        with self._lock:
+            self.closed = True
+            self.data = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class ReportJob:
+    """One requested report and its progress"""
+
+    def __init__(self, job_id, key, params):
+        self.id = job_id
+        self.key = key
+        self.params = params
+        self.status = 'queued'
+        self.error = None
+        self.report = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "params": self.params,
+            "size": self.report.size if self.report else None,
+            "created": self.created,
+            "finished": self.finished
+        }
+
+
+def report_key(data_version, params):
+    """Content address of a report: the same data and parameters give the same key"""
+    material = json.dumps({"version": data_version, "params": params}, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ReportJobs:
+    """
+    Queue of PDF builds.
+
+    `render(params)` must return (file, size) for a rewound binary file
+    that has a real descriptor once it exceeds PDF_SPOOL_THRESHOLD bytes,
+    e.g. pdf_generator.render_pdf_spooled(). A report that is already
+    cached is finished immediately, and a request for a report that is
+    already being built joins that job instead of starting another.
+    """
+
+    def __init__(self, render, workers=PDF_WORKERS, max_pending=PDF_MAX_PENDING):
+        self.render = render
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='codepulse-pdf')
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, data_version, params):
+        """Return the job producing the report for `params` at `data_version`"""
+        key = report_key(data_version, params)
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None:
+                return active
+
+            job = ReportJob(uuid.uuid4().hex, key, params)
+            cached = self._reports.get(key)
+            if cached is not None:
+                self._reports.move_to_end(key)
+                self._remember(job)
+                self._finish(job, 'done', report=cached)
+                return job
+
+            if len(self._active) >= self.max_pending:
+                raise QueueFullError("Too many reports in progress, try again shortly")
+            self._remember(job)
+            self._active[key] = job
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > PDF_MAX_JOBS:
+            self._jobs.popitem(last=False)
+
+    def _finish(self, job, status, error=None, report=None):
+        job.status = status
+        job.error = error
+        job.report = report
+        job.finished = time.time()
+        job.done.set()
+
+    def _run(self, job):
+        job.status = 'running'
+        report = None
+        try:
+            spool, size = self.render(job.params)
+            report = Report(spool, size)
+            status, error = 'done', None
+        except Exception as e:
+            status, error = 'failed', str(e)
+
+        with self._lock:
+            self._active.pop(job.key, None)
+            if report is not None:
+                self._cache(job.key, report)
+            self._finish(job, status, error, report)
+
+    def _cache(self, key, report):
+        """Add a report, evicting the least recently used beyond the count and memory budgets"""
+        self._reports[key] = report
+        while len(self._reports) > 1 and (
+            len(self._reports) > PDF_CACHE_MAX_REPORTS
+            or sum(r.size for r in self._reports.values() if r.in_memory) > PDF_CACHE_MAX_BYTES
+        ):
+            _, evicted = self._reports.popitem(last=False)
+            evicted.close()
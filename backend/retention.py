@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+CodePulse Retention
+Ages old data out of the raw and hourly tiers, keeping daily totals forever
+
+Usage:
+    python -m backend.retention [--dry-run]
+"""
+
+import argparse
+import calendar
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    from backend.config import (RETENTION_RAW_DAYS, RETENTION_HOURLY_MONTHS,
+                                RETENTION_BATCH_SIZE, RETENTION_VACUUM_PAGES)
+    from backend.rollups import raw_retained_from, hourly_retained_from
+    from backend.shards import drop_shards_before, shard_dir_of
+    from backend.timeutils import SECONDS_PER_DAY
+except ModuleNotFoundError:
+    from config import (RETENTION_RAW_DAYS, RETENTION_HOURLY_MONTHS,
+                        RETENTION_BATCH_SIZE, RETENTION_VACUUM_PAGES)
+    from rollups import raw_retained_from, hourly_retained_from
+    from shards import drop_shards_before, shard_dir_of
+    from timeutils import SECONDS_PER_DAY
+
+# auto_vacuum modes as reported by PRAGMA auto_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def cutoffs(now=None, raw_days=RETENTION_RAW_DAYS, hourly_months=RETENTION_HOURLY_MONTHS):
+    """
+    Return (raw_cutoff, hourly_cutoff) epochs.
+
+    Both fall on UTC midnight, and the hourly cutoff on the first of a
+    month, so every tier holds whole buckets of the tier below it.
+    """
+    now = int(now if now is not None else time.time())
+    raw_cutoff = (now // SECONDS_PER_DAY - raw_days) * SECONDS_PER_DAY
+
+    today = datetime.fromtimestamp(now, timezone.utc)
+    months = today.year * 12 + today.month - 1 - hourly_months
+    hourly_cutoff = calendar.timegm((months // 12, months % 12 + 1, 1, 0, 0, 0))
+    return raw_cutoff, hourly_cutoff
+
+
+def delete_in_batches(conn, table, where, params, batch_size=RETENTION_BATCH_SIZE):
+    """Delete matching rows `batch_size` at a time, committing between batches"""
+    deleted = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                f"DELETE FROM {table} "
+                f"WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)",
+                (*params, batch_size)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+
+
+def vacuum(conn, pages=RETENTION_VACUUM_PAGES):
+    """
+    Return free pages to the filesystem a few at a time.
+
+    Databases created before retention existed have auto_vacuum off; they
+    are switched to incremental mode with a one-time full VACUUM.
+    """
+    conn.commit()
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return before - conn.execute("PRAGMA page_count").fetchone()[0]
+
+
+def apply_retention(conn, now=None, raw_days=RETENTION_RAW_DAYS,
+                    hourly_months=RETENTION_HOURLY_MONTHS, dry_run=False):
+    """
+    Enforce the retention policy and return what was removed.
+
+    Raw rows were already added to the hourly and daily rollups by the
+    insert triggers, so aging them out only drops detail. The raw watermark
+    is advanced before deleting, which stops a later rollup rebuild from
+    wiping out buckets whose raw rows are gone; the hourly watermark tells
+    readers where hourly_rollup stops being complete.
+    """
+    raw_cutoff, hourly_cutoff = cutoffs(now, raw_days, hourly_months)
+    watermark = max(raw_retained_from(conn), raw_cutoff)
+    hourly_cutoff = max(hourly_retained_from(conn), hourly_cutoff)
+    result = {"raw_cutoff": watermark, "hourly_cutoff": hourly_cutoff}
+
+    if dry_run:
+        result["raw_rows"] = conn.execute(
+            "SELECT COUNT(*) FROM session_rows WHERE ts < ?", (watermark,)).fetchone()[0]
+        result["hourly_rows"] = conn.execute(
+            "SELECT COUNT(*) FROM hourly_rollup WHERE hour < ?", (hourly_cutoff,)).fetchone()[0]
+        return result
+
+    conn.commit()
+    conn.executemany(
+        """
+        UPDATE codepulse_meta SET value = ?, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+        WHERE key = ?
+        """,
+        [(watermark, 'raw_retained_from'), (hourly_cutoff, 'hourly_retained_from')]
+    )
+    conn.commit()
+
+    # Whole months archived to shards are dropped by deleting their files
+    result["shards_dropped"] = drop_shards_before(watermark, shard_dir_of(conn))
+    result["raw_rows"] = delete_in_batches(conn, 'session_rows', "ts < ?", (watermark,))
+    result["hourly_rows"] = delete_in_batches(conn, 'hourly_rollup', "hour < ?", (hourly_cutoff,))
+    result["pages_freed"] = vacuum(conn)
+    return result
+
+
+def main(argv=None):
+    try:
+        from backend.db import get_db_connection
+    except ModuleNotFoundError:
+        from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Apply the data retention policy")
+    parser.add_argument('--dry-run', action='store_true', help="report what would be deleted")
+    args = parser.parse_args(argv)
+
+    result = apply_retention(get_db_connection(), dry_run=args.dry_run)
+    raw_date = datetime.fromtimestamp(result['raw_cutoff'], timezone.utc).strftime('%Y-%m-%d')
+    hourly_date = datetime.fromtimestamp(result['hourly_cutoff'], timezone.utc).strftime('%Y-%m-%d')
+    verb = "Would delete" if args.dry_run else "Deleted"
+    print(f"{verb} {result['raw_rows']} raw sessions before {raw_date}")
+    print(f"{verb} {result['hourly_rows']} hourly totals before {hourly_date}")
+    if not args.dry_run:
+        for month in result['shards_dropped']:
+            print(f"Dropped shard for {month}")
+        print(f"✅ Freed {result['pages_freed']} pages")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+CodePulse Rollups
+Materialized per-day and per-hour totals kept current by SQLite triggers
+
+Usage:
+    python -m backend.rollups rebuild
+"""
+
+import sys
+import sqlite3
+
+try:
+    from backend.timeutils import SECONDS_PER_DAY
+    from backend.shards import sessions_source
+except ModuleNotFoundError:
+    from timeutils import SECONDS_PER_DAY
+    from shards import sessions_source
+
+SECONDS_PER_HOUR = 3600
+
+# Folder of a session row, matching the legacy /api/projects derivation.
+# Rows without a file have no folder; files without a '/' map to '' ("root").
+FOLDER_SQL = """CASE WHEN {row}.file IS NULL OR TRIM({row}.file) = '' THEN NULL
+                     ELSE SUBSTR({row}.file, 1, INSTR({row}.file, '/') - 1) END"""
+
+# Project of a session_rows row: one primary key lookup in the files
+# dimension, whose project backend/projects.py sets when a file is first seen
+PROJECT_SQL = "(SELECT project_id FROM files WHERE id = {row}.file_id)"
+
+# UTC midnight of a session row, usable before the ts trigger has run
+DAY_SQL = (f"(COALESCE({{row}}.ts, CAST({{row}}.timestamp AS INTEGER)) / {SECONDS_PER_DAY})"
+           f" * {SECONDS_PER_DAY}")
+
+# Start of the UTC hour of a session row
+HOUR_SQL = (f"(COALESCE({{row}}.ts, CAST({{row}}.timestamp AS INTEGER)) / {SECONDS_PER_HOUR})"
+            f" * {SECONDS_PER_HOUR}")
+
+# Rollup table -> (bucket column, bucket expression)
+ROLLUPS = {
+    'daily_rollup': ('day', DAY_SQL),
+    'hourly_rollup': ('hour', HOUR_SQL),
+}
+
+
+def rollup_schema(table):
+    """Table, index and session_rows insert trigger maintaining the rollup `table`"""
+    column, bucket_sql = ROLLUPS[table]
+    bucket = bucket_sql.format(row='NEW')
+    project = PROJECT_SQL.format(row='NEW')
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {table}(
+            {column} INTEGER NOT NULL,
+            language_id INTEGER,
+            project_id INTEGER,
+            total_sec REAL NOT NULL DEFAULT 0,
+            session_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_{table}_key
+        ON {table}({column}, language_id, project_id)
+        """,
+        # language_id and project_id may be NULL, so a UNIQUE upsert cannot be used;
+        # create the bucket if it is missing, then add the row to it
+        f"""
+        CREATE TRIGGER IF NOT EXISTS sessions_{table}
+        AFTER INSERT ON session_rows
+        BEGIN
+            INSERT INTO {table}({column}, language_id, project_id, total_sec, session_count)
+            SELECT {bucket}, NEW.language_id, {project}, 0, 0
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {table}
+                WHERE {column} = {bucket}
+                  AND language_id IS NEW.language_id
+                  AND project_id IS {project}
+            );
+            UPDATE {table}
+            SET total_sec = total_sec + COALESCE(NEW.duration_sec, 0),
+                session_count = session_count + 1
+            WHERE {column} = {bucket}
+              AND language_id IS NEW.language_id
+              AND project_id IS {project};
+        END
+        """,
+    ]
+
+
+def rollup_leave_sql(rowid):
+    """
+    Statements taking the session_rows row `rowid` (an SQL expression such as
+    ?1 or OLD.rowid) out of every rollup, removing buckets it empties.
+    """
+    return [sql for table, (column, bucket_sql) in ROLLUPS.items() for sql in (
+        f"""
+        UPDATE {table}
+        SET total_sec = total_sec - (SELECT COALESCE(duration_sec, 0)
+                                     FROM session_rows WHERE rowid = {rowid}),
+            session_count = session_count - 1
+        WHERE ({column}, language_id, project_id) IS (
+            SELECT {bucket_sql.format(row='s')}, s.language_id, {PROJECT_SQL.format(row='s')}
+            FROM session_rows s WHERE s.rowid = {rowid}
+        )
+        """,
+        f"""
+        DELETE FROM {table}
+        WHERE session_count <= 0
+          AND ({column}, language_id, project_id) IS (
+              SELECT {bucket_sql.format(row='s')}, s.language_id, {PROJECT_SQL.format(row='s')}
+              FROM session_rows s WHERE s.rowid = {rowid}
+          )
+        """,
+    )]
+
+
+def rollup_join_sql(rowid):
+    """Statements adding the session_rows row `rowid` to every rollup, as the insert triggers do"""
+    return [sql for table, (column, bucket_sql) in ROLLUPS.items() for sql in (
+        f"""
+        INSERT INTO {table}({column}, language_id, project_id, total_sec, session_count)
+        SELECT {bucket_sql.format(row='s')}, s.language_id, {PROJECT_SQL.format(row='s')}, 0, 0
+        FROM session_rows s
+        WHERE s.rowid = {rowid} AND NOT EXISTS (
+            SELECT 1 FROM {table}
+            WHERE ({column}, language_id, project_id) IS
+                  ({bucket_sql.format(row='s')}, s.language_id, {PROJECT_SQL.format(row='s')})
+        )
+        """,
+        f"""
+        UPDATE {table}
+        SET total_sec = total_sec + (SELECT COALESCE(duration_sec, 0)
+                                     FROM session_rows WHERE rowid = {rowid}),
+            session_count = session_count + 1
+        WHERE ({column}, language_id, project_id) IS (
+            SELECT {bucket_sql.format(row='s')}, s.language_id, {PROJECT_SQL.format(row='s')}
+            FROM session_rows s WHERE s.rowid = {rowid}
+        )
+        """,
+    )]
+
+
+# All-time project totals group daily_rollup by (project_id, language_id); this
+# covering index lets SQLite stream the groups without a temporary b-tree
+DAILY_ROLLUP_SCHEMA = rollup_schema('daily_rollup') + [
+    """
+    CREATE INDEX IF NOT EXISTS idx_daily_rollup_project
+    ON daily_rollup(project_id, language_id, total_sec, session_count)
+    """,
+]
+HOURLY_ROLLUP_SCHEMA = rollup_schema('hourly_rollup')
+
+
+def _watermark(conn, key):
+    try:
+        row = conn.execute("SELECT value FROM codepulse_meta WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        # Before the meta table exists nothing has been deleted
+        return 0
+    return row[0] if row else 0
+
+
+def raw_retained_from(conn):
+    """
+    Epoch from which the sessions table is complete.
+
+    Retention deletes older raw rows but leaves their rollup buckets alone,
+    so rebuilds must not touch buckets before this point.
+    """
+    return _watermark(conn, 'raw_retained_from')
+
+
+def hourly_retained_from(conn):
+    """
+    Epoch from which hourly_rollup is complete.
+
+    Hours without activity have no row, so the first stored hour says
+    nothing about where retention stopped; this watermark does.
+    """
+    return _watermark(conn, 'hourly_retained_from')
+
+
+def rebuild_rollup(conn, table):
+    """
+    Recompute `table` from the retained raw sessions in one transaction.
+
+    Raw rows archived to monthly shards are read from the shards.
+    """
+    column, bucket_sql = ROLLUPS[table]
+    since = raw_retained_from(conn)
+    columns = "timestamp, file, language, duration_sec, ts"
+    with sessions_source(conn, since, columns=columns) as source:
+        conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM {table} WHERE {column} >= ?", (since,))
+            # Shards written before the dimension tables existed may name
+            # languages and files they have not seen yet
+            conn.execute(f"""
+                INSERT OR IGNORE INTO languages(name)
+                SELECT DISTINCT language FROM {source} WHERE language IS NOT NULL
+            """)
+            conn.execute(f"""
+                INSERT OR IGNORE INTO projects(name)
+                SELECT DISTINCT {FOLDER_SQL.format(row='s')} AS folder
+                FROM {source} s WHERE folder IS NOT NULL
+            """)
+            conn.execute(f"""
+                INSERT OR IGNORE INTO files(path, project_id)
+                SELECT DISTINCT s.file,
+                       (SELECT id FROM projects WHERE name = {FOLDER_SQL.format(row='s')})
+                FROM {source} s WHERE s.file IS NOT NULL
+            """)
+            conn.execute(f"""
+                INSERT INTO {table}({column}, language_id, project_id, total_sec, session_count)
+                SELECT {bucket_sql.format(row='s')} AS bucket,
+                       l.id,
+                       f.project_id,
+                       COALESCE(SUM(s.duration_sec), 0),
+                       COUNT(*)
+                FROM {source} s
+                LEFT JOIN languages l ON l.name = s.language
+                LEFT JOIN files f ON f.path = s.file
+                GROUP BY bucket, l.id, f.project_id
+            """)
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            conn.commit()
+            return count
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def rebuild_daily_rollup(conn):
+    """Recompute daily_rollup from the raw sessions table in one transaction"""
+    return rebuild_rollup(conn, 'daily_rollup')
+
+
+def rebuild_hourly_rollup(conn):
+    """Recompute hourly_rollup from the raw sessions table in one transaction"""
+    return rebuild_rollup(conn, 'hourly_rollup')
+
+
+if __name__ == '__main__':
+    try:
+        from backend.config import get_db_path
+        from backend.migrations import migrate
+    except ModuleNotFoundError:
+        from config import get_db_path
+        from migrations import migrate
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'rebuild'
+    if command != 'rebuild':
+        print(f"Unknown command: {command}")
+        print("Usage: python -m backend.rollups rebuild")
+        sys.exit(1)
+
+    conn = sqlite3.connect(get_db_path())
+    try:
+        migrate(conn)
+        print(f"✅ daily_rollup rebuilt: {rebuild_daily_rollup(conn)} rows")
+        print(f"✅ hourly_rollup rebuilt: {rebuild_hourly_rollup(conn)} rows")
+    finally:
+        conn.close()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+CodePulse Monthly Shards
+Moves closed months of raw sessions into read-only per-month database files
+and reads date ranges across them
+
+Usage:
+    python -m backend.shards archive
+    python -m backend.shards list
+"""
+
+import calendar
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    from backend.config import STORAGE_MODE, SHARD_DIR, SHARD_GRACE_DAYS, DATABASE_PATH
+    from backend.timeutils import SECONDS_PER_DAY
+except ModuleNotFoundError:
+    from config import STORAGE_MODE, SHARD_DIR, SHARD_GRACE_DAYS, DATABASE_PATH
+    from timeutils import SECONDS_PER_DAY
+
+# Raw session columns stored in every shard
+SESSION_COLUMNS = "timestamp, file, language, duration_sec, ts, end_ts"
+
+SHARD_SCHEMA = [
+    """
+    CREATE TABLE sessions(
+        src_rowid INTEGER,
+        timestamp TEXT,
+        file TEXT,
+        language TEXT,
+        duration_sec FLOAT,
+        ts INTEGER,
+        end_ts INTEGER
+    )
+    """,
+    "CREATE INDEX idx_sessions_ts_language_duration ON sessions(ts, language, duration_sec)",
+]
+
+# SQLite allows 10 attached databases by default; keep one spare
+MAX_ATTACHED_SHARDS = 9
+
+
+def month_of(epoch):
+    """Return the 'YYYY-MM' UTC month containing `epoch`"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m')
+
+
+def month_bounds(month):
+    """Return the half-open epoch range [start, end) of a 'YYYY-MM' month"""
+    year, number = map(int, month.split('-'))
+    start = calendar.timegm((year, number, 1, 0, 0, 0))
+    end = calendar.timegm((year + number // 12, number % 12 + 1, 1, 0, 0, 0))
+    return start, end
+
+
+def is_main_database(conn):
+    """
+    Whether `conn` is open on activity.db, the only database archived to
+    shards and the columnar archive; tenant databases never are.
+    """
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return bool(path) and os.path.realpath(path) == os.path.realpath(DATABASE_PATH)
+
+
+def shard_dir_of(conn):
+    """The shard directory of `conn`'s database, or None if it has no shards"""
+    return SHARD_DIR if is_main_database(conn) else None
+
+
+def shard_path(month, shard_dir=SHARD_DIR):
+    return Path(shard_dir) / f"activity-{month}.db"
+
+
+def list_shards(shard_dir=SHARD_DIR):
+    """Return {month: path} for every finished shard (none without a directory)"""
+    if shard_dir is None:
+        return {}
+    return {path.stem[len('activity-'):]: path
+            for path in sorted(Path(shard_dir).glob('activity-????-??.db'))}
+
+
+def shards_overlapping(start, end=None, shard_dir=SHARD_DIR):
+    """Months whose shard holds rows in [start, end); shards outside are pruned"""
+    months = []
+    for month in list_shards(shard_dir):
+        month_start, month_end = month_bounds(month)
+        if month_end > start and (end is None or month_start < end):
+            months.append(month)
+    return months
+
+
+def _range_sql(schema, start, end, columns):
+    where = f"ts >= {int(start)}" + ("" if end is None else f" AND ts < {int(end)}")
+    return f"SELECT {columns} FROM {schema}.sessions WHERE {where}"
+
+
+def _shard_uri(month, shard_dir):
+    # immutable: closed shards never change, so SQLite skips locking and change checks
+    return f"file:{shard_path(month, shard_dir).resolve()}?mode=ro&immutable=1"
+
+
+def _attach(conn, month, shard_dir):
+    schema = f"shard_{month.replace('-', '_')}"
+    conn.execute("ATTACH DATABASE ? AS " + schema, (_shard_uri(month, shard_dir),))
+    return schema
+
+
+def _copy_shard(conn, month, shard_dir, start, end, columns):
+    """Copy a shard's rows in [start, end) into temp.sessions_source through its own connection"""
+    width = len(conn.execute("SELECT * FROM temp.sessions_source LIMIT 0").description)
+    shard = sqlite3.connect(_shard_uri(month, shard_dir), uri=True)
+    try:
+        conn.executemany(
+            f"INSERT INTO temp.sessions_source VALUES ({', '.join('?' * width)})",
+            shard.execute(_range_sql('main', start, end, columns))
+        )
+    finally:
+        shard.close()
+
+
+@contextmanager
+def sessions_source(conn, start=0, end=None, columns=SESSION_COLUMNS, shard_dir=None):
+    """
+    Yield a subquery returning `columns` of the raw sessions in [start, end),
+    wherever they are stored.
+
+    Shards are read from `shard_dir`, by default that of `conn`'s own
+    database (see shard_dir_of()).
+
+    Only the shards overlapping the range are attached. If that is more
+    than SQLite can attach at once, the range is copied into a temporary
+    table instead. ATTACH and DETACH cannot run inside a transaction, so
+    inside one (e.g. db.read_snapshot()) each shard is read on its own
+    connection and copied into the temporary table; the caller's
+    transaction, and the snapshot it pins, is left alone. Shards never
+    change, so they cannot disagree with the snapshot.
+    """
+    if shard_dir is None:
+        shard_dir = shard_dir_of(conn)
+    months = shards_overlapping(start, end, shard_dir)
+    if not months:
+        yield f"({_range_sql('main', start, end, columns)})"
+        return
+
+    in_transaction = conn.in_transaction
+    if not in_transaction and len(months) <= MAX_ATTACHED_SHARDS:
+        schemas = [_attach(conn, month, shard_dir) for month in months]
+        try:
+            yield "(" + " UNION ALL ".join(
+                _range_sql(schema, start, end, columns) for schema in ['main', *schemas]) + ")"
+        finally:
+            for schema in schemas:
+                conn.execute(f"DETACH DATABASE {schema}")
+        return
+
+    conn.execute("DROP TABLE IF EXISTS temp.sessions_source")
+    conn.execute(f"CREATE TEMP TABLE sessions_source AS {_range_sql('main', start, end, columns)}")
+    if in_transaction:
+        for month in months:
+            _copy_shard(conn, month, shard_dir, start, end, columns)
+    else:
+        for i in range(0, len(months), MAX_ATTACHED_SHARDS):
+            schemas = [_attach(conn, month, shard_dir)
+                       for month in months[i:i + MAX_ATTACHED_SHARDS]]
+            try:
+                for schema in schemas:
+                    rows = _range_sql(schema, start, end, columns)
+                    conn.execute(f"INSERT INTO temp.sessions_source {rows}")
+                conn.commit()
+            finally:
+                for schema in schemas:
+                    conn.execute(f"DETACH DATABASE {schema}")
+    try:
+        yield "temp.sessions_source"
+    finally:
+        conn.execute("DROP TABLE IF EXISTS temp.sessions_source")
+
+
+def write_shard(path, rows):
+    """Write `rows` to a new shard file atomically and make it read-only"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    if tmp.exists():
+        tmp.unlink()
+
+    shard = sqlite3.connect(str(tmp))
+    try:
+        shard.execute("PRAGMA journal_mode = DELETE")
+        for statement in SHARD_SCHEMA:
+            shard.execute(statement)
+        shard.executemany(
+            f"INSERT INTO sessions(src_rowid, {SESSION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        shard.commit()
+    finally:
+        shard.close()
+
+    with open(tmp, 'rb') as f:
+        os.fsync(f.fileno())
+    os.chmod(tmp, 0o444)
+    os.replace(tmp, path)
+
+
+def forget_archived(conn, month, shard_dir=SHARD_DIR):
+    """
+    Delete main rows that an existing shard already holds.
+
+    Only needed after a crash between writing a shard and deleting its rows
+    from the main database; rows that arrived later stay in main.
+    """
+    start, end = month_bounds(month)
+    conn.commit()
+    schema = _attach(conn, month, shard_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Shards store names, so main rows are compared through the sessions view
+            cursor = conn.execute(f"""
+                DELETE FROM main.session_rows
+                WHERE rowid IN (
+                    SELECT s.rowid FROM main.sessions s JOIN {schema}.sessions a
+                      ON a.src_rowid = s.rowid
+                     AND a.ts = s.ts
+                     AND a.file IS s.file
+                     AND a.language IS s.language
+                     AND a.duration_sec IS s.duration_sec
+                    WHERE s.ts >= ? AND s.ts < ?
+                )
+            """, (start, end))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute(f"DETACH DATABASE {schema}")
+    return cursor.rowcount
+
+
+def archive_month(conn, month, shard_dir=SHARD_DIR):
+    """
+    Move one closed month of raw sessions into its shard file.
+
+    The main database stays write-locked from reading the month until its
+    rows are deleted, so nothing can change in between. Rollups are not
+    touched: they already include every archived row.
+    """
+    path = shard_path(month, shard_dir)
+    if path.exists():
+        return forget_archived(conn, month, shard_dir)
+
+    start, end = month_bounds(month)
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            f"SELECT rowid, {SESSION_COLUMNS} FROM sessions WHERE ts >= ? AND ts < ? ORDER BY ts",
+            (start, end)
+        ).fetchall()
+        if not rows:
+            conn.rollback()
+            return 0
+        write_shard(path, [tuple(row) for row in rows])
+        conn.execute("DELETE FROM session_rows WHERE ts >= ? AND ts < ?", (start, end))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def closed_months(conn, now=None, grace_days=SHARD_GRACE_DAYS):
+    """Months with rows in the main database that ended more than `grace_days` ago"""
+    now = now if now is not None else time.time()
+    oldest = conn.execute("SELECT MIN(ts) FROM session_rows").fetchone()[0]
+    if oldest is None:
+        return []
+    months = []
+    month = month_of(oldest)
+    while True:
+        _, month_end = month_bounds(month)
+        if month_end > now - grace_days * SECONDS_PER_DAY:
+            return months
+        months.append(month)
+        month = month_of(month_end)
+
+
+def archive_closed_months(conn, now=None, shard_dir=SHARD_DIR):
+    """Archive every closed month; returns {month: rows moved}"""
+    return {month: archive_month(conn, month, shard_dir) for month in closed_months(conn, now)}
+
+
+def drop_shards_before(cutoff, shard_dir=SHARD_DIR):
+    """Delete shard files that end at or before `cutoff`; returns the months dropped"""
+    dropped = []
+    for month, path in list_shards(shard_dir).items():
+        if month_bounds(month)[1] <= cutoff:
+            path.unlink()
+            dropped.append(month)
+    return dropped
+
+
+def main(argv=None):
+    try:
+        from backend.db import get_db_connection
+        from backend.compaction import compact
+        from backend.languages import classify_sessions
+    except ModuleNotFoundError:
+        from db import get_db_connection
+        from compaction import compact
+        from languages import classify_sessions
+
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else 'list'
+    conn = get_db_connection()
+
+    if command == 'archive':
+        if STORAGE_MODE != 'monthly':
+            print("Monthly shards are disabled. Set CODEPULSE_STORAGE_MODE=monthly to enable them.")
+            return 1
+        # Normalize languages and merge heartbeats first, so shards hold
+        # finished sessions under the names the rollups count them by
+        classify_sessions(conn)
+        compact(conn)
+        moved = archive_closed_months(conn)
+        for month, rows in moved.items():
+            print(f"✅ {month}: {rows} sessions moved to {shard_path(month).name}")
+        if not moved:
+            print("No closed months to archive")
+    elif command == 'list':
+        for month, path in list_shards().items():
+            print(f"{month}  {path.stat().st_size / 1024:8.1f} KB  {path}")
+    else:
+        print(f"Unknown command: {command}")
+        print("Usage: python -m backend.shards [archive|list]")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+CodePulse Spool Ingestion
+Tails NDJSON spool files written by collectors and group-commits their
+heartbeats into sessions
+
+Usage:
+    python -m backend.spool_ingest [--once] [--dir PATH]
+"""
+
+import argparse
+import json
+import signal
+import sys
+import time
+from pathlib import Path
+
+try:
+    from backend.config import (SPOOL_DIR, SPOOL_BATCH_ROWS, SPOOL_BATCH_SECONDS,
+                                SPOOL_POLL_INTERVAL, SPOOL_IDLE_SECONDS, SPOOL_READ_BYTES)
+    from backend.db import get_db_connection
+    from backend.ingest import INSERT_SQL, validate_heartbeat
+    from backend.dimensions import encode_rows
+except ModuleNotFoundError:
+    from config import (SPOOL_DIR, SPOOL_BATCH_ROWS, SPOOL_BATCH_SECONDS,
+                        SPOOL_POLL_INTERVAL, SPOOL_IDLE_SECONDS, SPOOL_READ_BYTES)
+    from db import get_db_connection
+    from ingest import INSERT_SQL, validate_heartbeat
+    from dimensions import encode_rows
+
+SPOOL_PATTERN = '*.ndjson'
+
+
+class SpoolIngestor:
+    """
+    Moves heartbeats from spool files into the database.
+
+    Only complete lines are consumed; a line still being written is picked
+    up on a later pass. Rows and the byte offsets they were read up to are
+    committed in the same transaction, so after a crash the daemon resumes
+    exactly where the last commit left off and never inserts a line twice.
+    """
+
+    def __init__(self, conn, spool_dir=SPOOL_DIR, batch_rows=SPOOL_BATCH_ROWS,
+                 batch_seconds=SPOOL_BATCH_SECONDS, idle_seconds=SPOOL_IDLE_SECONDS):
+        self.conn = conn
+        self.spool_dir = Path(spool_dir)
+        self.batch_rows = batch_rows
+        self.batch_seconds = batch_seconds
+        self.idle_seconds = idle_seconds
+        self.rows = []
+        self.offsets = {}
+        self.pending_since = None
+        self.stats = {"rows": 0, "rejected": 0, "commits": 0, "files_deleted": 0}
+
+    def load_checkpoints(self):
+        """Committed (inode, offset) per file name, dropping entries for vanished files"""
+        checkpoints = {}
+        stale = []
+        rows = self.conn.execute("SELECT file, inode, offset FROM spool_checkpoints")
+        for name, inode, offset in rows:
+            if (self.spool_dir / name).exists():
+                checkpoints[name] = (inode, offset)
+            else:
+                stale.append((name,))
+        if stale:
+            self.conn.executemany("DELETE FROM spool_checkpoints WHERE file = ?", stale)
+            self.conn.commit()
+        return checkpoints
+
+    def run_once(self):
+        """Read every spool file once, committing whenever a batch fills up"""
+        checkpoints = self.load_checkpoints()
+        files = sorted(self.spool_dir.glob(SPOOL_PATTERN), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            self._read_file(path, checkpoints)
+        if self.offsets and time.monotonic() - self.pending_since >= self.batch_seconds:
+            self.flush()
+        self._delete_finished(files)
+
+    def _read_file(self, path, checkpoints):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return
+        inode, offset = (self.offsets.get(path.name) or checkpoints.get(path.name)
+                         or (stat.st_ino, 0))
+        if inode != stat.st_ino or offset > stat.st_size:
+            # Replaced or truncated by the collector: start from the top
+            inode, offset = stat.st_ino, 0
+
+        with open(path, 'rb') as f:
+            while offset < stat.st_size:
+                f.seek(offset)
+                chunk = f.read(SPOOL_READ_BYTES)
+                end = chunk.rfind(b'\n')
+                if end < 0:
+                    if len(chunk) < SPOOL_READ_BYTES:
+                        break
+                    # No heartbeat is this long; drop it rather than stall the file
+                    end = len(chunk) - 1
+                offset += end + 1
+                self._add_lines(path.name, chunk[:end])
+                self.offsets[path.name] = (inode, offset)
+                if len(self.rows) >= self.batch_rows:
+                    self.flush()
+
+    def _add_lines(self, name, data):
+        now = time.time()
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+        for line in data.split(b'\n'):
+            if not line.strip():
+                continue
+            try:
+                self.rows.append(validate_heartbeat(json.loads(line), now))
+            except ValueError as e:
+                # A bad line cannot be retried, so it is skipped rather than blocking the file
+                self.stats["rejected"] += 1
+                print(f"Skipping invalid heartbeat in {name}: {e}")
+
+    def flush(self):
+        """Commit pending rows together with the offsets they were read up to"""
+        if not self.offsets:
+            return
+        now = int(time.time())
+        self.conn.commit()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(INSERT_SQL, encode_rows(self.conn, self.rows))
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO spool_checkpoints(file, inode, offset, updated_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(name, inode, offset, now) for name, (inode, offset) in self.offsets.items()]
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.stats["rows"] += len(self.rows)
+        self.stats["commits"] += 1
+        self.rows = []
+        self.offsets = {}
+        self.pending_since = None
+
+    def _delete_finished(self, files):
+        """Delete files that are fully committed and no longer being written"""
+        checkpoints = None
+        cutoff = time.time() - self.idle_seconds
+        for path in files:
+            if path.name in self.offsets:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            if checkpoints is None:
+                checkpoints = self.load_checkpoints()
+            if checkpoints.get(path.name) != (stat.st_ino, stat.st_size) and stat.st_size > 0:
+                continue
+            # Unlink before forgetting the offset: a crash in between leaves a
+            # checkpoint for a missing file, which is harmless and pruned later
+            path.unlink()
+            self.conn.execute("DELETE FROM spool_checkpoints WHERE file = ?", (path.name,))
+            self.conn.commit()
+            self.stats["files_deleted"] += 1
+
+    def run_forever(self, poll_interval=SPOOL_POLL_INTERVAL, should_stop=lambda: False):
+        while not should_stop():
+            self.run_once()
+            time.sleep(poll_interval)
+        self.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest NDJSON heartbeats from a spool directory")
+    parser.add_argument('--dir', default=str(SPOOL_DIR), help="spool directory to watch")
+    parser.add_argument('--once', action='store_true', help="ingest what is there now and exit")
+    args = parser.parse_args(argv)
+
+    spool_dir = Path(args.dir)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    ingestor = SpoolIngestor(get_db_connection(), spool_dir)
+
+    if args.once:
+        ingestor.run_once()
+        ingestor.flush()
+    else:
+        stopping = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stopping.append(True))
+        print(f"Watching {spool_dir} for {SPOOL_PATTERN} files (Ctrl+C to stop)")
+        ingestor.run_forever(should_stop=lambda: bool(stopping))
+
+    stats = ingestor.stats
+    print(f"✅ {stats['rows']} heartbeats in {stats['commits']} commits, "
+          f"{stats['rejected']} rejected, {stats['files_deleted']} files deleted")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
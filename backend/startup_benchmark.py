@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+CodePulse Startup Benchmark
+Measures how long a fresh process takes to import backend.api_server:app
+and answer its first request, and fails when that exceeds the budget
+
+Usage:
+    python -m backend.startup_benchmark [--runs N] [--top N]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+try:
+    from backend.config import PROJECT_ROOT, STARTUP_BUDGET_MS
+except ModuleNotFoundError:
+    from config import PROJECT_ROOT, STARTUP_BUDGET_MS
+
+# Libraries that must only load when a chart or report is requested
+DEFERRED_MODULES = ('matplotlib', 'reportlab', 'numpy', 'PIL')
+
+# Runs in a fresh interpreter and prints its timings as JSON
+CHILD_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+from backend.api_server import app
+imported = time.perf_counter()
+response = app.test_client().get('/api/health')
+answered = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (answered - imported) * 1000,
+    "status": response.status_code,
+    "deferred_loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules]
+}}))
+"""
+
+
+def run_child(*flags):
+    """Start one fresh interpreter; return (wall ms, child timings, stderr)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', CHILD_SCRIPT],
+        cwd=str(PROJECT_ROOT), capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"API server failed to start:\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall_ms, timings, result.stderr
+
+
+def slowest_imports(importtime_log, top=15):
+    """Parse `-X importtime` output into the `top` (cumulative µs, module) pairs"""
+    imports = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line.split('|')
+        imports.append((int(cumulative), module.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check API server startup time against STARTUP_BUDGET_MS")
+    parser.add_argument('--runs', type=int, default=5,
+                        help="timed runs; the median is compared to the budget")
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_MS,
+                        help="budget in milliseconds")
+    args = parser.parse_args(argv)
+
+    # One profiled run to show where import time goes, then clean timed runs
+    _, _, importtime_log = run_child('-X', 'importtime')
+    runs = [run_child() for _ in range(args.runs)]
+
+    boot_ms = statistics.median(wall for wall, _, _ in runs)
+    import_ms = statistics.median(t['import_ms'] for _, t, _ in runs)
+    first_ms = statistics.median(t['first_response_ms'] for _, t, _ in runs)
+    deferred = sorted({m for _, t, _ in runs for m in t['deferred_loaded']})
+    status = runs[-1][1]['status']
+
+    print("CodePulse Startup Benchmark")
+    print("=" * 50)
+    print("Slowest imports (cumulative):")
+    for cumulative_us, module in slowest_imports(importtime_log, args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+    print()
+    print(f"Import backend.api_server:  {import_ms:8.1f} ms")
+    print(f"First response (/api/health {status}): {first_ms:8.1f} ms")
+    print(f"Process start to response:  {boot_ms:8.1f} ms "
+          f"(budget {args.budget:.0f} ms, median of {args.runs})")
+
+    failures = []
+    if boot_ms > args.budget:
+        failures.append(f"startup took {boot_ms:.0f} ms, over the {args.budget:.0f} ms budget")
+    if deferred:
+        failures.append(f"imported at startup: {', '.join(deferred)}")
+    if status != 200:
+        failures.append(f"/api/health returned {status}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("✅ Startup within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+CodePulse Focus Streaks
+Finds continuous focus intervals and consecutive active days with a single
+vectorized pass over time-ordered sessions
+
+Usage:
+    python -m backend.streaks [--from 2025-01-01] [--to 2025-12-31] [--tz Europe/Berlin]
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+
+try:
+    from backend.config import (STREAK_IDLE_GAP, STREAK_MIN_DAY_MINUTES, STREAK_HISTOGRAM_MINUTES,
+                                STREAK_MAX_RANGE_DAYS, STREAK_CACHE_MAX_DAYS)
+    from backend.bucketing import bucket_edges, grouped_series, next_period
+    from backend.columnar import open_months, archive_dir_of
+    from backend.response_cache import FingerprintCache
+    from backend.rollups import raw_retained_from
+    from backend.shards import sessions_source, month_of
+    from backend.timeutils import get_timezone, local_day_start, local_today, parse_date_range
+except ModuleNotFoundError:
+    from config import (STREAK_IDLE_GAP, STREAK_MIN_DAY_MINUTES, STREAK_HISTOGRAM_MINUTES,
+                        STREAK_MAX_RANGE_DAYS, STREAK_CACHE_MAX_DAYS)
+    from bucketing import bucket_edges, grouped_series, next_period
+    from columnar import open_months, archive_dir_of
+    from response_cache import FingerprintCache
+    from rollups import raw_retained_from
+    from shards import sessions_source, month_of
+    from timeutils import get_timezone, local_day_start, local_today, parse_date_range
+
+
+def load_sessions(conn, start, end, archive_dir=None):
+    """
+    Return (ts, end) int64 arrays for sessions starting in [start, end), by ts.
+
+    Months in the columnar archive (by default that of `conn`'s database)
+    are read from their memory-mapped columns while they still match the
+    rollups; everything else comes from the sessions index and any shards.
+    """
+    if archive_dir is None:
+        archive_dir = archive_dir_of(conn)
+    parts = []
+    position = start
+    for month in open_months(start, end, archive_dir, conn):
+        if month.meta['start'] > position:
+            parts.append(_query_sessions(conn, position, month.meta['start']))
+        rows = month.slice(start, end)
+        ts = month.ts[rows]
+        parts.append((ts, ts + month.duration[rows].astype(np.int64)))
+        position = month.meta['end']
+    if position < end:
+        parts.append(_query_sessions(conn, position, end))
+
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return (np.concatenate([ts for ts, _ in parts]),
+            np.concatenate([ends for _, ends in parts]))
+
+
+def sessions_complete_from(conn, archive_dir=None):
+    """
+    Epoch from which every session can still be read.
+
+    Retention deletes raw rows before raw_retained_from; archived months
+    that still match the rollups extend that back a whole month at a time.
+    """
+    if archive_dir is None:
+        archive_dir = archive_dir_of(conn)
+    since = raw_retained_from(conn)
+    archived = {month.meta['month']: month for month in open_months(0, since, archive_dir, conn)}
+    while since > 0 and month_of(since - 1) in archived:
+        since = archived[month_of(since - 1)].meta['start']
+    return since
+
+
+def _query_sessions(conn, start, end):
+    with sessions_source(conn, start, end, columns="ts, duration_sec") as source:
+        cursor = conn.cursor()
+        # Plain tuples: building sqlite3.Row objects would dominate the scan
+        cursor.row_factory = None
+        rows = cursor.execute(
+            f"SELECT ts, ts + CAST(COALESCE(duration_sec, 0) AS INTEGER) FROM {source} ORDER BY ts"
+        ).fetchall()
+    data = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows))
+    data = data.reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+def focus_days(ts, ends, day_edges, gap=STREAK_IDLE_GAP,
+               histogram_minutes=STREAK_HISTOGRAM_MINUTES):
+    """
+    Per-day focus statistics for sessions between consecutive `day_edges`.
+
+    A focus interval runs while each session starts at most `gap` seconds
+    after everything before it has ended. Intervals are cut at the day
+    edges (local midnights), so each belongs to the day its sessions start in.
+
+    Returns a dict of arrays indexed by day offset: intervals, focus_sec,
+    longest_sec, longest_start and histogram (days x buckets), plus
+    last_interval, the (start, end) of the latest interval or None.
+    """
+    buckets = len(histogram_minutes)
+    days = len(day_edges) - 1
+    result = {
+        "intervals": np.zeros(days, dtype=np.int64),
+        "focus_sec": np.zeros(days, dtype=np.int64),
+        "longest_sec": np.zeros(days, dtype=np.int64),
+        "longest_start": np.zeros(days, dtype=np.int64),
+        "histogram": np.zeros((days, buckets), dtype=np.int64),
+        "last_interval": None,
+    }
+    if len(ts) == 0:
+        return result
+
+    day = np.searchsorted(day_edges, ts, 'right') - 1
+    covered = np.maximum.accumulate(ends)
+    starts = np.empty(len(ts), dtype=bool)
+    starts[0] = True
+    starts[1:] = (ts[1:] - covered[:-1] > gap) | (day[1:] != day[:-1])
+
+    first = np.flatnonzero(starts)
+    interval_start = ts[first]
+    interval_end = np.maximum.reduceat(ends, first)
+    interval_day = day[first]
+    result["last_interval"] = (int(interval_start[-1]), int(interval_end[-1]))
+    length = np.minimum(interval_end, day_edges[interval_day + 1]) - interval_start
+
+    result["intervals"] = np.bincount(interval_day, minlength=days)
+    result["focus_sec"] = np.bincount(interval_day, weights=length, minlength=days).astype(np.int64)
+    edges = np.array(histogram_minutes, dtype=np.int64) * 60
+    bucket = np.searchsorted(edges, length, 'right') - 1
+    result["histogram"] = np.bincount(interval_day * buckets + bucket,
+                                      minlength=days * buckets).reshape(days, buckets)
+
+    # Sort by (day, length): the last interval of each day is its longest
+    order = np.lexsort((length, interval_day))
+    sorted_day = interval_day[order]
+    best = order[np.flatnonzero(np.append(sorted_day[1:] != sorted_day[:-1], True))]
+    result["longest_sec"][interval_day[best]] = length[best]
+    result["longest_start"][interval_day[best]] = interval_start[best]
+    return result
+
+
+def day_runs(active):
+    """Return (starts, lengths) of the runs of True in a boolean array"""
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    return starts, np.flatnonzero(edges == -1) - starts
+
+
+# Focus statistics of finished days, valid while their rollup totals match
+closed_days = FingerprintCache(STREAK_CACHE_MAX_DAYS)
+
+FOCUS_FIELDS = ("intervals", "focus_sec", "longest_sec", "longest_start", "histogram")
+
+
+def streaks(conn, first, last, now=None, gap=STREAK_IDLE_GAP, cache=closed_days, cache_key=None,
+            tz=None):
+    """
+    Focus intervals and day streaks for the 'YYYY-MM-DD' days first..last in `tz`.
+
+    The rollups say which days were active. Sessions are only read for
+    active days that are not cached, in one range scan, and finished days
+    are cached afterwards; usually that leaves just today to compute.
+
+    Days starting before sessions_complete_from() still count as active,
+    but their sessions are gone: they are never computed or taken from the
+    cache, and `focus_known` is False for them.
+    """
+    now = now if now is not None else time.time()
+    tz = get_timezone(tz)
+    start = local_day_start(first, tz)
+    end = next_period(local_day_start(last, tz), 'day', tz)
+    edges = np.array(bucket_edges(start, end, 'day', tz), dtype=np.int64)
+    days = len(edges) - 1
+    series = grouped_series(conn, edges.tolist())
+    fingerprints = {}
+    if series:
+        seconds, sessions = series[()]
+        fingerprints = {offset: (sessions[offset], seconds[offset])
+                        for offset in range(days) if sessions[offset]}
+
+    empty = np.empty(0, dtype=np.int64)
+    stats = focus_days(empty, empty, edges, gap)
+    stats["focus_known"] = edges[:-1] >= sessions_complete_from(conn)
+    missing = []
+    for offset, fingerprint in fingerprints.items():
+        if not stats["focus_known"][offset]:
+            continue
+        key = (cache_key, gap, int(edges[offset]), int(edges[offset + 1]))
+        cached = cache.get(key, fingerprint)
+        if cached is None:
+            missing.append(offset)
+            continue
+        for field, value in zip(FOCUS_FIELDS, cached):
+            stats[field][offset] = value
+
+    if missing:
+        lo, hi = min(missing), max(missing) + 1
+        ts, ends = load_sessions(conn, int(edges[lo]), int(edges[hi]))
+        computed = focus_days(ts, ends, edges[lo:hi + 1], gap)
+        stats["last_interval"] = computed["last_interval"]
+        for offset in missing:
+            value = tuple(computed[field][offset - lo] for field in FOCUS_FIELDS)
+            for field, item in zip(FOCUS_FIELDS, value):
+                stats[field][offset] = item
+            day_lo, day_hi = int(edges[offset]), int(edges[offset + 1])
+            if day_hi <= now:
+                cache.put((cache_key, gap, day_lo, day_hi), fingerprints[offset], value)
+
+    totals = np.zeros(days)
+    for offset, (_, total) in fingerprints.items():
+        totals[offset] = total
+    stats["active"] = totals >= STREAK_MIN_DAY_MINUTES * 60
+    stats["current_sec"] = 0
+    if stats["last_interval"] and now - stats["last_interval"][1] <= gap:
+        stats["current_sec"] = max(0, stats["last_interval"][1] - stats["last_interval"][0])
+    return stats
+
+
+def histogram_labels(histogram_minutes=STREAK_HISTOGRAM_MINUTES):
+    """Bucket labels in minutes, e.g. ['0-15', ..., '120+']"""
+    bounds = list(histogram_minutes)
+    return [f"{lo}-{hi}" for lo, hi in zip(bounds, bounds[1:])] + [f"{bounds[-1]}+"]
+
+
+def streaks_payload(conn, first=None, last=None, tz=None, today=None, cache_key=None):
+    """
+    Body of /api/streaks: focus intervals and day streaks for first..last,
+    with days running from midnight to midnight in `tz`.
+
+    Focus intervals need raw sessions, so the per-day focus fields are null
+    for days before "focus_from" (null when no day has them), and "focus"
+    only covers the days after it. Day streaks cover the whole range.
+
+    Returns:
+    {
+        "from": "2025-01-01", "to": "2025-01-30", "focus_from": "2025-01-01",
+        "labels": ["2025-01-01", ...],
+        "histogram_buckets": ["0-15", "15-30", "30-60", "60-120", "120+"],   // minutes
+        "days": {
+            "intervals": [3, ...],
+            "focus_minutes": [95.0, ...],
+            "longest_minutes": [52.0, ...],
+            "histogram": [[1, 1, 1, 0, 0], ...]    // intervals per day and bucket
+        },
+        "focus": {"intervals": 61, "total_minutes": 2310.0, "longest_minutes": 148.0,
+                  "longest_started_at": 1735725600, "current_minutes": 12.0},
+        "day_streak": {"current": 4, "longest": 9,
+                       "longest_from": "2025-01-10", "longest_to": "2025-01-18"}
+    }
+    """
+    tz = get_timezone(tz)
+    first, last = parse_date_range(first, last, default_days=30, max_days=STREAK_MAX_RANGE_DAYS,
+                                   today=today, tz=tz)
+    stats = streaks(conn, first, last, cache_key=cache_key, tz=tz)
+    start = datetime.strptime(first, '%Y-%m-%d').toordinal()
+    labels = [datetime.fromordinal(start + i).strftime('%Y-%m-%d')
+              for i in range(len(stats["active"]))]
+
+    runs, lengths = day_runs(stats["active"])
+    longest = int(np.argmax(lengths)) if len(lengths) else None
+    current = 0
+    if len(lengths):
+        # Today does not break the streak until it is over
+        run_end = runs[-1] + lengths[-1]
+        today_label = local_today(tz, today)
+        grace = 1 if labels[-1] == today_label and not stats["active"][-1] else 0
+        if run_end == len(labels) - grace:
+            current = int(lengths[-1])
+
+    known = stats["focus_known"].tolist()
+
+    def per_day(values):
+        return [value if ok else None for value, ok in zip(values, known)]
+
+    best_day = int(np.argmax(stats["longest_sec"]))
+    return {
+        "from": first,
+        "to": last,
+        "focus_from": labels[known.index(True)] if True in known else None,
+        "labels": labels,
+        "histogram_buckets": histogram_labels(),
+        "days": {
+            "intervals": per_day(stats["intervals"].tolist()),
+            "focus_minutes": per_day(round(s / 60.0, 2) for s in stats["focus_sec"].tolist()),
+            "longest_minutes": per_day(round(s / 60.0, 2) for s in stats["longest_sec"].tolist()),
+            "histogram": per_day(stats["histogram"].tolist()),
+        },
+        "focus": {
+            "intervals": int(stats["intervals"].sum()),
+            "total_minutes": round(int(stats["focus_sec"].sum()) / 60.0, 2),
+            "longest_minutes": round(int(stats["longest_sec"][best_day]) / 60.0, 2),
+            "longest_started_at": (int(stats["longest_start"][best_day])
+                                   if stats["longest_sec"][best_day] else None),
+            "current_minutes": round(stats["current_sec"] / 60.0, 2),
+        },
+        "day_streak": {
+            "current": current,
+            "longest": int(lengths[longest]) if longest is not None else 0,
+            "longest_from": labels[runs[longest]] if longest is not None else None,
+            "longest_to": (labels[runs[longest] + lengths[longest] - 1]
+                           if longest is not None else None),
+        },
+    }
+
+
+def main(argv=None):
+    try:
+        from backend.db import get_db_connection
+    except ModuleNotFoundError:
+        from db import get_db_connection
+
+    parser = argparse.ArgumentParser(description="Focus intervals and day streaks")
+    parser.add_argument('--from', dest='first', help="first day (YYYY-MM-DD), default 30 days ago")
+    parser.add_argument('--to', dest='last', help="last day (YYYY-MM-DD), default today")
+    parser.add_argument('--tz', help="timezone days follow (IANA name), default CODEPULSE_TIMEZONE")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    payload = streaks_payload(get_db_connection(), args.first, args.last, tz=args.tz)
+    elapsed = (time.perf_counter() - started) * 1000
+    focus, day_streak = payload['focus'], payload['day_streak']
+    print(f"{payload['from']} .. {payload['to']}: {focus['intervals']} focus intervals, "
+          f"{focus['total_minutes']:.0f} min")
+    if payload['focus_from'] != payload['from']:
+        print(f"Focus intervals from {payload['focus_from'] or '-'} only; "
+              f"older sessions were aged out")
+    print(f"Longest interval: {focus['longest_minutes']:.0f} min, "
+          f"current: {focus['current_minutes']:.0f} min")
+    print(f"Day streak: {day_streak['current']} current, {day_streak['longest']} longest")
+    print(f"({elapsed:.1f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
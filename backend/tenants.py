@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+CodePulse Tenants
+Gives every user or workspace its own small database file, served from a
+shared pool of connections, and totals them for the team in parallel
+
+Usage:
+    python -m backend.tenants list
+    python -m backend.tenants summary [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--tz ZONE]
+    python -m backend.tenants adopt TENANT
+"""
+
+import argparse
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from backend.config import TENANT_DIR, TENANT_ADMIN_WORKERS
+    from backend.db import ConnectionPool, open_connection, read_snapshot
+    from backend.aggregates import bucket_stats
+    from backend.bucketing import resolve_buckets
+except ModuleNotFoundError:
+    from config import TENANT_DIR, TENANT_ADMIN_WORKERS
+    from db import ConnectionPool, open_connection, read_snapshot
+    from aggregates import bucket_stats
+    from bucketing import resolve_buckets
+
+# Where a request names its tenant; EventSource cannot set headers, so the
+# query parameter is accepted too
+TENANT_HEADER = 'X-CodePulse-Tenant'
+TENANT_PARAM = 'tenant'
+
+# Tenant ids become file names, so only a safe, case-insensitive subset is allowed
+TENANT_ID = re.compile(r'[a-z0-9][a-z0-9_.-]{0,63}')
+
+# Every tenant connection in the process comes from this pool
+pool = ConnectionPool()
+
+
+def normalize_tenant(tenant):
+    """Return the canonical form of a tenant id, or raise ValueError"""
+    if not tenant:
+        raise ValueError(
+            f"Missing tenant: send the {TENANT_HEADER} header or a `{TENANT_PARAM}` parameter")
+    tenant = tenant.strip().lower()
+    if not TENANT_ID.fullmatch(tenant):
+        raise ValueError(
+            f"Invalid tenant: {tenant!r} (use up to 64 letters, digits, '.', '_' or '-')")
+    return tenant
+
+
+class UnknownTenant(LookupError):
+    """The tenant has no database file yet"""
+
+
+def tenant_db_path(tenant, create=False):
+    """
+    Database file of `tenant`.
+
+    Raises UnknownTenant if the file does not exist, unless `create` is
+    set, in which case it is created with the schema on first connection.
+    Only ingest and `adopt` create tenants, so reads cannot litter
+    TENANT_DIR with empty databases.
+    """
+    path = TENANT_DIR / f"{normalize_tenant(tenant)}.db"
+    if create:
+        TENANT_DIR.mkdir(parents=True, exist_ok=True)
+    elif not path.exists():
+        raise UnknownTenant(f"Unknown tenant: {normalize_tenant(tenant)!r}")
+    return str(path)
+
+
+def list_tenants():
+    """Ids of every tenant with a database file, sorted"""
+    if not TENANT_DIR.is_dir():
+        return []
+    return sorted(path.stem for path in TENANT_DIR.glob('*.db') if TENANT_ID.fullmatch(path.stem))
+
+
+def tenant_stats(tenant, buckets):
+    """bucket_stats() for one tenant, read through the pool"""
+    with pool.connection(tenant_db_path(tenant)) as conn, read_snapshot(conn):
+        return bucket_stats(conn, buckets)
+
+
+def admin_payload(first=None, last=None, granularity=None, tz=None, today=None,
+                  tenants=None, workers=TENANT_ADMIN_WORKERS):
+    """
+    Activity of every tenant over one range, plus team totals.
+
+    Tenants are read `workers` at a time, each from its own file, so the
+    fan-out is bounded by the pool rather than by the number of tenants.
+    A tenant whose file cannot be read is reported with its error instead
+    of failing the whole response. Raises ValueError for invalid ranges.
+    """
+    buckets = resolve_buckets(first, last, granularity, default_days=8, today=today, tz=tz)
+    tenants = list_tenants() if tenants is None else tenants
+
+    def read(tenant):
+        try:
+            return tenant, tenant_stats(tenant, buckets), None
+        except Exception as e:
+            return tenant, None, str(e)
+
+    if tenants:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tenants)),
+                                thread_name_prefix='codepulse-tenants') as executor:
+            results = list(executor.map(read, tenants))
+    else:
+        results = []
+
+    data = [0.0] * len(buckets.labels)
+    sessions = 0
+    language_minutes = {}
+    rows = []
+    for tenant, stats, error in results:
+        if error is not None:
+            rows.append({"tenant": tenant, "error": error})
+            continue
+        for i, minutes in enumerate(stats["data"]):
+            data[i] += minutes
+        sessions += stats["total_sessions"]
+        for language, minutes in stats["language_minutes"].items():
+            language_minutes[language] = language_minutes.get(language, 0.0) + minutes
+        rows.append({
+            "tenant": tenant,
+            "total_minutes": stats["total_minutes"],
+            "total_sessions": stats["total_sessions"],
+            "top_language": stats["top_language"]
+        })
+
+    languages = sorted(language_minutes, key=language_minutes.get, reverse=True)
+    return {
+        "labels": buckets.labels,
+        "granularity": buckets.granularity,
+        "from": buckets.first,
+        "to": buckets.last,
+        "tenants": rows,
+        "team": {
+            "data": [round(minutes, 2) for minutes in data],
+            "total_minutes": round(sum(data), 2),
+            "total_sessions": sessions,
+            "active_tenants": sum(1 for row in rows if row.get("total_sessions")),
+            "language_minutes": {language: round(language_minutes[language], 2)
+                                 for language in languages},
+            "top_language": languages[0] if languages else "N/A"
+        }
+    }
+
+
+def adopt(tenant, source):
+    """Copy the database at `source` into a new tenant, e.g. when leaving single mode"""
+    path = tenant_db_path(tenant, create=True)
+    if normalize_tenant(tenant) in list_tenants():
+        raise ValueError(f"Tenant {tenant!r} already exists")
+    source_conn = open_connection(source)
+    target = sqlite3.connect(path)
+    try:
+        source_conn.backup(target)
+    finally:
+        target.close()
+        source_conn.close()
+    return path
+
+
+def main(argv=None):
+    try:
+        from backend.config import get_db_path
+    except ModuleNotFoundError:
+        from config import get_db_path
+
+    parser = argparse.ArgumentParser(description="Per-tenant databases")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="list tenants and their file sizes")
+    summary = commands.add_parser('summary', help="activity of every tenant over a range")
+    summary.add_argument('--from', dest='first', help="first day, YYYY-MM-DD (default: 7 days ago)")
+    summary.add_argument('--to', dest='last', help="last day, YYYY-MM-DD (default: today)")
+    summary.add_argument('--tz', help="IANA timezone for day boundaries")
+    adopt_parser = commands.add_parser('adopt',
+                                       help="copy the single-mode activity.db into a new tenant")
+    adopt_parser.add_argument('tenant')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for tenant in list_tenants():
+            path = TENANT_DIR / f"{tenant}.db"
+            print(f"{tenant:<24} {path.stat().st_size / 1024:8.1f} KB  {path}")
+    elif args.command == 'summary':
+        try:
+            payload = admin_payload(args.first, args.last, tz=args.tz)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        for row in payload["tenants"]:
+            if "error" in row:
+                print(f"{row['tenant']:<24} ❌ {row['error']}")
+            else:
+                print(f"{row['tenant']:<24} {row['total_minutes']:10.1f} min  "
+                      f"{row['total_sessions']:7d} sessions  {row['top_language']}")
+        team = payload["team"]
+        print(f"✅ {len(payload['tenants'])} tenants, {payload['from']} to {payload['to']}: "
+              f"{team['total_minutes']:.1f} min in {team['total_sessions']} sessions")
+    elif args.command == 'adopt':
+        try:
+            path = adopt(args.tenant, get_db_path())
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"✅ Copied {get_db_path()} to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+CodePulse Time Utilities
+Converts calendar days into epoch ranges for index-friendly queries
+"""
+
+import calendar
+from datetime import datetime, timedelta, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+try:
+    from backend.config import TIMEZONE
+except ModuleNotFoundError:
+    from config import TIMEZONE
+
+SECONDS_PER_DAY = 86400
+
+
+def day_start(date):
+    """Return the epoch second at which a 'YYYY-MM-DD' day starts (UTC)"""
+    return calendar.timegm(datetime.strptime(date, '%Y-%m-%d').timetuple())
+
+
+def day_bounds(date):
+    """
+    Return the half-open epoch range [start, end) covering a day.
+
+    Matches the legacy `date(CAST(timestamp AS INTEGER), 'unixepoch') = ?`
+    filter, but can be used as `ts >= ? AND ts < ?` against the ts index.
+    """
+    start = day_start(date)
+    return start, start + SECONDS_PER_DAY
+
+
+def last_n_days(days, today=None):
+    """Return 'YYYY-MM-DD' labels for the `days` days before today, then today"""
+    today = today or datetime.now()
+    return [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days, -1, -1)]
+
+
+def get_timezone(tz=None):
+    """
+    Resolve an IANA zone name such as 'Europe/Berlin' (default TIMEZONE).
+
+    tzinfo objects are passed through. Raises ValueError for unknown names.
+    """
+    if isinstance(tz, tzinfo):
+        return tz
+    name = tz or TIMEZONE
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}") from None
+
+
+def local_epoch(wall_time, tz):
+    """
+    Epoch second of a naive local wall time in `tz`.
+
+    A time repeated when clocks go back resolves to its first occurrence;
+    a time skipped when they go forward is read with the offset before the jump.
+    """
+    return int(wall_time.replace(tzinfo=tz, fold=0).timestamp())
+
+
+def local_day_start(date, tz):
+    """Epoch second at which a 'YYYY-MM-DD' day starts in `tz`"""
+    return local_epoch(datetime.strptime(date, '%Y-%m-%d'), tz)
+
+
+def local_today(tz, today=None):
+    """Today's 'YYYY-MM-DD' date in `tz` (or `today`'s date, if given)"""
+    return (today or datetime.now(tz)).strftime('%Y-%m-%d')
+
+
+def utc_offset(epoch, tz):
+    """UTC offset of `tz` at `epoch`, in seconds"""
+    return int(datetime.fromtimestamp(epoch, tz).utcoffset().total_seconds())
+
+
+def offset_spans(start, end, tz):
+    """
+    Split [start, end) at the UTC offset changes of `tz`.
+
+    Returns [(lo, hi, offset_seconds), ...]. The range is probed once a
+    day and each change is then located to the second by bisection, so a
+    year costs a few hundred conversions.
+    """
+    spans = []
+    lo, offset = start, utc_offset(start, tz)
+    probe = start
+    while probe < end:
+        step = min(probe + SECONDS_PER_DAY, end)
+        if step < end and utc_offset(step, tz) != offset:
+            before, after = probe, step
+            while after - before > 1:
+                middle = (before + after) // 2
+                if utc_offset(middle, tz) == offset:
+                    before = middle
+                else:
+                    after = middle
+            spans.append((lo, after, offset))
+            lo, offset = after, utc_offset(after, tz)
+        probe = step
+    spans.append((lo, end, offset))
+    return spans
+
+
+def parse_date_range(first=None, last=None, default_days=30, max_days=None, today=None, tz=None):
+    """
+    Validate an inclusive 'YYYY-MM-DD' day range from query parameters.
+
+    `last` defaults to today in `tz` and `first` to `default_days` - 1 days
+    before it. Raises ValueError for malformed dates, reversed ranges and
+    ranges longer than `max_days`.
+    """
+    last = last or local_today(get_timezone(tz), today)
+    try:
+        last_day = datetime.strptime(last, '%Y-%m-%d')
+        first_day = (datetime.strptime(first, '%Y-%m-%d') if first
+                     else last_day - timedelta(days=default_days - 1))
+    except ValueError:
+        raise ValueError("Dates must be formatted YYYY-MM-DD") from None
+    days = (last_day - first_day).days + 1
+    if days < 1:
+        raise ValueError("'from' must not be after 'to'")
+    if max_days is not None and days > max_days:
+        raise ValueError(f"Date range is limited to {max_days} days")
+    return first_day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d')